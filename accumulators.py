@@ -0,0 +1,223 @@
+from math import sqrt
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class FundingAccumulator:
+    """
+    Cumulative funding over a funding rate series, built once per simulation run.
+
+    prefix[i] holds the sum of the first i funding rates, so the funding collected over any
+    row range [start, end) is a subtraction of two prefix values instead of a re-slice of the
+    DataFrame. Positions are row positions (0-based), not index labels.
+
+    The prefix difference can differ from summing the slice directly in the last few bits
+    of the result, since the additions happen in a different order.
+    """
+
+    def __init__(self, funding_rates):
+        rates = np.asarray(funding_rates, dtype=float)
+        self.prefix = np.concatenate(([0.0], np.cumsum(rates)))
+
+    def __len__(self) -> int:
+        return len(self.prefix) - 1
+
+    def rate_sum(self, start: int, end: int) -> float:
+        """
+        Returns the sum of the funding rates at row positions start..end-1.
+        """
+        return self.prefix[end] - self.prefix[start]
+
+    def earned(self, start: int, end: int, notional: float) -> float:
+        """
+        Returns the funding earned by `notional` held from row position start up to (not including) end.
+        """
+        return notional * self.rate_sum(start, end)
+
+
+class MetricsAccumulator:
+    """
+    Backtest metrics updated in O(1) per closed trade, in a single pass over the ledger.
+
+    Return, win/loss, fee and turnover metrics are running sums. Risk metrics follow the
+    report's daily equity curve: the capital at the end of each day, taken from the day's last
+    exit or from mark() (days without either repeat the previous close). Each day's return goes
+    into a Welford mean/variance, and the running peak of the closes gives the drawdown. Days
+    are integer day numbers supplied by the caller, e.g. epoch days.
+
+    Args:
+        initial_capital: Capital before the first trade
+        start_day: Day on which the equity curve starts at initial_capital, the first trade's day if None
+        risk_free_rate: Annual rate subtracted in the Sharpe ratio
+        record_daily: Also keep the list of daily closes, for plotting
+    """
+
+    def __init__(self, initial_capital: float, start_day: Optional[int] = None, risk_free_rate: float = 0.02,
+                 record_daily: bool = False):
+        self.initial_capital = initial_capital
+        self.risk_free_rate = risk_free_rate
+        self.record_daily = record_daily
+
+        self.num_trades = 0
+        self.capital = initial_capital
+        self.pnl_before_fees = 0.0
+        self.pnl_after_fees = 0.0
+        self.fees = 0.0
+        self.trade_capital = 0.0
+        self.running_capital = 0.0
+        self.wins = 0
+        self.win_sum = 0.0
+        self.loss_sum = 0.0
+        self.duration_sum = 0.0
+        self.max_duration = 0
+
+        # Daily equity curve: the open day, its close so far and the previous day's close
+        self.day = start_day
+        self.close = initial_capital
+        self.previous_close: Optional[float] = None
+        self.peak = 0.0  # Highest daily close so far
+        self.max_drawdown = 0.0
+        self.n_returns = 0
+        self.mean_return = 0.0
+        self.m2_return = 0.0
+        self.daily: List[Tuple[int, float]] = []
+
+    def _add_returns(self, count: int, mean: float, m2: float):
+        # Chan et al.'s merge of a group of returns into the Welford state
+        total = self.n_returns + count
+        delta = mean - self.mean_return
+        self.mean_return += delta * count / total
+        self.m2_return += m2 + delta * delta * self.n_returns * count / total
+        self.n_returns = total
+
+    def _close_day(self):
+        if self.previous_close is not None:
+            self._add_returns(1, self.close / self.previous_close - 1, 0.0)
+        self.peak = max(self.peak, self.close)
+        self.max_drawdown = min(self.max_drawdown, (self.close - self.peak) / self.peak)
+        if self.record_daily:
+            self.daily.append((self.day, self.close))
+        self.previous_close = self.close
+
+    def _advance(self, day: int):
+        if self.day is None:
+            self.day = day
+            return
+        if day <= self.day:
+            return
+        self._close_day()
+        gap = day - self.day - 1
+        if gap > 0:
+            # Days without exits: flat closes, i.e. zero returns
+            self._add_returns(gap, 0.0, 0.0)
+            if self.record_daily:
+                self.daily.extend((self.day + k, self.close) for k in range(1, gap + 1))
+        self.day = day
+
+    def add_trade(self, pnl_before_fees: float, pnl_after_fees: float, fees: float, trade_capital: float,
+                  capital: float, duration: float = 0, day: Optional[int] = None):
+        """
+        Account for one closed trade.
+
+        Args:
+            pnl_before_fees, pnl_after_fees: The trade's PnL
+            fees: Exit fees recorded for the trade
+            trade_capital: Capital committed to the trade
+            capital: Running capital after the trade
+            duration: Trade duration, in whatever unit the report shows
+            day: Day number of the exit, None to leave the daily equity curve alone
+        """
+        if day is not None:
+            self._advance(day)
+            self.close = capital
+        self.num_trades += 1
+        self.capital = capital
+        self.pnl_before_fees += pnl_before_fees
+        self.pnl_after_fees += pnl_after_fees
+        self.fees += fees
+        self.trade_capital += trade_capital
+        self.running_capital += capital
+        if pnl_after_fees > 0:
+            self.wins += 1
+            self.win_sum += pnl_after_fees
+        else:
+            self.loss_sum += pnl_after_fees
+        self.duration_sum += duration
+        self.max_duration = max(self.max_duration, duration)
+
+    def mark(self, day: int, capital: float):
+        """
+        Set the day's close from a mark-to-market equity value instead of the last exit.
+
+        Feed one mark per day in day order, and add the trades without a day, to base the risk
+        metrics on the equity curve.
+        """
+        self._advance(day)
+        self.close = capital
+
+    def daily_capital(self) -> List[Tuple[int, float]]:
+        """
+        (day, close) of every day so far, including the open one (needs record_daily).
+        """
+        return self.daily + ([(self.day, self.close)] if self.day is not None else [])
+
+    def summary(self, days_in_backtest: float) -> Dict[str, float]:
+        """
+        The report metrics, with APY compounded over days_in_backtest days.
+        """
+        n = self.num_trades
+        if n == 0:
+            return {name: 0 for name in (
+                "total_return_after_fees", "apy_after_fees", "total_return_before_fees", "apy_before_fees",
+                "sharpe_ratio", "max_drawdown", "volatility", "win_rate", "profit_factor",
+                "avg_profit", "avg_loss", "expectancy", "capital_utilization", "turnover_ratio", "impact_of_fees",
+                "break_even_fee_rate", "num_trades", "avg_trade_duration", "max_trade_duration",
+            )} | {"final_capital": self.initial_capital, "total_yield_before_fees": 0}
+
+        total_return_after_fees = (self.capital - self.initial_capital) / self.initial_capital
+        total_return_before_fees = self.pnl_before_fees / self.initial_capital
+        apy_after_fees = (1 + total_return_after_fees) ** (365 / days_in_backtest) - 1 if days_in_backtest > 0 else 0
+        apy_before_fees = (1 + total_return_before_fees) ** (365 / days_in_backtest) - 1 if days_in_backtest > 0 else 0
+
+        # Close the open day on copies of the running state
+        n_returns, mean, m2 = self.n_returns, self.mean_return, self.m2_return
+        peak, max_drawdown = max(self.peak, self.close), self.max_drawdown
+        max_drawdown = min(max_drawdown, (self.close - peak) / peak)
+        if self.previous_close is not None:
+            r = self.close / self.previous_close - 1
+            n_returns += 1
+            delta = r - mean
+            mean += delta / n_returns
+            m2 += delta * (r - mean)
+        std = sqrt(m2 / (n_returns - 1)) if n_returns > 1 else float("nan")
+        volatility = std * sqrt(365)
+        sharpe_ratio = (apy_after_fees - self.risk_free_rate) / volatility if volatility != 0 else 0
+
+        win_rate = self.wins / n
+        losses = n - self.wins
+        avg_profit = self.win_sum / self.wins if self.wins else 0
+        avg_loss = self.loss_sum / losses if losses else 0
+        return {
+            "final_capital": self.capital,
+            "total_return_after_fees": total_return_after_fees,
+            "apy_after_fees": apy_after_fees,
+            "total_yield_before_fees": self.pnl_before_fees,
+            "total_return_before_fees": total_return_before_fees,
+            "apy_before_fees": apy_before_fees,
+            "sharpe_ratio": sharpe_ratio,
+            "max_drawdown": max_drawdown,
+            "volatility": volatility,
+            "win_rate": win_rate,
+            "profit_factor": self.win_sum / abs(self.loss_sum) if abs(self.loss_sum) > 0 else float("inf"),
+            "avg_profit": avg_profit,
+            "avg_loss": avg_loss,
+            "expectancy": (avg_profit * win_rate) + (avg_loss * (1 - win_rate)),
+            "capital_utilization": self.trade_capital / self.running_capital,
+            "turnover_ratio": self.trade_capital / self.initial_capital,
+            "impact_of_fees": self.fees / self.initial_capital,
+            "break_even_fee_rate": self.pnl_before_fees / self.trade_capital if self.trade_capital > 0 else 0,
+            "num_trades": n,
+            "avg_trade_duration": self.duration_sum / n,
+            "max_trade_duration": self.max_duration,
+        }
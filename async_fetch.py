@@ -0,0 +1,254 @@
+"""
+Asyncio client for the Hyperliquid info endpoint.
+
+Requests run concurrently up to a fixed number in flight, are paced by a shared token bucket,
+and are retried with exponential backoff plus full jitter. Chunked fetches return their results
+in chunk order however the requests complete.
+"""
+import asyncio
+import random
+import time
+from datetime import datetime, UTC
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from hyperliquid.utils import constants
+
+# Hyperliquid allows 1200 request weight per minute per IP; most info requests weigh 20
+WEIGHT_LIMIT_PER_MINUTE = 1200.0
+INFO_REQUEST_WEIGHT = 20.0
+
+# A bucket admits at most burst + 60 * rate weight in any minute, so the two share the limit
+DEFAULT_WEIGHT_BURST = 300.0
+DEFAULT_WEIGHT_PER_SECOND = (WEIGHT_LIMIT_PER_MINUTE - DEFAULT_WEIGHT_BURST) / 60
+
+# fundingHistory returns at most 500 hourly records and weighs 1 more per 20 records returned
+MAX_FUNDING_ITEMS = 500
+FUNDING_ITEMS_PER_WEIGHT = 20
+# Chunk length that fills most of a response page, leaving room for records on the boundaries
+FUNDING_CHUNK_HOURS = 480
+
+HOUR_MS = 60 * 60 * 1000
+
+# HTTP statuses worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter for coroutines.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. acquire() waits until
+    enough tokens are available; waiters are served in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        if tokens > self.capacity:
+            raise ValueError(f"Cannot acquire {tokens} tokens from a bucket of capacity {self.capacity}")
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+def backoff_delay(attempt: int, base_delay: float = 0.5, max_delay: float = 30.0) -> float:
+    """
+    Exponential backoff with full jitter: a uniform draw from [0, min(max_delay, base_delay * 2**attempt)].
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def funding_history_weight(start_time: int, end_time: Optional[int] = None) -> float:
+    """
+    Rate-limit weight of a fundingHistory request: the base weight plus the item weight of the
+    most records the window can return (a full page if it has no end).
+    """
+    items = MAX_FUNDING_ITEMS if end_time is None else min(MAX_FUNDING_ITEMS, (end_time - start_time) // HOUR_MS + 1)
+    return INFO_REQUEST_WEIGHT + -(-items // FUNDING_ITEMS_PER_WEIGHT)
+
+
+def time_chunks(start_ms: int, end_ms: int, chunk_ms: int) -> List[Tuple[int, int]]:
+    """
+    Split [start_ms, end_ms] into consecutive (start, end) windows of at most chunk_ms.
+    """
+    chunks = []
+    current = start_ms
+    while current < end_ms:
+        chunk_end = min(current + chunk_ms, end_ms)
+        chunks.append((current, chunk_end))
+        current = chunk_end
+    return chunks
+
+
+class AsyncInfoClient:
+    """
+    Minimal asyncio client for POST {base_url}/info.
+
+    Args:
+        base_url: API root, e.g. constants.MAINNET_API_URL or a MockHyperliquidServer url
+        limiter: Shared TokenBucket, a new one with Hyperliquid's default limits if None
+        max_concurrency: Maximum number of requests in flight
+        max_retries: Attempts per request before giving up
+        timeout: Per-request timeout in seconds
+    """
+
+    def __init__(
+        self,
+        base_url: str = constants.MAINNET_API_URL,
+        limiter: Optional[TokenBucket] = None,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+        timeout: float = 30.0,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.limiter = limiter or TokenBucket(DEFAULT_WEIGHT_PER_SECOND, DEFAULT_WEIGHT_BURST)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncInfoClient":
+        self._session = aiohttp.ClientSession(timeout=self._timeout)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def post(self, payload: Dict, weight: float = INFO_REQUEST_WEIGHT) -> Any:
+        """
+        POST a request to /info, retrying rate-limit, server and connection errors.
+        """
+        for attempt in range(self.max_retries):
+            await self.limiter.acquire(weight)
+            try:
+                async with self._semaphore:
+                    async with self._session.post(f"{self.base_url}/info", json=payload) as response:
+                        if response.status not in RETRY_STATUSES:
+                            response.raise_for_status()
+                            return await response.json()
+                        error = f"HTTP {response.status}"
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = repr(e)
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+        raise RuntimeError(f"Request {payload} failed after {self.max_retries} attempts: {error}")
+
+    async def funding_history(self, coin: str, start_time: int, end_time: Optional[int] = None) -> List[Dict]:
+        payload = {"type": "fundingHistory", "coin": coin, "startTime": start_time}
+        if end_time is not None:
+            payload["endTime"] = end_time
+        # The item weight is charged up front, for the largest response the window allows
+        return await self.post(payload, weight=funding_history_weight(start_time, end_time))
+
+    async def candles_snapshot(self, coin: str, interval: str, start_time: int, end_time: int) -> List[Dict]:
+        req = {"coin": coin, "interval": interval, "startTime": start_time, "endTime": end_time}
+        return await self.post({"type": "candleSnapshot", "req": req})
+
+    async def meta(self) -> Dict:
+        return await self.post({"type": "meta"})
+
+    async def all_mids(self) -> Dict[str, str]:
+        return await self.post({"type": "allMids"})
+
+
+async def fetch_funding_history(
+    client: AsyncInfoClient,
+    coin: str,
+    start_ms: int,
+    end_ms: int,
+    chunk_hours: int = FUNDING_CHUNK_HOURS,
+) -> List[Dict]:
+    """
+    Fetch funding history for [start_ms, end_ms] as concurrent chunk requests.
+
+    Chunks are gathered in order, so the result is sorted by time; records on a shared chunk
+    boundary are returned once.
+
+    Returns:
+        List of funding records ({coin, fundingRate, premium, time}) sorted by time
+    """
+    chunks = time_chunks(start_ms, end_ms, chunk_hours * HOUR_MS)
+    results = await asyncio.gather(*(client.funding_history(coin, start, end) for start, end in chunks))
+
+    records = []
+    last_time = None
+    for chunk_records in results:
+        for record in chunk_records or []:
+            if last_time is None or record["time"] > last_time:
+                records.append(record)
+                last_time = record["time"]
+    return records
+
+
+async def fetch_candles(
+    client: AsyncInfoClient,
+    coin: str,
+    interval: str,
+    start_ms: int,
+    end_ms: int,
+    window_ms: int,
+) -> List[Dict]:
+    """
+    Fetch candles for [start_ms, end_ms) as concurrent requests over fixed windows of window_ms.
+
+    Unlike paging from the last returned candle, every window is known up front, so all of them
+    can be in flight at once. Windows are gathered in order, so the result is sorted by open time.
+    """
+    windows = time_chunks(start_ms, end_ms, window_ms)
+    # The API end time is inclusive
+    results = await asyncio.gather(*(client.candles_snapshot(coin, interval, start, end - 1) for start, end in windows))
+
+    candles = []
+    last_time = None
+    for window_candles in results:
+        for candle in window_candles or []:
+            if last_time is None or candle["t"] > last_time:
+                candles.append(candle)
+                last_time = candle["t"]
+    return candles
+
+
+async def _timed_fetch(url: str, max_concurrency: int, start_ms: int, end_ms: int) -> Tuple[int, float]:
+    # Generous limits so the comparison measures concurrency rather than the rate limit
+    limiter = TokenBucket(rate=20_000, capacity=1_000)
+    async with AsyncInfoClient(url, limiter=limiter, max_concurrency=max_concurrency, base_delay=0.05) as client:
+        started = time.perf_counter()
+        # Small chunks, so there are enough requests to compare concurrency levels
+        records = await fetch_funding_history(client, "HYPE", start_ms, end_ms, chunk_hours=4)
+        return len(records), time.perf_counter() - started
+
+
+async def _demo():
+    from mock_hyperliquid import MockHyperliquidServer
+
+    start_ms = int(datetime(2025, 3, 24, tzinfo=UTC).timestamp() * 1000)
+    end_ms = int(datetime(2025, 6, 14, tzinfo=UTC).timestamp() * 1000)
+    for max_concurrency in (1, 16):
+        with MockHyperliquidServer(latency=0.05, error_rate=0.05) as server:
+            count, elapsed = await _timed_fetch(server.url, max_concurrency, start_ms, end_ms)
+        print(f"max_concurrency={max_concurrency:>2}: {count} funding records in {elapsed:.2f}s "
+              f"({server.request_count} requests, {server.error_count} rate-limited and retried, "
+              f"up to {server.max_active_requests} in flight)")
+
+
+if __name__ == "__main__":
+    asyncio.run(_demo())
@@ -0,0 +1,303 @@
+"""
+Data-availability probes for Hyperliquid candles and funding history.
+
+Listing boundaries are found by galloping (probe windows that double in size) followed by a
+binary search, so they cost O(log n) requests instead of one request per day or week. Holes are
+found by reading the range one response page at a time, galloping over empty stretches.
+
+Every probe result for a window that lies fully in the past is cached on disk, so repeating a
+check costs no requests.
+
+scan_coverage probes all windows of a range concurrently instead and produces a coverage map
+(per-window bitmap plus merged intervals of data) that the fetchers and the dataset builder
+use to skip empty ranges.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from async_fetch import AsyncInfoClient, time_chunks
+from manifest import SETTLE_MS, merge_intervals, subtract_intervals
+
+# Response page: (sampling step in ms, maximum items per response)
+FUNDING_PAGE = (60 * 60 * 1000, 500)
+CANDLE_PAGES = {
+    "1m": (60_000, 5000),
+    "5m": (300_000, 5000),
+    "15m": (900_000, 5000),
+    "1h": (3_600_000, 5000),
+}
+
+DEFAULT_CACHE = "availability_cache.json"
+
+# Hyperliquid launched after this date; searches for the first record start here
+EARLIEST_MS = 1672531200000  # 2023-01-01 UTC
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+logger = logging.getLogger(__name__)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def settled_end_ms(align_ms: int = DAY_MS) -> int:
+    """
+    Upper bound for a cached search: now - SETTLE_MS, rounded down to a multiple of align_ms.
+
+    Probe windows are derived from the search bounds, so a search from a fixed start (EARLIEST_MS)
+    to this end asks for the same windows on every run within the same align_ms period, and a
+    repeated check is answered from the cache.
+    """
+    return (_now_ms() - SETTLE_MS) // align_ms * align_ms
+
+
+class AvailabilityProbe:
+    """
+    Finds first/last records and holes for one dataset (funding or candles of one interval).
+
+    Args:
+        info: hyperliquid.info.Info (or anything with funding_history/candles_snapshot)
+        kind: "funding" or "candles"
+        interval: Candle interval, ignored for funding
+        cache_file: JSON cache of probe results, None to disable caching
+    """
+
+    def __init__(self, info, kind: str = "candles", interval: str = "1m", cache_file: Optional[str] = DEFAULT_CACHE):
+        if kind not in ("funding", "candles"):
+            raise ValueError(f"Unknown kind '{kind}', expected 'funding' or 'candles'")
+        self.info = info
+        self.kind = kind
+        self.interval = interval
+        self.step_ms, capacity = FUNDING_PAGE if kind == "funding" else CANDLE_PAGES[interval]
+        # A window this wide can never hold more items than one response returns
+        self.page_ms = self.step_ms * capacity
+        self.cache_file = cache_file
+        self.requests = 0
+        self._cache: Dict[str, Dict] = {}
+        self._dirty = False
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file) as f:
+                self._cache = json.load(f)
+
+    def __enter__(self) -> "AvailabilityProbe":
+        return self
+
+    def __exit__(self, *exc):
+        self.save()
+
+    def save(self):
+        if self.cache_file and self._dirty:
+            tmp_path = self.cache_file + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._cache, f)
+            os.replace(tmp_path, self.cache_file)
+            self._dirty = False
+
+    def _fetch_times(self, coin: str, start_ms: int, end_ms: int) -> List[int]:
+        # The API end time is inclusive; probe windows are [start, end)
+        if self.kind == "funding":
+            records = self.info.funding_history(coin, start_ms, end_ms - 1) or []
+            return sorted(record["time"] for record in records)
+        candles = self.info.candles_snapshot(coin, self.interval, start_ms, end_ms - 1) or []
+        return sorted(candle["t"] for candle in candles)
+
+    def query(self, coin: str, start_ms: int, end_ms: int) -> Dict:
+        """
+        Summary of the records in [start_ms, end_ms): count, first and last time, and the gaps
+        longer than one step between consecutive records. Served from the cache when possible.
+        """
+        key = f"{self.kind}|{self.interval if self.kind == 'candles' else ''}|{coin}|{start_ms}|{end_ms}"
+        if key in self._cache:
+            return self._cache[key]
+
+        self.requests += 1
+        times = self._fetch_times(coin, start_ms, end_ms)
+        summary = {
+            "n": len(times),
+            "first": times[0] if times else None,
+            "last": times[-1] if times else None,
+            "gaps": [[a, b] for a, b in zip(times, times[1:]) if b - a > self.step_ms],
+        }
+        if end_ms <= _now_ms() - SETTLE_MS:
+            self._cache[key] = summary
+            self._dirty = True
+        return summary
+
+    def first_time(self, coin: str, start_ms: int = EARLIEST_MS, end_ms: Optional[int] = None) -> Optional[int]:
+        """
+        Time of the first record in [start_ms, end_ms), None if there is none.
+
+        Probes [start, start + w) with w doubling until a window has data, then halves the
+        window that must hold the first record until it fits in one response page.
+        """
+        end_ms = end_ms if end_ms is not None else _now_ms()
+        lo, width = start_ms, self.page_ms
+        # Gallop: [start_ms, lo) is known to be empty
+        while True:
+            hi = min(start_ms + width, end_ms)
+            if self.query(coin, lo, hi)["n"]:
+                break
+            if hi >= end_ms:
+                return None
+            lo, width = hi, width * 2
+        # Binary search: the first record is in [lo, hi)
+        while hi - lo > self.page_ms:
+            mid = lo + (hi - lo) // 2
+            if self.query(coin, lo, mid)["n"]:
+                hi = mid
+            else:
+                lo = mid
+        return self.query(coin, lo, hi)["first"]
+
+    def last_time(self, coin: str, start_ms: int = EARLIEST_MS, end_ms: Optional[int] = None) -> Optional[int]:
+        """
+        Time of the last record in [start_ms, end_ms), None if there is none (mirror of first_time).
+        """
+        end_ms = end_ms if end_ms is not None else _now_ms()
+        hi, width = end_ms, self.page_ms
+        while True:
+            lo = max(end_ms - width, start_ms)
+            if self.query(coin, lo, hi)["n"]:
+                break
+            if lo <= start_ms:
+                return None
+            hi, width = lo, width * 2
+        while hi - lo > self.page_ms:
+            mid = lo + (hi - lo) // 2
+            if self.query(coin, mid, hi)["n"]:
+                lo = mid
+            else:
+                hi = mid
+        return self.query(coin, lo, hi)["last"]
+
+    def holes(self, coin: str, start_ms: int, end_ms: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Missing [from, to) ranges of records between the first and last record in [start_ms, end_ms).
+
+        Ranges with data are read one response page at a time (every timestamp has to be seen);
+        an empty page gallops ahead to the next record, so a long hole costs O(log n) requests.
+        """
+        end_ms = end_ms if end_ms is not None else _now_ms()
+        holes = []
+        last_seen = None
+        current = start_ms
+        while current < end_ms:
+            page_end = min(current + self.page_ms, end_ms)
+            summary = self.query(coin, current, page_end)
+            if not summary["n"]:
+                next_time = self.first_time(coin, page_end, end_ms)
+                if next_time is None:
+                    break
+                if last_seen is not None:
+                    holes.append((last_seen + self.step_ms, next_time))
+                last_seen = next_time - self.step_ms  # the record at next_time is read with its page
+                current = next_time
+                continue
+            if last_seen is not None and summary["first"] - last_seen > self.step_ms:
+                holes.append((last_seen + self.step_ms, summary["first"]))
+            holes.extend((a + self.step_ms, b) for a, b in summary["gaps"])
+            last_seen = summary["last"]
+            current = page_end
+        return holes
+
+    def resolve(self, variants: List[str], start_ms: int = EARLIEST_MS, end_ms: Optional[int] = None) -> Tuple[Optional[str], Optional[int]]:
+        """
+        First of several symbol variants that has any data, with its first record time.
+        """
+        for variant in variants:
+            try:
+                first = self.first_time(variant, start_ms, end_ms)
+            except Exception as e:
+                logger.error("Error probing %s: %s", variant, e)
+                continue
+            if first is not None:
+                return variant, first
+        return None, None
+
+
+def coverage_file(symbol: str, interval: str) -> str:
+    """
+    Default coverage map path for a symbol and candle interval.
+    """
+    return f"coverage_{symbol.replace('/', '-').replace('@', '')}_{interval}.json"
+
+
+def load_coverage(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_coverage(path: str, coverage: Dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(coverage, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def empty_ranges(coverage: Dict) -> List[Tuple[int, int]]:
+    """
+    [start, end) ranges of the scanned range that hold no data.
+    """
+    return subtract_intervals(coverage["start_ms"], coverage["end_ms"], [tuple(i) for i in coverage["intervals"]])
+
+
+async def _probe_windows(client: AsyncInfoClient, coin: str, interval: str, windows: List[Tuple[int, int]]):
+    async def probe(start: int, end: int):
+        candles = await client.candles_snapshot(coin, interval, start, end - 1) or []
+        return [candle["t"] for candle in candles]
+
+    return await asyncio.gather(*(probe(start, end) for start, end in windows))
+
+
+async def scan_coverage(
+    client: AsyncInfoClient,
+    variants: List[str],
+    interval: str,
+    start_ms: int,
+    end_ms: int,
+    window_ms: int = 24 * 60 * 60 * 1000,
+    remembered: Optional[str] = None,
+) -> Dict:
+    """
+    Probe every window of [start_ms, end_ms) concurrently and build a coverage map.
+
+    Variants are tried in order (a previously resolved one first) until one has any data; a
+    variant the endpoint rejects counts as having none.
+
+    Returns:
+        {"symbol", "variants", "interval", "start_ms", "end_ms", "window_ms",
+         "bitmap": "0110..." one character per window, "intervals": [[start, end], ...] of data}
+    """
+    step_ms = CANDLE_PAGES[interval][0]
+    windows = time_chunks(start_ms, end_ms, window_ms)
+    ordered = ([remembered] if remembered in variants else []) + [v for v in variants if v != remembered]
+
+    symbol, times_per_window = None, [[] for _ in windows]
+    for variant in ordered:
+        try:
+            results = await _probe_windows(client, variant, interval, windows)
+        except Exception as e:
+            logger.error("Error probing %s: %s", variant, e)
+            continue
+        if any(results):
+            symbol, times_per_window = variant, results
+            break
+
+    intervals = merge_intervals((times[0], times[-1] + step_ms) for times in times_per_window if times)
+    return {
+        "symbol": symbol,
+        "variants": variants,
+        "interval": interval,
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "window_ms": window_ms,
+        "bitmap": "".join("1" if times else "0" for times in times_per_window),
+        "intervals": [list(i) for i in intervals],
+    }
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, UTC
+
+from hyperliquid.info import Info
+
+from async_fetch import FUNDING_CHUNK_HOURS, TokenBucket
+from fetch import PERP_COIN, SPOT_COIN, align_legs, fetch_candles_in_batches, fetch_spot_perp_candles
+from fetch_funding_data import fetch_funding_data, fetch_funding_data_async
+from mock_hyperliquid import MockHyperliquidServer
+
+
+def candles():
+    interval = "1m"
+    start_time = int(datetime(2025, 1, 1, tzinfo=UTC).timestamp() * 1000)
+    end_time = int(datetime(2025, 3, 1, tzinfo=UTC).timestamp() * 1000) - 1
+    latency = 0.1  # Seconds per request, roughly a round trip to the real API
+
+    print(f"Two legs of {interval} candles, {datetime.fromtimestamp(start_time / 1000, UTC):%Y-%m-%d} to "
+          f"{datetime.fromtimestamp((end_time + 1) / 1000, UTC):%Y-%m-%d}, {latency * 1000:.0f} ms per request")
+
+    with MockHyperliquidServer(latency=latency) as server:
+        info = Info(server.url, skip_ws=True)
+        requests_before = server.request_count
+        started = time.perf_counter()
+        spot = fetch_candles_in_batches(info, SPOT_COIN, interval, start_time, end_time)
+        perp = fetch_candles_in_batches(info, PERP_COIN, interval, start_time, end_time)
+        serial = align_legs(spot, perp)
+        serial_time = time.perf_counter() - started
+        serial_requests = server.request_count - requests_before
+
+    with MockHyperliquidServer(latency=latency) as server:
+        # Limits loose enough that the comparison measures concurrency rather than the rate limit
+        limiter = TokenBucket(rate=2_000, capacity=400)
+        started = time.perf_counter()
+        parallel = fetch_spot_perp_candles(interval, start_time, end_time, max_concurrency=8,
+                                           base_url=server.url, limiter=limiter)
+        parallel_time = time.perf_counter() - started
+        parallel_requests = server.request_count
+        in_flight = server.max_active_requests
+
+    assert serial.equals(parallel), "serial and concurrent downloads differ"
+    print(f"Serial:     {serial_time:6.2f}s ({serial_requests} requests)")
+    print(f"Concurrent: {parallel_time:6.2f}s ({parallel_requests} requests, up to {in_flight} in flight)")
+    print(f"Speed-up:   {serial_time / parallel_time:.1f}x for {len(parallel):,} aligned rows")
+
+
+def funding():
+    start_date = datetime(2025, 3, 24, tzinfo=UTC)
+    end_date = start_date + timedelta(days=5)
+    latency = 0.1
+
+    print(f"\nFunding history, {start_date:%Y-%m-%d} to {end_date:%Y-%m-%d}, {latency * 1000:.0f} ms per request")
+    with tempfile.TemporaryDirectory() as tmp:
+        with MockHyperliquidServer(latency=latency) as server:
+            started = time.perf_counter()
+            serial = fetch_funding_data("HYPE", start_date, end_date, chunk_hours=4, base_url=server.url,
+                                        output_file=os.path.join(tmp, "serial.csv"),
+                                        manifest_file=os.path.join(tmp, "serial_manifest.sqlite"))
+            serial_time = time.perf_counter() - started
+            serial_requests = server.request_count
+
+        with MockHyperliquidServer(latency=latency) as server:
+            # Hyperliquid's default rate limits, as in a real run
+            started = time.perf_counter()
+            parallel = fetch_funding_data_async("HYPE", start_date, end_date, base_url=server.url,
+                                                output_file=os.path.join(tmp, "async.csv"),
+                                                manifest_file=os.path.join(tmp, "async_manifest.sqlite"))
+            parallel_time = time.perf_counter() - started
+            parallel_requests = server.request_count
+
+    # Every minute of both downloads must match. The price columns are an allMids snapshot taken
+    # when each chunk was saved, so only the columns derived from the funding records are compared
+    records = ['funding_rate', 'premium', 'annualized_rate']
+    assert serial[records].equals(parallel[records]), "serial and concurrent funding differ"
+    print(f"Serial, 4-hour chunks:          {serial_time:6.2f}s ({serial_requests} requests)")
+    print(f"Async, {FUNDING_CHUNK_HOURS}-hour chunks, limited: {parallel_time:6.2f}s ({parallel_requests} requests)")
+    print(f"Speed-up:   {serial_time / parallel_time:.1f}x for {len(parallel):,} rows")
+
+
+def main():
+    candles()
+    funding()
+
+
+if __name__ == "__main__":
+    main()
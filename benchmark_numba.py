@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from end import simulate_delta_neutral
+from engine import FeeSchedule
+from numba_kernel import NUMBA_AVAILABLE, delta_neutral_kernel
+
+
+def synthetic_series(n: int, seed: int = 0) -> tuple[pd.Series, pd.Series, pd.Series]:
+    """
+    Build a synthetic spot/perp/funding series of n rows: a geometric random walk for spot,
+    a small noisy premium for perp and a noisy, mostly positive funding rate.
+    """
+    rng = np.random.default_rng(seed)
+    spot = 25.0 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    perp = spot * (1 + rng.normal(0.0002, 0.001, n))
+    fund = rng.normal(0.00001, 0.00002, n)
+    return pd.Series(spot), pd.Series(perp), pd.Series(fund)
+
+
+def time_call(func, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    n = 5_000_000
+    loop_rows = 200_000  # The row-by-row loop is timed on a slice and scaled up
+    spot, perp, fund = synthetic_series(n)
+    print(f"Synthetic series: {n:,} rows (Numba installed: {NUMBA_AVAILABLE})")
+
+    # end.py defaults
+    fees = FeeSchedule.flat(0.0007, 0.00045, 0.0004, 0.00015, clause_overrides={3: (0.0007, 0.00045)})
+    entry_rates, exit_rates = fees.rate_arrays()
+    params = (100_000, 0.89, 1.1, entry_rates, exit_rates, False, True, 0.00001, 1.0)
+    kernel_args = (spot.to_numpy(), perp.to_numpy(), fund.to_numpy(), *params)
+
+    # Compile (or load from cache) before timing
+    delta_neutral_kernel(spot[:1000].to_numpy(), perp[:1000].to_numpy(), fund[:1000].to_numpy(), *params)
+    kernel_time = time_call(delta_neutral_kernel, *kernel_args)
+    trades = len(delta_neutral_kernel(*kernel_args).exits)
+
+    numba_time = time_call(simulate_delta_neutral, spot, perp, fund, capital=100_000, engine="numba")
+    numpy_time = time_call(simulate_delta_neutral, spot, perp, fund, capital=100_000, engine="numpy")
+    loop_time = time_call(
+        simulate_delta_neutral, spot[:loop_rows], perp[:loop_rows], fund[:loop_rows],
+        capital=100_000, engine="loop",
+    ) * (n / loop_rows)
+
+    print(f"Trades: {trades:,}")
+    print(f"Kernel only:            {kernel_time:8.3f}s")
+    print(f"engine='numba' (full):  {numba_time:8.3f}s")
+    print(f"engine='numpy':         {numpy_time:8.3f}s")
+    print(f"engine='loop' (est.):   {loop_time:8.1f}s  (timed on {loop_rows:,} rows)")
+    print(f"\nKernel speedup vs loop:  {loop_time / kernel_time:,.0f}x")
+    print(f"Kernel speedup vs numpy: {numpy_time / kernel_time:,.1f}x")
+
+
+if __name__ == "__main__":
+    main()
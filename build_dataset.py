@@ -0,0 +1,194 @@
+"""
+Build the aligned spot/perp/funding backtest dataset from the fetchers' output.
+
+Spot and perp candles (segment stores written by fetch.py) are outer-joined on open time, each
+row is given the most recent funding record at or before it with a sorted merge-asof join, and
+the result is written to the columnar store as BACKTEST_DATASET, with the columns of data.json.
+
+The range is processed one calendar month at a time, so only a month of candles and funding is
+in memory at once, and each month becomes one part file of the store.
+"""
+import os
+import shutil
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+import datastore
+from fetch import PERP_COIN, SPOT_COIN
+from manifest import subtract_intervals
+from segments import SegmentStore
+
+# Default inputs, as written by fetch.py and fetch_funding_data.py
+INTERVAL = "1m"
+SPOT_CANDLES = f"candles_{SPOT_COIN}_{INTERVAL}.segments"
+PERP_CANDLES = f"candles_{PERP_COIN}_{INTERVAL}.segments"
+FUNDING_FILE = "hype_funding_rates_1min.csv"
+
+# The backtests run on hourly rows
+FREQ = "1h"
+
+# A funding record older than this is not carried forward onto a candle
+FUNDING_TOLERANCE = pd.Timedelta(hours=2)
+
+# Candle field -> dataset column suffix, in data.json's column order
+CANDLE_COLUMNS = {"o": "open", "c": "close", "h": "high", "l": "low"}
+
+# Funding store column -> dataset column
+FUNDING_COLUMNS = {"premium": "funding_premium", "funding_rate": "funding_fundingRate"}
+
+
+def _utc(value) -> pd.Timestamp:
+    # Naive values are taken as UTC, aware ones are converted to it
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        return timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+
+def _store_range(*stores: SegmentStore):
+    segments = [segment for store in stores for segment in store.segments]
+    if not segments:
+        return None, None
+    start = pd.Timestamp(min(segment["start"] for segment in segments), tz="UTC")
+    end = pd.Timestamp(max(segment["end"] for segment in segments), tz="UTC")
+    return start, end
+
+
+def _month_windows(start: pd.Timestamp, end: pd.Timestamp):
+    """
+    Consecutive [window_start, window_end) windows cut at month boundaries, covering [start, end].
+    """
+    window_start = start
+    while window_start <= end:
+        window_end = window_start.normalize().replace(day=1) + pd.offsets.MonthBegin(1)
+        yield window_start, window_end
+        window_start = window_end
+
+
+def _read_window(store: SegmentStore, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    # SegmentStore ranges are inclusive
+    df = store.read(start, end - pd.Timedelta(1, "ns"))
+    if not df.empty:
+        df.index = pd.DatetimeIndex(df.index).tz_convert("UTC").as_unit("ns")
+    return df
+
+
+def _candle_leg(df: pd.DataFrame, prefix: str, freq: Optional[str]) -> pd.DataFrame:
+    if df.empty:
+        return pd.DataFrame(columns=[f"{prefix}_{name}" for name in CANDLE_COLUMNS.values()],
+                            index=pd.DatetimeIndex([], tz="UTC", name="date_time"), dtype=np.float64)
+    leg = df[list(CANDLE_COLUMNS)].astype(np.float64)
+    if freq is not None:
+        leg = leg.resample(freq).agg({"o": "first", "c": "last", "h": "max", "l": "min"}).dropna(how="all")
+    leg.columns = [f"{prefix}_{CANDLE_COLUMNS[field]}" for field in leg.columns]
+    leg.index.name = "date_time"
+    return leg
+
+
+def align_window(spot: pd.DataFrame, perp: pd.DataFrame, funding: pd.DataFrame, freq: Optional[str] = None,
+                 tolerance: pd.Timedelta = FUNDING_TOLERANCE) -> pd.DataFrame:
+    """
+    Join one window of spot candles, perp candles and funding into the dataset's columns.
+
+    Args:
+        spot, perp: Raw candles (columns o, h, l, c as stored by fetch.py) indexed by UTC open time
+        funding: Funding frame (funding_rate, premium) indexed by UTC time, starting at or before
+            the window so the first candles have a funding value to look back to
+        freq: Resample the candles to this frequency (e.g. "1h") before joining, None to keep them as is
+        tolerance: Maximum age of the funding record assigned to a candle
+
+    Returns:
+        Frame with timestamp (epoch seconds), date_time, spot_*/perp_* OHLC and funding columns
+    """
+    candles = _candle_leg(spot, "spot", freq).join(_candle_leg(perp, "perp", freq), how="outer").sort_index()
+    candles = candles.reset_index()
+
+    if funding.empty:
+        rates = pd.DataFrame({"date_time": pd.DatetimeIndex([], tz="UTC").as_unit("ns")})
+        for column in FUNDING_COLUMNS.values():
+            rates[column] = np.array([], dtype=np.float64)
+    else:
+        rates = funding[list(FUNDING_COLUMNS)].astype(np.float64).rename(columns=FUNDING_COLUMNS)
+        rates = rates[~rates.index.duplicated(keep="last")].sort_index()
+        rates.index.name = "date_time"
+        rates = rates.reset_index()
+    candles["date_time"] = candles["date_time"].astype("datetime64[ns, UTC]")
+    rates["date_time"] = rates["date_time"].astype("datetime64[ns, UTC]")
+
+    df = pd.merge_asof(candles, rates, on="date_time", direction="backward", tolerance=tolerance)
+    df.insert(0, "timestamp", df["date_time"].astype("int64") // 1_000_000_000)
+    df["date_time"] = df["date_time"].dt.tz_localize(None).astype("datetime64[s]")
+    return df
+
+
+def build_dataset(
+    spot_store: SegmentStore,
+    perp_store: SegmentStore,
+    funding_store: SegmentStore,
+    dataset: str = datastore.BACKTEST_DATASET,
+    store_dir: str = datastore.STORE_DIR,
+    freq: Optional[str] = None,
+    tolerance: pd.Timedelta = FUNDING_TOLERANCE,
+    start=None,
+    end=None,
+    skip=None,
+) -> int:
+    """
+    Build the aligned dataset month by month and write it to the columnar store, replacing any
+    previous copy.
+
+    Args:
+        spot_store, perp_store: Candle segment stores
+        funding_store: Funding segment store
+        freq: Resample the candles to this frequency (e.g. "1h" for 1m candles), None to keep them
+        start, end: Range to build (naive values are UTC), the candles' full range if None
+        skip: [start_ms, end_ms) ranges known to hold no candles (availability.empty_ranges of
+            a coverage map); months entirely inside them are not read
+
+    Returns:
+        Number of rows written
+    """
+    range_start, range_end = _store_range(spot_store, perp_store)
+    if range_start is None:
+        return 0
+    start = _utc(start) if start is not None else range_start
+    end = _utc(end) if end is not None else range_end
+
+    target = os.path.join(store_dir, dataset)
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+
+    rows = 0
+    skip = [tuple(interval) for interval in skip or []]
+    for window_start, window_end in _month_windows(start, end):
+        window_ms = (int(window_start.timestamp() * 1000), int(window_end.timestamp() * 1000))
+        if skip and not subtract_intervals(*window_ms, skip):
+            continue
+        spot = _read_window(spot_store, window_start, window_end)
+        perp = _read_window(perp_store, window_start, window_end)
+        if spot.empty and perp.empty:
+            continue
+        funding = _read_window(funding_store, window_start - tolerance, window_end)
+        df = align_window(spot, perp, funding, freq, tolerance)
+        df = df[(df["timestamp"] >= start.timestamp()) & (df["timestamp"] <= end.timestamp())]
+        if df.empty:
+            continue
+        datastore.write(df, dataset, store_dir=store_dir, part_name="part-00000")
+        rows += len(df)
+        print(f"{window_start:%Y-%m}: {len(df)} rows")
+    return rows
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+    rows = build_dataset(
+        SegmentStore(SPOT_CANDLES),
+        SegmentStore(PERP_CANDLES),
+        SegmentStore.for_csv(FUNDING_FILE),
+        freq=FREQ,
+    )
+    print(f"Built {rows} rows into {os.path.join(datastore.STORE_DIR, datastore.BACKTEST_DATASET)} "
+          f"in {time.time() - start_time:.2f}s")
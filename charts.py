@@ -0,0 +1,375 @@
+"""
+Headless chart rendering for the backtest and report scripts.
+
+Charts are queued as ChartJobs (an output PNG, a module-level plot function and its input
+data) and rendered together by ChartQueue.render on a process pool with the Agg backend,
+instead of one after another in the main process once the simulation is done. Before a job is
+submitted, its input hash is compared with the one recorded when the PNG was last drawn, and
+unchanged charts are skipped. Long line series are reduced to about DISPLAY_POINTS points by
+LTTB (or min/max decimation, which keeps every extreme) before plotting, because a 12-inch
+figure cannot show more than that anyway.
+
+Usage:
+    queue = ChartQueue()
+    queue.add("equity_curve.png", plot_equity_curve, daily_capital=daily_capital)
+    queue.render()
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+# Record of input hashes of the charts drawn, next to the PNGs by default
+CHART_HASHES = "chart_hashes.json"
+
+# Points kept per plotted line; about the horizontal resolution of a 12-inch, 300-dpi figure
+DISPLAY_POINTS = 4000
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of n_out points that keep the visual shape of (x, y).
+
+    The first and last points are kept. The rest are split into n_out - 2 buckets, and each
+    bucket keeps the point forming the largest triangle with the point kept from the previous
+    bucket and the mean of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+
+def minmax_decimate(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the minimum and maximum of each of n_out / 2 buckets, in order, plus the endpoints.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(np.int64)
+    lows = [lo + int(np.argmin(y[lo:hi])) for lo, hi in zip(edges[:-1], edges[1:])]
+    highs = [lo + int(np.argmax(y[lo:hi])) for lo, hi in zip(edges[:-1], edges[1:])]
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+
+def downsample(series: pd.Series, n_out: int = DISPLAY_POINTS, method: str = "lttb") -> pd.Series:
+    """
+    Reduce a series to at most about n_out points for plotting; shorter series are returned as is.
+
+    Args:
+        series: Values indexed by their x (numbers or datetimes)
+        n_out: Points to keep
+        method: "lttb" (shape) or "minmax" (keeps every local extreme, e.g. for drawdowns)
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"method must be one of {DOWNSAMPLE_METHODS}, got {method!r}")
+    if len(series) <= n_out:
+        return series
+    series = series.dropna()
+    if method == "lttb":
+        index = series.index
+        x = index.asi8 if isinstance(index, pd.DatetimeIndex) else index.to_numpy(dtype=np.float64)
+        idx = lttb(x, series.to_numpy(), n_out)
+    else:
+        idx = minmax_decimate(series.to_numpy(), n_out)
+    return series.iloc[idx]
+
+
+class ChartJob(NamedTuple):
+    """
+    One chart: plot(path, **data) draws it into path.
+    """
+    path: str
+    plot: Callable
+    data: Dict
+
+
+def _hash_value(h, value):
+    if isinstance(value, (pd.Series, pd.DataFrame, pd.Index)):
+        h.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+        if isinstance(value, pd.DataFrame):
+            h.update(repr(list(value.columns)).encode())
+    elif isinstance(value, np.ndarray):
+        h.update(repr((value.dtype.str, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    else:
+        h.update(repr(value).encode())
+
+
+def job_hash(job: ChartJob) -> str:
+    """
+    Hash of a job's plot function and input data (not of its output path).
+    """
+    h = hashlib.sha256(f"{job.plot.__module__}.{job.plot.__qualname__}".encode())
+    for name in sorted(job.data):
+        h.update(name.encode())
+        _hash_value(h, job.data[name])
+    return h.hexdigest()[:16]
+
+
+def _render(job: ChartJob) -> str:
+    # Every job starts from the default style, whatever the previous job in this process set
+    plt.rcdefaults()
+    job.plot(job.path, **job.data)
+    plt.close("all")
+    return job.path
+
+
+class ChartQueue:
+    """
+    Charts to render, drawn together on a process pool.
+
+    Workers are forked where the platform can fork, so scripts without an
+    `if __name__ == "__main__"` guard (endi.py) can queue charts too. Elsewhere the pool has to
+    spawn workers, which re-import the main script, so charts are rendered in this process
+    unless max_workers is given.
+
+    Args:
+        hash_file: Where the input hashes of drawn charts are kept, or None to always redraw
+        max_workers: Pool size, defaults to all cores; 1 renders in this process
+    """
+
+    def __init__(self, hash_file: Optional[str] = CHART_HASHES, max_workers: Optional[int] = None):
+        self.hash_file = hash_file
+        self.max_workers = max_workers
+        self.jobs: List[ChartJob] = []
+
+    def add(self, path: str, plot: Callable, **data):
+        """
+        Queue plot(path, **data). plot must be a module-level function, so workers can import it.
+        """
+        self.jobs.append(ChartJob(path, plot, data))
+
+    def _load_hashes(self) -> Dict[str, str]:
+        try:
+            with open(self.hash_file) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def render(self) -> List[str]:
+        """
+        Draw the queued charts whose input changed or whose file is missing, then empty the queue.
+
+        Returns:
+            The paths that were drawn
+        """
+        hashes = self._load_hashes() if self.hash_file is not None else {}
+        pending, digests = [], {}
+        for job in self.jobs:
+            digest = job_hash(job)
+            if hashes.get(job.path) == digest and os.path.exists(job.path):
+                continue
+            pending.append(job)
+            digests[job.path] = digest
+        self.jobs = []
+
+        can_fork = "fork" in multiprocessing.get_all_start_methods()
+        max_workers = self.max_workers or (os.cpu_count() if can_fork else 1)
+        max_workers = min(max_workers, len(pending))
+        if max_workers <= 1:
+            drawn = [_render(job) for job in pending]
+        else:
+            context = multiprocessing.get_context("fork") if can_fork else None
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+                drawn = list(executor.map(_render, pending))
+
+        if self.hash_file is not None and drawn:
+            hashes.update((path, digests[path]) for path in drawn)
+            directory = os.path.dirname(self.hash_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.hash_file, "w") as f:
+                json.dump(hashes, f, indent=1)
+        return drawn
+
+
+# -----------------------------------------------------------------------------
+# Report charts (report.py)
+# -----------------------------------------------------------------------------
+
+REPORT_DPI = 300
+
+
+def plot_equity_curve(path: str, daily_capital: pd.Series):
+    daily_capital = downsample(daily_capital)
+    plt.style.use('seaborn-v0_8-darkgrid')
+    plt.figure(figsize=(12, 6))
+    plt.plot(daily_capital.index, daily_capital, label='Strategy Equity', color='blue', linewidth=2)
+    plt.title('Equity Curve', fontsize=16, fontweight='bold')
+    plt.xlabel('Date', fontsize=12)
+    plt.ylabel('Portfolio Value ($)', fontsize=12)
+    plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(path, dpi=REPORT_DPI)
+    plt.close()
+
+
+def plot_drawdown(path: str, daily_drawdown: pd.Series):
+    daily_drawdown = downsample(daily_drawdown, method="minmax")
+    plt.style.use('seaborn-v0_8-darkgrid')
+    plt.figure(figsize=(12, 6))
+    plt.fill_between(daily_drawdown.index, daily_drawdown * 100, 0, color='red', alpha=0.3)
+    plt.plot(daily_drawdown.index, daily_drawdown * 100, color='red', linewidth=1.5, label='Drawdown')
+    plt.title('Drawdown Profile', fontsize=16, fontweight='bold')
+    plt.xlabel('Date', fontsize=12)
+    plt.ylabel('Drawdown (%)', fontsize=12)
+    plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda y, p: f'{y:.1f}%'))
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(path, dpi=REPORT_DPI)
+    plt.close()
+
+
+# -----------------------------------------------------------------------------
+# Backtest charts (end.py, end2.py)
+# -----------------------------------------------------------------------------
+
+def plot_running_trade_capital(path: str, capital: pd.Series, initial_capital: float = 100_000):
+    """
+    Running capital after each exit, indexed by exit time.
+    """
+    capital = downsample(capital)
+    plt.figure(figsize=(12, 6))
+    plt.plot(capital.index, capital, linewidth=2, color='blue')
+    plt.title('Running Trade Capital Over Time', fontsize=14, fontweight='bold')
+    plt.xlabel('Exit Time', fontsize=12)
+    plt.ylabel('Running Trade Capital ($)', fontsize=12)
+    plt.grid(True, alpha=0.3)
+
+    # Add horizontal line for initial capital
+    plt.axhline(y=initial_capital, color='red', linestyle='--', alpha=0.7,
+                label=f'Initial Capital (${initial_capital:,.0f})')
+    plt.legend()
+
+    # Format y-axis to show currency
+    plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+# -----------------------------------------------------------------------------
+# Trade analysis charts (endi.py), seaborn styled
+# -----------------------------------------------------------------------------
+
+def _seaborn_style():
+    import seaborn as sns  # Only the endi.py charts need seaborn
+    sns.set(style="darkgrid")
+    return sns
+
+
+def plot_cumulative_yield_percent(path: str, cum_yield_before_pct: pd.Series, cum_yield_after_pct: pd.Series):
+    """
+    Cumulative yield before and after fees as % of initial capital, indexed by exit time.
+    """
+    _seaborn_style()
+    plt.figure(figsize=(10, 6))
+    before = downsample(cum_yield_before_pct)
+    after = downsample(cum_yield_after_pct)
+    plt.plot(before.index, before, label="Cumulative Yield Before Fees (%)")
+    plt.plot(after.index, after, label="Cumulative Yield After Fees (%)")
+    plt.xlabel("Exit Time")
+    plt.ylabel("Cumulative Yield (% of Initial Capital)")
+    plt.title("Cumulative Strategy Yield as % of Capital")
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def plot_duration_vs_yield(path: str, trades: pd.DataFrame):
+    """
+    Scatter of trades' duration_hours against yield_after_fees, coloured by exit_clause.
+    """
+    sns = _seaborn_style()
+    plt.figure(figsize=(8, 6))
+    sns.scatterplot(
+        data=trades,
+        x="duration_hours",
+        y="yield_after_fees",
+        hue="exit_clause",
+        palette="viridis",
+    )
+    plt.xlabel("Trade Duration (hours)")
+    plt.ylabel("Yield After Fees (USDC)")
+    plt.title("Trade Duration vs. Yield After Fees")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def plot_yield_histogram(path: str, yield_after_fees: pd.Series):
+    sns = _seaborn_style()
+    plt.figure(figsize=(8, 6))
+    sns.histplot(yield_after_fees, bins=50, kde=True)
+    plt.xlabel("Yield After Fees (USDC)")
+    plt.title("Distribution of Trade Yields (After Fees)")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def plot_yield_and_apr(path: str, cum_yield_before_pct: pd.Series, cum_yield_after_pct: pd.Series,
+                       apr_after_fees: pd.Series):
+    """
+    Cumulative yield % (left axis) and APR after fees (right axis), all indexed by exit time.
+    """
+    _seaborn_style()
+    before = downsample(cum_yield_before_pct)
+    after = downsample(cum_yield_after_pct)
+    apr = downsample(apr_after_fees)
+
+    # Create the plot with dual y-axes for yield and APR
+    fig, ax1 = plt.subplots(figsize=(12, 7))
+
+    # Plot cumulative yield % on the primary y-axis (ax1)
+    ax1.plot(before.index, before, "g-", label="Cumulative Yield Before Fees (%)")
+    ax1.plot(after.index, after, "b-", label="Cumulative Yield After Fees (%)")
+    ax1.set_xlabel("Time")
+    ax1.set_ylabel("Cumulative Yield (%)", color="b")
+    ax1.tick_params("y", colors="b")
+
+    # Create a secondary y-axis (ax2) for the APR
+    ax2 = ax1.twinx()
+    ax2.plot(apr.index, apr, "r--", label="APR After Fees (%)")
+    ax2.set_ylabel("Annual Percentage Rate (APR %)", color="r")
+    ax2.tick_params("y", colors="r")
+
+    # Add a title and legend
+    plt.title("Cumulative Yield and APR Over Time")
+    fig.tight_layout()
+    fig.legend(loc="upper left", bbox_to_anchor=(0.1, 0.9))
+    plt.savefig(path)
+    plt.close()
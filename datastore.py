@@ -0,0 +1,239 @@
+import os
+import shutil
+import sys
+import time
+import uuid
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from json_loader import load_json_frame
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Root directory of the columnar store. Each dataset lives in STORE_DIR/<dataset>/month=YYYY-MM/
+# as one or more part files, so a loader only opens the months it needs.
+STORE_DIR = "store"
+
+# Dataset holding the aligned spot/perp/funding history used by the backtests
+BACKTEST_DATASET = "hype_backtest"
+
+# Legacy inputs, used when the store has not been built yet
+LEGACY_CSV = "data (1).csv"
+LEGACY_JSON = "data.json"
+
+# Column holding epoch seconds; it is the partition and range-filter key
+TIME_COLUMN = "timestamp"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The columnar store needs pyarrow: pip install pyarrow")
+
+
+def _to_epoch_seconds(value) -> int:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return int(ts.timestamp())
+
+
+def _month_key(epoch_seconds) -> np.ndarray:
+    return pd.to_datetime(epoch_seconds, unit="s").strftime("%Y-%m").to_numpy()
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give a raw backtest frame (as read from data.json or the CSV) proper types: int64 epoch
+    seconds in `timestamp`, datetime64 in `date_time` and float64 everywhere else. Empty or
+    malformed numbers become NaN.
+    """
+    out = pd.DataFrame(index=range(len(df)))
+    for column in df.columns:
+        values = df[column].reset_index(drop=True)
+        if column == TIME_COLUMN:
+            out[column] = pd.to_numeric(values).astype(np.int64)
+        elif column == "date_time":
+            out[column] = pd.to_datetime(values)
+        else:
+            out[column] = pd.to_numeric(values, errors="coerce").astype(np.float64)
+    if TIME_COLUMN not in out and "date_time" in out:
+        out.insert(0, TIME_COLUMN, out["date_time"].astype("datetime64[s]").astype(np.int64))
+    return out
+
+
+def write(
+    df: pd.DataFrame,
+    dataset: str,
+    store_dir: str = STORE_DIR,
+    fmt: str = "parquet",
+    part_name: Optional[str] = None,
+) -> List[str]:
+    """
+    Write a typed frame to the store, one part file per calendar month.
+
+    Existing parts are left alone, so streaming writers can call this once per chunk.
+
+    Args:
+        df: Frame with an int64 `timestamp` column in epoch seconds
+        dataset: Dataset name (sub-directory of store_dir)
+        store_dir: Store root directory
+        fmt: "parquet" (zstd-compressed) or "feather" (uncompressed Arrow IPC, zero-copy memory-mapped on load)
+        part_name: Part file name without extension, random if not given
+
+    Returns:
+        Paths of the part files written
+    """
+    _require_pyarrow()
+    if fmt not in ("parquet", "feather"):
+        raise ValueError(f"Unknown format '{fmt}', expected 'parquet' or 'feather'")
+    part_name = part_name or uuid.uuid4().hex
+    df = df.sort_values(TIME_COLUMN, kind="stable")
+    months = _month_key(df[TIME_COLUMN].to_numpy())
+
+    paths = []
+    for month in pd.unique(months):
+        table = pa.Table.from_pandas(df[months == month], preserve_index=False)
+        month_dir = os.path.join(store_dir, dataset, f"month={month}")
+        os.makedirs(month_dir, exist_ok=True)
+        path = os.path.join(month_dir, f"{part_name}.{fmt}")
+        if fmt == "parquet":
+            pq.write_table(table, path, compression="zstd")
+        else:
+            feather.write_feather(table, path, compression="uncompressed")
+        paths.append(path)
+    return paths
+
+
+def exists(dataset: str, store_dir: str = STORE_DIR) -> bool:
+    return os.path.isdir(os.path.join(store_dir, dataset))
+
+
+def load(
+    dataset: str,
+    columns: Optional[List[str]] = None,
+    start=None,
+    end=None,
+    store_dir: str = STORE_DIR,
+) -> pd.DataFrame:
+    """
+    Load a dataset from the store, reading only the requested columns and months.
+
+    Args:
+        dataset: Dataset name
+        columns: Columns to load, all if None
+        start: Inclusive start (datetime, string or pd.Timestamp; naive values are UTC), unbounded if None
+        end: Exclusive end, unbounded if None
+        store_dir: Store root directory
+
+    Returns:
+        DataFrame sorted by timestamp
+    """
+    _require_pyarrow()
+    root = os.path.join(store_dir, dataset)
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Dataset '{dataset}' not found in {store_dir}")
+
+    start_s = _to_epoch_seconds(start) if start is not None else None
+    end_s = _to_epoch_seconds(end) if end is not None else None
+    first_month = _month_key([start_s])[0] if start_s is not None else None
+    last_month = _month_key([end_s - 1])[0] if end_s is not None else None
+
+    # The time column is needed for range filtering even if the caller did not ask for it
+    read_columns = None
+    if columns is not None:
+        read_columns = list(columns)
+        if (start_s is not None or end_s is not None) and TIME_COLUMN not in read_columns:
+            read_columns.append(TIME_COLUMN)
+
+    tables = []
+    for month_dir in sorted(os.listdir(root)):
+        month = month_dir.split("=", 1)[-1]
+        if (first_month and month < first_month) or (last_month and month > last_month):
+            continue
+        for name in sorted(os.listdir(os.path.join(root, month_dir))):
+            path = os.path.join(root, month_dir, name)
+            if name.endswith(".parquet"):
+                tables.append(pq.read_table(path, columns=read_columns, memory_map=True))
+            elif name.endswith(".feather"):
+                tables.append(feather.read_table(path, columns=read_columns, memory_map=True))
+
+    if not tables:
+        return pd.DataFrame(columns=columns)
+    table = pa.concat_tables(tables)
+    if start_s is not None:
+        table = table.filter(pc.greater_equal(table[TIME_COLUMN], start_s))
+    if end_s is not None:
+        table = table.filter(pc.less(table[TIME_COLUMN], end_s))
+    df = table.to_pandas()
+    if TIME_COLUMN in df:
+        df = df.sort_values(TIME_COLUMN, kind="stable", ignore_index=True)
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def ingest(source: str, dataset: str = BACKTEST_DATASET, store_dir: str = STORE_DIR, fmt: str = "parquet") -> int:
+    """
+    Convert data.json or "data (1).csv" into a typed, month-partitioned dataset, replacing any previous copy.
+
+    Returns:
+        Number of rows written
+    """
+    if source.endswith(".json"):
+        df = load_json_frame(source)
+    else:
+        df = normalize_frame(pd.read_csv(source, dtype=str, keep_default_na=False))
+
+    target = os.path.join(store_dir, dataset)
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    write(df, dataset, store_dir=store_dir, fmt=fmt, part_name="part-00000")
+    return len(df)
+
+
+def load_backtest_data(columns: Optional[List[str]] = None, start=None, end=None, store_dir: str = STORE_DIR) -> pd.DataFrame:
+    """
+    Load the aligned spot/perp/funding backtest input.
+
+    Reads the columnar store when it has been built (python datastore.py) and falls back to
+    parsing "data (1).csv", or streaming data.json when there is no CSV, otherwise.
+    """
+    if pa is not None and exists(BACKTEST_DATASET, store_dir):
+        return load(BACKTEST_DATASET, columns=columns, start=start, end=end, store_dir=store_dir)
+
+    if os.path.exists(LEGACY_CSV) or not os.path.exists(LEGACY_JSON):
+        df = pd.read_csv(LEGACY_CSV, parse_dates=["date_time"] if columns is None or "date_time" in columns else None)
+    else:
+        read_columns = None
+        if columns is not None:
+            read_columns = list(columns) + [TIME_COLUMN] * (TIME_COLUMN not in columns)
+        df = load_json_frame(LEGACY_JSON, read_columns)
+    if start is not None or end is not None:
+        times = df[TIME_COLUMN] if TIME_COLUMN in df else df["date_time"].astype("datetime64[s]").astype(np.int64)
+        mask = np.ones(len(df), dtype=bool)
+        if start is not None:
+            mask &= times.to_numpy() >= _to_epoch_seconds(start)
+        if end is not None:
+            mask &= times.to_numpy() < _to_epoch_seconds(end)
+        df = df[mask].reset_index(drop=True)
+    return df[list(columns)] if columns is not None else df
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        source = sys.argv[1]
+    else:
+        source = LEGACY_CSV if os.path.exists(LEGACY_CSV) else LEGACY_JSON
+
+    start_time = time.time()
+    rows = ingest(source)
+    print(f"Ingested {rows} rows from {source} into {os.path.join(STORE_DIR, BACKTEST_DATASET)} "
+          f"in {time.time() - start_time:.2f}s")
@@ -0,0 +1,518 @@
+import warnings
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from accumulators import FundingAccumulator
+from ledger import ENTRY, ENTRY_REASON, EXIT, EXIT_REASON_MAP, TradeLedger  # noqa: F401  (reason strings re-exported)
+from numba_kernel import NUMBA_AVAILABLE, delta_neutral_kernel
+
+# Values of simulate()'s outputs argument
+OUTPUTS = ("full", "equity", "ledger")
+
+
+@dataclass(frozen=True)
+class FeeSchedule:
+    """
+    Trading fee rates per leg, for the entry and for each exit clause.
+
+    spot_exit and perp_exit hold the exit rates for clauses 1 (stop-loss), 2 (perp < spot) and
+    3 (fund_rate < thresh), in that order. With notional=False both legs are charged on the
+    allocated capital; with notional=True each leg is charged on its notional, i.e. the tokens
+    bought at entry times that leg's price at entry or at exit.
+    """
+    spot_entry: float
+    perp_entry: float
+    spot_exit: Tuple[float, float, float]
+    perp_exit: Tuple[float, float, float]
+    notional: bool = False
+
+    @classmethod
+    def flat(
+        cls,
+        spot_entry: float,
+        perp_entry: float,
+        spot_exit: float,
+        perp_exit: float,
+        clause_overrides: Optional[Dict[int, Tuple[float, float]]] = None,
+    ) -> "FeeSchedule":
+        """
+        Fees charged on the allocated capital, with the same exit rates for every clause
+        except those listed in clause_overrides ({clause: (spot rate, perp rate)}).
+        """
+        clause_overrides = clause_overrides or {}
+        exits = [clause_overrides.get(clause, (spot_exit, perp_exit)) for clause in (1, 2, 3)]
+        return cls(
+            spot_entry, perp_entry,
+            tuple(spot for spot, _ in exits), tuple(perp for _, perp in exits),
+        )
+
+    @classmethod
+    def notional_based(cls, fee_spot: float, fee_perp: float) -> "FeeSchedule":
+        """
+        Fees charged on each leg's notional, with the same rates on entry and on every exit.
+        """
+        return cls(fee_spot, fee_perp, (fee_spot,) * 3, (fee_perp,) * 3, notional=True)
+
+    def entry_cost(self, allocated_capital: float, spot_price: float, perp_price: float) -> float:
+        if self.notional:
+            tokens = allocated_capital / spot_price
+            return (tokens * spot_price * self.spot_entry) + (tokens * perp_price * self.perp_entry)
+        return allocated_capital * (self.spot_entry + self.perp_entry)
+
+    def exit_cost(
+        self, clause: int, allocated_capital: float, entry_spot: float, spot_price: float, perp_price: float,
+    ) -> float:
+        spot_rate = self.spot_exit[clause - 1]
+        perp_rate = self.perp_exit[clause - 1]
+        if self.notional:
+            tokens = allocated_capital / entry_spot
+            return (tokens * spot_price * spot_rate) + (tokens * perp_price * perp_rate)
+        return allocated_capital * (spot_rate + perp_rate)
+
+    def rate_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the entry rates as a (spot, perp) array and the exit rates as a (4, 2) array
+        indexed by exit clause (row 0 unused), the layout the Numba kernel expects.
+        """
+        exit_rates = np.zeros((4, 2))
+        exit_rates[1:, 0] = self.spot_exit
+        exit_rates[1:, 1] = self.perp_exit
+        return np.array([self.spot_entry, self.perp_entry]), exit_rates
+
+
+def simulate(
+    spot_prices: pd.Series,
+    perp_prices: pd.Series,
+    funding_rates: pd.Series,
+    fees: FeeSchedule,
+    capital: float = 23_000,
+    a: float = 89/100,
+    sl_mult: float = 1.1,
+    fund_thresh: float = 0.00001,
+    spot_price_exit_multiplier: float = 1.0,
+    compound: bool = True,
+    engine: str = "numpy",
+    outputs: str = "full",
+) -> tuple[Optional[pd.DataFrame], dict, Union[pd.DataFrame, TradeLedger], float]:
+    """
+    Simulates the delta-neutral funding strategy for any fee schedule.
+
+    A trade is entered when the perpetual price is above the spot price and the funding rate is above
+    fund_thresh. It is exited on the first of: clause 1, the perpetual price reaches sl_mult times its entry
+    price (stop-loss); clause 2, the perpetual price falls below spot_price_exit_multiplier times the spot
+    price; clause 3, the funding rate falls below fund_thresh.
+
+    Parameters:
+    - spot_prices (pd.Series): Time series of spot prices.
+    - perp_prices (pd.Series): Time series of perpetual futures prices.
+    - funding_rates (pd.Series): Time series of funding rates (positive means position earns funding).
+    - fees (FeeSchedule): Entry and per-clause exit fees.
+    - capital (float): Total trading capital. Default is 23,000.
+    - a (float): Fraction of capital allocated to each trade. Default is 89/100.
+    - sl_mult (float): Stop-loss multiplier for perpetual price. Default is 1.1.
+    - fund_thresh (float): Funding rate threshold for entry and exit. Default is 0.00001.
+    - spot_price_exit_multiplier (float): Multiplier for the spot price in the exit condition. Default is 1.0.
+    - compound (bool): Allocate a fraction of the running capital (True) or of the initial capital (False). Default is True.
+    - engine (str): "numpy" for the array-based engine, "numba" for the compiled state-machine kernel (plain Python if Numba is not installed),
+      "loop" for the original row-by-row loop. All three return identical results. Default is "numpy".
+    - outputs (str): What to materialise. "full" (default) returns the per-row DataFrame and the trade DataFrame;
+      "equity" returns only the cumulative yield and equity columns, rebuilt from the ledger, and the TradeLedger;
+      "ledger" returns None and the TradeLedger, for callers such as sweeps that only need the trades.
+
+    Returns:
+    - df (pd.DataFrame): DataFrame with columns for spot, perp, fund_rate, entry, exit, exit_clause, yield_before_fees, yield_after_fees
+      and equity, the mark-to-market capital (see TradeLedger.mark_to_market). It keeps the index of the input series, so with
+      a DatetimeIndex the equity can be resampled with resample_equity and the trade times are timestamps.
+      With outputs="equity", only yield_before_fees, yield_after_fees and equity; with outputs="ledger", None.
+    - stats (dict): Dictionary with counts of each exit clause (1: stop-loss, 2: perp < spot, 3: fund_rate < thresh).
+    - trade_df (pd.DataFrame): DataFrame with detailed information for each trade (a TradeLedger unless outputs="full";
+      its to_frame() gives the DataFrame, with the times as labels of the rows left after dropping missing values).
+    - time_utilization_percentage (float): Percentage of time the strategy is in play.
+    """
+    df = pd.DataFrame({
+        'spot': spot_prices,
+        'perp': perp_prices,
+        'fund_rate': funding_rates,
+    }).dropna()
+
+    if engine == "numpy":
+        simulate_engine = _simulate_numpy
+    elif engine == "numba":
+        simulate_engine = _simulate_numba
+    elif engine == "loop":
+        simulate_engine = _simulate_loop
+    else:
+        raise ValueError(f"Unknown engine '{engine}', expected 'numpy', 'numba' or 'loop'")
+    if outputs not in OUTPUTS:
+        raise ValueError(f"Unknown outputs '{outputs}', expected 'full', 'equity' or 'ledger'")
+    return simulate_engine(df, fees, capital, a, sl_mult, fund_thresh, spot_price_exit_multiplier, compound, outputs)
+
+
+def span_days(index: pd.Index) -> float:
+    """
+    Length in days of the period covered by a time index, counting the last bar in full.
+
+    The bar size is the median spacing of the index, so hourly, minute or irregular data all give
+    calendar days rather than a row count divided by 24.
+    """
+    if len(index) == 0:
+        return 0.0
+    times = pd.DatetimeIndex(index)
+    bar = pd.Series(times).diff().median() if len(times) > 1 else pd.Timedelta(0)
+    return (times[-1] - times[0] + bar) / pd.Timedelta(days=1)
+
+
+def resample_equity(equity: pd.Series, freq: str = "D") -> pd.Series:
+    """
+    Equity at the end of each period of `freq` (e.g. "h", "D", "W"), carried forward over empty periods.
+
+    Args:
+        equity: Mark-to-market equity indexed by time, such as simulate()'s equity column
+        freq: pandas offset alias of the period
+    """
+    return equity.resample(freq).last().ffill()
+
+
+def _next_index(positions: np.ndarray, start: int, n: int) -> int:
+    """
+    Returns the first value in the sorted array `positions` that is >= start, or n if there is none.
+    """
+    k = np.searchsorted(positions, start)
+    return int(positions[k]) if k < len(positions) else n
+
+
+def _build_outputs(
+    df: pd.DataFrame,
+    capital: float,
+    entries, allocated, entry_fees,
+    exits, clauses, exit_fees,
+    pnl_before, pnl_after,
+    active_trading_periods: int,
+    outputs: str = "full",
+):
+    """
+    Collects per-trade arrays (as produced by the numpy and numba engines) into the exit clause
+    stats and trade ledger returned by simulate(), plus the per-row columns that `outputs` asks for.
+    """
+    spot = df['spot'].to_numpy(dtype=float)
+    perp = df['perp'].to_numpy(dtype=float)
+    fund = df['fund_rate'].to_numpy(dtype=float)
+    n = len(df)
+
+    entries = np.asarray(entries, dtype=np.int64)
+    allocated = np.asarray(allocated, dtype=np.float64)
+    exits = np.asarray(exits, dtype=np.int64)
+    clauses = np.asarray(clauses, dtype=np.int64)
+    pnl_before = np.asarray(pnl_before, dtype=np.float64)
+    pnl_after = np.asarray(pnl_after, dtype=np.float64)
+    n_exits = len(exits)
+    stats = {clause: int((clauses == clause).sum()) for clause in (1, 2, 3)}
+
+    # Running PnL after each exit, summed sequentially like the loop engine
+    cum_after = np.cumsum(pnl_after) if n_exits else np.zeros(0)
+    cum_before_entry = np.concatenate(([0.0], cum_after))[:len(entries)]
+
+    # Entries and exits interleave: entry k is row 2k, exit k is row 2k + 1
+    rows = len(entries) + n_exits
+    positions = np.empty(rows, dtype=np.int64)
+    positions[0::2] = entries
+    positions[1::2] = exits
+    is_exit = np.zeros(rows, dtype=bool)
+    is_exit[1::2] = True
+    cumulative = np.empty(rows)
+    cumulative[0::2] = cum_before_entry
+    cumulative[1::2] = cum_after
+    row_fees = np.empty(rows)
+    row_fees[0::2] = entry_fees
+    row_fees[1::2] = exit_fees
+    before = np.zeros(rows)
+    before[1::2] = pnl_before
+    after = np.zeros(rows)
+    after[1::2] = pnl_after
+    reasons = np.zeros(rows, dtype=np.int8)
+    reasons[1::2] = clauses
+
+    ledger = TradeLedger(rows)
+    ledger.extend(
+        time=positions,
+        type=np.where(is_exit, EXIT, ENTRY),
+        spot_price=spot[positions],
+        perp_price=perp[positions],
+        funding_rate=fund[positions],
+        allocated_capital=np.repeat(allocated, 2)[:rows],
+        current_capital=capital + cumulative,
+        reason=reasons,
+        fees=row_fees,
+        trade_pnl_before_fees=before,
+        trade_pnl_after_fees=after,
+        cumulative_pnl_after_fees=cumulative,
+    )
+
+    time_utilization_percentage = (active_trading_periods / n) * 100 if n > 0 else 0
+    if outputs != "full":
+        return _select_outputs(df, stats, ledger, time_utilization_percentage, outputs, capital)
+
+    entry_flags = np.zeros(n, dtype=bool)
+    entry_flags[entries] = True
+    exit_flags = np.zeros(n, dtype=bool)
+    exit_flags[exits] = True
+    exit_clauses = np.zeros(n, dtype=np.int64)
+    exit_clauses[exits] = clauses
+
+    df['entry'] = entry_flags
+    df['exit'] = exit_flags
+    df['exit_clause'] = exit_clauses
+    df['yield_before_fees'], df['yield_after_fees'] = ledger.yields(n)
+    df['equity'] = ledger.mark_to_market(df['fund_rate'].to_numpy(), capital)
+
+    return df, stats, ledger.to_frame(df.index), time_utilization_percentage
+
+
+def _select_outputs(df: pd.DataFrame, stats: dict, ledger: TradeLedger, time_utilization_percentage: float,
+                    outputs: str, capital: float):
+    """
+    simulate()'s return value for outputs="equity" or "ledger".
+
+    The ledger's times are positions in df, the input left after dropna(), so df's index is kept
+    on the ledger for to_frame().
+    """
+    ledger.index = df.index
+    if outputs == "ledger":
+        return None, stats, ledger, time_utilization_percentage
+    yield_before, yield_after = ledger.yields(len(df))
+    equity = pd.DataFrame({
+        'yield_before_fees': yield_before,
+        'yield_after_fees': yield_after,
+        'equity': ledger.mark_to_market(df['fund_rate'].to_numpy(), capital),
+    }, index=df.index)
+    return equity, stats, ledger, time_utilization_percentage
+
+
+def _simulate_numpy(
+    df: pd.DataFrame,
+    fees: FeeSchedule,
+    capital: float,
+    a: float,
+    sl_mult: float,
+    fund_thresh: float,
+    spot_price_exit_multiplier: float,
+    compound: bool,
+    outputs: str = "full",
+):
+    """
+    Array-based engine behind simulate(engine="numpy").
+
+    The entry signal and the exit signals that do not depend on the entry price (clauses 2 and 3)
+    are computed once over the whole series, so the loop below only jumps from one state
+    transition to the next. The stop-loss level depends on the entry price and is searched
+    per trade over the window the trade can be open for.
+    """
+    spot = df['spot'].to_numpy(dtype=float)
+    perp = df['perp'].to_numpy(dtype=float)
+    fund = df['fund_rate'].to_numpy(dtype=float)
+    n = len(df)
+
+    # Precompute the signals over the full series
+    entry_positions = np.flatnonzero((perp > spot) & (fund > fund_thresh))
+    basis_exit = perp < spot_price_exit_multiplier * spot
+    exit_positions = np.flatnonzero(basis_exit | (fund < fund_thresh))
+    funding = FundingAccumulator(fund)
+
+    entries, allocated, entry_fees = [], [], []
+    exits, clauses, exit_fees = [], [], []
+    pnl_before, pnl_after = [], []
+    cum_after = 0.0
+    active_trading_periods = 0
+
+    i = 0
+    while i < n:
+        entry = _next_index(entry_positions, i, n)
+        if entry >= n:
+            break
+
+        allocated_capital = a * (capital + cum_after) if compound else a * capital
+        entry_fee_cost = fees.entry_cost(allocated_capital, spot[entry], perp[entry])
+        entries.append(entry)
+        allocated.append(allocated_capital)
+        entry_fees.append(entry_fee_cost)
+
+        # The trade closes at the first stop-loss hit before the first clause 2/3 exit
+        stop_level = sl_mult * perp[entry]
+        exit_23 = _next_index(exit_positions, entry + 1, n)
+        stop_hits = np.flatnonzero(perp[entry + 1:exit_23] >= stop_level)
+        exit = entry + 1 + int(stop_hits[0]) if len(stop_hits) else exit_23
+        if exit >= n:
+            # Still in the trade when the data ends
+            active_trading_periods += n - 1 - entry
+            break
+        active_trading_periods += exit - entry
+
+        if perp[exit] >= stop_level:
+            clause = 1
+        elif basis_exit[exit]:
+            clause = 2
+        else:
+            clause = 3
+
+        exit_fee_cost = fees.exit_cost(clause, allocated_capital, spot[entry], spot[exit], perp[exit])
+        before = funding.earned(entry, exit, allocated_capital)
+        after = before - (entry_fee_cost + exit_fee_cost)
+        cum_after += after
+        exits.append(exit)
+        clauses.append(clause)
+        exit_fees.append(exit_fee_cost)
+        pnl_before.append(before)
+        pnl_after.append(after)
+        i = exit + 1
+
+    return _build_outputs(
+        df, capital, entries, allocated, entry_fees, exits, clauses, exit_fees,
+        pnl_before, pnl_after, active_trading_periods, outputs,
+    )
+
+
+def _simulate_numba(
+    df: pd.DataFrame,
+    fees: FeeSchedule,
+    capital: float,
+    a: float,
+    sl_mult: float,
+    fund_thresh: float,
+    spot_price_exit_multiplier: float,
+    compound: bool,
+    outputs: str = "full",
+):
+    """
+    Engine behind simulate(engine="numba"): runs the state-machine kernel from numba_kernel.py.
+    """
+    if not NUMBA_AVAILABLE:
+        warnings.warn("Numba is not installed; running the state-machine kernel as plain Python")
+
+    entry_rates, exit_rates = fees.rate_arrays()
+    result = delta_neutral_kernel(
+        df['spot'].to_numpy(dtype=float),
+        df['perp'].to_numpy(dtype=float),
+        df['fund_rate'].to_numpy(dtype=float),
+        capital, a, sl_mult, entry_rates, exit_rates, fees.notional, compound,
+        fund_thresh, spot_price_exit_multiplier,
+    )
+    return _build_outputs(
+        df, capital, result.entries, result.allocated, result.entry_fees,
+        result.exits, result.clauses, result.exit_fees,
+        result.pnl_before_fees, result.pnl_after_fees, result.active_periods, outputs,
+    )
+
+
+def _simulate_loop(
+    df: pd.DataFrame,
+    fees: FeeSchedule,
+    capital: float,
+    a: float,
+    sl_mult: float,
+    fund_thresh: float,
+    spot_price_exit_multiplier: float,
+    compound: bool,
+    outputs: str = "full",
+):
+    """
+    Reference engine behind simulate(engine="loop"): the original row-by-row loop.
+    """
+    # Initialize trade tracking variables
+    in_trade = False
+    entry_price_perp = 0.0
+    entry_price_spot = 0.0
+    entry_pos = 0
+    cum_before = 0.0  # Cumulative yield before fees
+    cum_after = 0.0   # Cumulative yield after fees
+    stats = {1: 0, 2: 0, 3: 0}  # Exit clauses: 1 - stop-loss, 2 - perp < spot, 3 - fund_rate < thresh
+    ledger = TradeLedger()  # Entries and exits, by row position
+    allocated_capital = 0.0  # To store the dynamically calculated capital for each trade
+    entry_fee_cost = 0.0  # To store the entry fee for the current trade
+
+    # Time tracking variables
+    total_time_periods = 0
+    active_trading_periods = 0
+
+    # Build the cumulative funding prefix used to price each trade's funding
+    funding = FundingAccumulator(df['fund_rate'])
+
+    # Add columns for trade events and yields
+    df['entry'] = False
+    df['exit'] = False
+    df['exit_clause'] = 0
+    df['yield_before_fees'] = 0.0
+    df['yield_after_fees'] = 0.0
+
+    # Iterate through each time step to simulate trades
+    for pos, (t, row) in enumerate(df.iterrows()):
+        total_time_periods += 1
+
+        if not in_trade:
+            # Check entry conditions: perpetual price > spot price and funding rate > threshold
+            if (row['perp'] > row['spot']) and (row['fund_rate'] > fund_thresh):
+                in_trade = True
+                entry_price_perp = row['perp']
+                entry_price_spot = row['spot']
+                entry_pos = pos
+                df.at[t, 'entry'] = True
+                # Calculate the capital for this trade, from running or initial capital
+                running_capital = capital + cum_after
+                allocated_capital = a * running_capital if compound else a * capital
+
+                # Calculate and store entry fee
+                entry_fee_cost = fees.entry_cost(allocated_capital, entry_price_spot, entry_price_perp)
+
+                # Record entry event
+                ledger.append(pos, ENTRY, entry_price_spot, entry_price_perp, row['fund_rate'], allocated_capital,
+                              running_capital, 0, entry_fee_cost, 0.0, 0.0, cum_after)
+        else:
+            active_trading_periods += 1
+            # Check exit conditions
+            if row['perp'] >= sl_mult * entry_price_perp:
+                clause = 1  # Exit due to stop-loss (perp price increased by sl_mult)
+            elif row['perp'] < spot_price_exit_multiplier * row['spot']:
+                clause = 2  # Exit due to premium disappearance (perp price < spot price)
+            elif row['fund_rate'] < fund_thresh:
+                clause = 3  # Exit due to funding rate dropping below threshold
+            else:
+                clause = 0
+
+            if clause:
+                in_trade = False
+                df.at[t, 'exit'] = True
+                df.at[t, 'exit_clause'] = clause
+                stats[clause] += 1
+
+                # Calculate funding earned during the trade (from the entry row to just before t)
+                fund_earned = funding.earned(entry_pos, pos, allocated_capital)
+
+                # Calculate exit and total fees for this exit clause
+                exit_fee_cost = fees.exit_cost(clause, allocated_capital, entry_price_spot, row['spot'], row['perp'])
+                total_fee_cost = entry_fee_cost + exit_fee_cost
+
+                # Compute yields before and after fees
+                before = fund_earned
+                after = fund_earned - total_fee_cost
+
+                # Update cumulative yields
+                cum_before += before
+                cum_after += after
+
+                # Record exit event
+                ledger.append(pos, EXIT, row['spot'], row['perp'], row['fund_rate'], allocated_capital,
+                              capital + cum_after, clause, exit_fee_cost, before, after, cum_after)
+
+        # Update cumulative yields in the DataFrame for this time step
+        df.at[t, 'yield_before_fees'] = cum_before
+        df.at[t, 'yield_after_fees'] = cum_after
+
+    # Calculate time utilization percentage
+    time_utilization_percentage = (active_trading_periods / total_time_periods) * 100 if total_time_periods > 0 else 0
+
+    if outputs != "full":
+        return _select_outputs(df, stats, ledger, time_utilization_percentage, outputs, capital)
+    df['equity'] = ledger.mark_to_market(df['fund_rate'].to_numpy(), capital)
+    return df, stats, ledger.to_frame(df.index), time_utilization_percentage
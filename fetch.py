@@ -1,67 +1,189 @@
-from hyperliquid.info import Info
 from hyperliquid.utils import constants
+import asyncio
 import time
 
-# Initialize the Hyperliquid API client
-# Use MAINNET_API_URL for production; TESTNET_API_URL for testing
-info = Info(constants.MAINNET_API_URL, skip_ws=True)
-
-def fetch_candles_in_batches(info_client, name, interval, start_time, end_time, chunk_size=5000):
-    # Define interval durations in milliseconds
-    interval_ms = {
-        "1m": 60000,
-        "5m": 300000,
-        "15m": 900000,
-        "1h": 3600000,
-    }
-    
-    # Get the interval duration
-    interval_duration = interval_ms.get(interval, 60000)  # Default to 1m if not found
+import pandas as pd
+
+from async_fetch import AsyncInfoClient
+from manifest import ChunkManifest, checksum, intervals_from_times, split_on_grid, subtract_intervals
+from segments import SegmentStore
+
+# Define interval durations in milliseconds
+INTERVAL_MS = {
+    "1m": 60000,
+    "5m": 300000,
+    "15m": 900000,
+    "1h": 3600000,
+}
+
+# Manifest endpoint name of the candle chunks
+CANDLE_ENDPOINT = "candleSnapshot"
+
+def candles_to_frame(candles):
+    # Raw candles indexed by open time, as stored in a SegmentStore
+    df = pd.DataFrame(candles)
+    df.index = pd.to_datetime(df['t'], unit='ms', utc=True)
+    return df
+
+def plan_candle_windows(name, interval, start_time, end_time, chunk_size=5000, manifest=None, store=None,
+                        fill_holes=False, skip=None):
+    """
+    Windows of chunk_size candles of [start_time, end_time] still to fetch, as [start, end) pairs.
+
+    Without a manifest every window is planned; with one, the windows it records as complete are
+    left out (with fill_holes, the candles present in the store decide instead). Ranges in skip
+    are never planned.
+    """
+    interval_duration = INTERVAL_MS.get(interval, 60000)  # Default to 1m if not found
+    window = chunk_size * interval_duration
+    endpoint = f"{CANDLE_ENDPOINT}:{interval}"
+    if manifest is not None and store is None:
+        raise ValueError("A manifest needs a store to keep the candles of completed windows")
+
+    skip = [tuple(interval) for interval in skip or []]
+    if manifest is None:
+        return split_on_grid(subtract_intervals(start_time, end_time + 1, skip), start_time, window)
+    if fill_holes:
+        stored = store.read()
+        times = stored['t'].to_numpy() if not stored.empty else []
+        covered = intervals_from_times(times, interval_duration) + manifest.completed(endpoint, name, empty_only=True)
+    else:
+        covered = manifest.completed(endpoint, name)
+    return manifest.plan(endpoint, name, start_time, end_time + 1, window, covered + skip)
+
+def save_candle_window(name, interval, chunk_start, chunk_end, candles, manifest=None, store=None):
+    """
+    Append a fetched window to the store, then record it in the manifest.
+    """
+    if store is not None and candles:
+        store.append(candles_to_frame(candles))
+    if manifest is not None:
+        manifest.record(f"{CANDLE_ENDPOINT}:{interval}", name, chunk_start, chunk_end, len(candles), checksum(candles))
+
+def read_candles(store, start_time, end_time):
+    # Candles of [start_time, end_time] from a store, as the list of dicts the fetchers return
+    stored = store.read(pd.Timestamp(start_time, unit='ms', tz='UTC'), pd.Timestamp(end_time, unit='ms', tz='UTC'))
+    return stored.to_dict('records')
+
+def fetch_candles_in_batches(info_client, name, interval, start_time, end_time, chunk_size=5000,
+                             manifest=None, store=None, fill_holes=False, skip=None):
+    """
+    Fetch candles for [start_time, end_time] in windows of chunk_size candles.
+
+    With a ChunkManifest and a SegmentStore the fetch is resumable: each window is appended
+    to the store and recorded in the manifest, windows already recorded are skipped, and the
+    result is read back from the store. With fill_holes the store decides what is present, so
+    any window with missing candles is fetched again.
+
+    skip lists [start, end) ranges known to be empty (e.g. availability.empty_ranges of a
+    coverage map from scan_candles_range.py); they are not requested.
+    """
+    chunks = plan_candle_windows(name, interval, start_time, end_time, chunk_size, manifest, store, fill_holes, skip)
     
     all_candles = []
-    current_start = start_time
-    
-    while current_start <= end_time:
-        # Calculate the end time for this chunk
-        chunk_end = min(current_start + (chunk_size * interval_duration) - 1, end_time)
-        
-        # Fetch candles for this chunk
-        candles = info_client.candles_snapshot(name, interval, current_start, chunk_end)
-        
-        # If no candles are returned, break the loop
-        if not candles:
-            break
+    for chunk_start, chunk_end in chunks:
+        # Fetch candles for this chunk; the API end time is inclusive
+        candles = info_client.candles_snapshot(name, interval, chunk_start, chunk_end - 1) or []
+        save_candle_window(name, interval, chunk_start, chunk_end, candles, manifest, store)
         
         # Add fetched candles to the total list
         all_candles.extend(candles)
-        
-        # Get the timestamp of the last candle
-        last_time = candles[-1].get('time', None)
-        
-        # If no 'time' field is present, break (safety check)
-        if last_time is None:
-            break
-        
-        # Set the next start time to the end of the last candle
-        current_start = last_time + interval_duration
     
+    if store is not None:
+        return read_candles(store, start_time, end_time)
     return all_candles
 
+# Raw coin names of the two legs on the info endpoint: spot HYPE/USDC is "@107", the perp is "HYPE".
+# The script used to request "HYPE" as spot and "HYPEUSD" as perp, but candleSnapshot's "HYPE" is
+# the perp and "HYPEUSD" is not a coin. The legs' stores are named after these coins
+# (candles_@107_1m.segments, candles_HYPE_1m.segments), so an old candles_HYPE_1m store, which
+# already held perp candles, is reused as the perp leg and the spot leg is downloaded afresh
+SPOT_COIN = "@107"
+PERP_COIN = "HYPE"
+
+# Candle fields kept for each leg in the aligned frame
+CANDLE_FIELDS = {"o": "open", "h": "high", "l": "low", "c": "close", "v": "volume"}
+
+def align_legs(spot_candles, perp_candles):
+    """
+    Outer-join spot and perp candles on their open time.
+
+    Returns:
+        DataFrame indexed by UTC open time with a `timestamp` column (epoch seconds) and
+        spot_open, spot_high, ..., perp_close, perp_volume as float64; a leg missing a candle
+        has NaN in that row
+    """
+    legs = []
+    for prefix, candles in (("spot", spot_candles), ("perp", perp_candles)):
+        df = pd.DataFrame(candles, columns=["t", *CANDLE_FIELDS])
+        df = df.set_index("t")[list(CANDLE_FIELDS)].astype(float)
+        df.columns = [f"{prefix}_{CANDLE_FIELDS[field]}" for field in df.columns]
+        legs.append(df[~df.index.duplicated(keep="last")])
+    aligned = legs[0].join(legs[1], how="outer").sort_index()
+    aligned.insert(0, "timestamp", aligned.index.to_numpy() // 1000)
+    aligned.index = pd.to_datetime(aligned.index, unit="ms", utc=True)
+    aligned.index.name = "date_time"
+    return aligned
+
+def fetch_spot_perp_candles(interval, start_time, end_time, spot_coin=SPOT_COIN, perp_coin=PERP_COIN,
+                            chunk_size=5000, max_concurrency=8, base_url=constants.MAINNET_API_URL, limiter=None,
+                            manifest=None, spot_store=None, perp_store=None, fill_holes=False, skip=None):
+    """
+    Fetch both legs concurrently and return them as one time-aligned frame (see align_legs).
+
+    [start_time, end_time] is split up front into fixed windows of chunk_size candles, and the
+    windows of both legs are fetched together through one client, so they share its bounded
+    number of requests in flight and its token-bucket rate limiter.
+
+    With a ChunkManifest and a SegmentStore per leg the fetch is resumable, as with
+    fetch_candles_in_batches: only the windows the manifest lacks are requested, each is
+    appended to its leg's store and recorded as soon as it arrives, and the legs are read back
+    from the stores. fill_holes and skip work as in fetch_candles_in_batches.
+    """
+    legs = ((spot_coin, spot_store), (perp_coin, perp_store))
+    plans = [plan_candle_windows(coin, interval, start_time, end_time, chunk_size, manifest, store, fill_holes, skip)
+             for coin, store in legs]
+
+    async def fetch_leg(client, coin, store, windows):
+        async def fetch_window(chunk_start, chunk_end):
+            # The API end time is inclusive
+            return chunk_start, chunk_end, await client.candles_snapshot(coin, interval, chunk_start, chunk_end - 1) or []
+
+        candles = []
+        for task in asyncio.as_completed([fetch_window(*window) for window in windows]):
+            chunk_start, chunk_end, window_candles = await task
+            save_candle_window(coin, interval, chunk_start, chunk_end, window_candles, manifest, store)
+            candles.extend(window_candles)
+        return candles
+
+    async def fetch():
+        async with AsyncInfoClient(base_url, limiter=limiter, max_concurrency=max_concurrency) as client:
+            return await asyncio.gather(*(fetch_leg(client, coin, store, windows)
+                                          for (coin, store), windows in zip(legs, plans)))
+
+    fetched = asyncio.run(fetch())
+    spot_candles, perp_candles = (read_candles(store, start_time, end_time) if store is not None else candles
+                                  for (_, store), candles in zip(legs, fetched))
+    return align_legs(spot_candles, perp_candles)
+
 # Example usage
 if __name__ == "__main__":
     # Set parameters
-    name_spot = "HYPE"  # For HYPE spot (verify with SDK)
-    name_perp = "HYPEUSD"  # For HYPEUSD perp (verify with SDK)
+    name_spot = SPOT_COIN  # HYPE/USDC spot
+    name_perp = PERP_COIN  # HYPE perp
     interval = "1m"  # 1-minute candles
     start_time = 1680000000000  # April 1, 2023 (Unix timestamp in ms)
     end_time = 1714534400000  # April 1, 2024 (Unix timestamp in ms)
     
-    # Fetch candles for HYPE spot
-    spot_candles = fetch_candles_in_batches(info, name_spot, interval, start_time, end_time)
-    
-    # Fetch candles for HYPEUSD perp
-    perp_candles = fetch_candles_in_batches(info, name_perp, interval, start_time, end_time)
+    # Both legs are fetched concurrently (MAINNET_API_URL by default); completed windows are
+    # recorded, so an interrupted run resumes where it stopped
+    with ChunkManifest() as manifest:
+        candles = fetch_spot_perp_candles(
+            interval, start_time, end_time, name_spot, name_perp, manifest=manifest,
+            spot_store=SegmentStore(f"candles_{name_spot}_{interval}.segments"),
+            perp_store=SegmentStore(f"candles_{name_perp}_{interval}.segments"),
+        )
     
     # Print the total number of candles fetched
-    print(f"Total HYPE spot candles fetched: {len(spot_candles)}")
-    print(f"Total HYPEUSD perp candles fetched: {len(perp_candles)}")
\ No newline at end of file
+    print(f"Total HYPE spot candles fetched: {candles['spot_open'].notna().sum()}")
+    print(f"Total HYPE perp candles fetched: {candles['perp_open'].notna().sum()}")
@@ -4,30 +4,38 @@ from hyperliquid.info import Info
 from hyperliquid.utils import constants
 import pandas as pd
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+import asyncio
 import json
 import os
 
+from segments import SegmentStore
+from symbols import symbol_cache
+from manifest import ChunkManifest, DEFAULT_MANIFEST, checksum, intervals_from_times
+from async_fetch import AsyncInfoClient, TokenBucket, DEFAULT_WEIGHT_PER_SECOND, DEFAULT_WEIGHT_BURST, FUNDING_CHUNK_HOURS
+
+# Manifest endpoint name of the funding chunks
+FUNDING_ENDPOINT = "fundingHistory"
+
+# Funding is paid hourly, so a saved row stands for (at least) the hour that follows it
+FUNDING_INTERVAL_MS = 60 * 60 * 1000
+
 def fetch_current_prices(info: Info, symbol: str) -> Dict:
     """
     Fetch current perpetual and spot prices from Hyperliquid
+    Symbol resolution is cached (see symbols.py), so this is a single allMids request
+    spot_price is the spot pair's mid price, not the perp's oracle price it used to be
     """
     try:
-        meta = info.meta()
-        for coin in meta['universe']:
-            if coin['name'] == symbol:
-                return {
-                    'perp_price': float(coin['markPrice']),
-                    'spot_price': float(coin['oraclePrice'])
-                }
-        return None
+        return symbol_cache(info.base_url).prices(symbol)
     except Exception as e:
         print(f"Error fetching prices: {str(e)}")
         return None
 
-def fetch_funding_chunk(info: Info, symbol: str, start_time: int, end_time: int, max_retries: int = 3) -> List[Dict]:
+def fetch_funding_chunk(info: Info, symbol: str, start_time: int, end_time: int, max_retries: int = 3) -> Optional[List[Dict]]:
     """
-    Fetch funding data for a specific time chunk with retry logic
+    Fetch funding data for a specific time chunk with retry logic.
+    Returns None if every attempt failed, so a failed chunk is not mistaken for an empty one
     """
     for attempt in range(max_retries):
         try:
@@ -43,107 +51,193 @@ def fetch_funding_chunk(info: Info, symbol: str, start_time: int, end_time: int,
                 time.sleep(wait_time)
             else:
                 print(f"Failed to fetch data after {max_retries} attempts: {str(e)}")
-                return []
-    return []
-
-def save_incremental_data(df: pd.DataFrame, output_file: str):
-    """
-    Save data incrementally to CSV
-    """
-    if os.path.exists(output_file):
-        # Read existing data
-        existing_df = pd.read_csv(output_file, index_col=0, parse_dates=True)
-        # Combine with new data
-        combined_df = pd.concat([existing_df, df])
-        # Remove duplicates
-        combined_df = combined_df[~combined_df.index.duplicated(keep='last')]
-        # Sort by timestamp
-        combined_df = combined_df.sort_index()
-    else:
-        combined_df = df
+                return None
+    return None
+
+def process_funding_records(records: List[Dict], prices: Optional[Dict], start_ts: Optional[int] = None,
+                            end_ts: Optional[int] = None) -> pd.DataFrame:
+    """
+    Turn raw fundingHistory records into the 1-minute funding/price frame saved to CSV
+
+    With start_ts and end_ts the rows cover the chunk's whole [start_ts, end_ts) minute grid, so
+    consecutive chunks leave no gap: minutes before the chunk's first record are filled from a
+    record before start_ts (see funding_request_range), and each record is carried forward for
+    the hour it applies to, up to end_ts
+    """
+    # Convert to DataFrame
+    df = pd.DataFrame(records)
+    df['timestamp'] = pd.to_datetime(df['time'], unit='ms', utc=True)
+    df['funding_rate'] = df['fundingRate'].astype(float)
+    df['premium'] = df['premium'].astype(float)
+    
+    columns = ['funding_rate', 'premium', 'annualized_rate']
+    if prices:
+        df['perp_price'] = prices['perp_price']
+        df['spot_price'] = prices['spot_price']
+        df['price_difference'] = df['perp_price'] - df['spot_price']
+        df['price_difference_pct'] = (df['price_difference'] / df['spot_price']) * 100
+        columns += ['perp_price', 'spot_price', 'price_difference', 'price_difference_pct']
     
-    # Save to CSV
-    combined_df.to_csv(output_file)
-    print(f"Saved {len(df)} new data points to {output_file}")
+    # Calculate annualized rate
+    df['annualized_rate'] = ((1 + df['funding_rate']) ** 8760 - 1) * 100
+    
+    # Sort by timestamp
+    df = df.sort_values('timestamp')
+    
+    # Resample to 1-minute intervals
+    df = df.set_index('timestamp').resample('1min').agg({column: 'last' for column in columns}).ffill()
+    if start_ts is None or end_ts is None:
+        return df
+
+    # The grid stops an hour after the last record, so a chunk ending in the future is not filled ahead of the data
+    last_ms = max(record['time'] for record in records)
+    grid = pd.date_range(pd.Timestamp(start_ts, unit='ms', tz='UTC').ceil('1min'),
+                         pd.Timestamp(min(end_ts, last_ms + FUNDING_INTERVAL_MS), unit='ms', tz='UTC'),
+                         freq='1min', inclusive='left')
+    df = df.reindex(df.index.union(grid)).ffill().reindex(grid)
+    # Minutes before the first record there is no funding rate for (e.g. before listing)
+    return df[df['funding_rate'].notna()]
+
+def save_incremental_data(df: pd.DataFrame, store: SegmentStore):
+    """
+    Append a chunk to the segment store; duplicates are resolved when the store is read
+    """
+    store.append(df)
+    print(f"Saved {len(df)} new data points to {store.root}")
+
+def plan_funding_chunks(manifest: ChunkManifest, store: SegmentStore, symbol: str, start_ts: int, end_ts: int,
+                        chunk_hours: int = 4, fill_holes: bool = False) -> List[Tuple[int, int]]:
+    """
+    Chunks of [start_ts, end_ts) not fetched yet.
+
+    Normally the manifest decides what is complete. With fill_holes the saved data decides
+    instead: every range missing from the store is refetched, except chunks the manifest
+    recorded as legitimately empty (e.g. before listing)
+    """
+    covered = None
+    if fill_holes:
+        df = store.read()
+        times = pd.DatetimeIndex(df.index).as_unit('ms').asi8 if not df.empty else []
+        covered = intervals_from_times(times, FUNDING_INTERVAL_MS) + manifest.completed(FUNDING_ENDPOINT, symbol, empty_only=True)
+    return manifest.plan(FUNDING_ENDPOINT, symbol, start_ts, end_ts, chunk_hours * 60 * 60 * 1000, covered)
+
+def funding_request_range(start_ts: int, end_ts: int) -> Tuple[int, int]:
+    """
+    fundingHistory startTime and (inclusive) endTime for the chunk [start_ts, end_ts).
+
+    The request starts one funding interval early, so it also returns the record in force at
+    start_ts, which fills the chunk's first minutes
+    """
+    return start_ts - FUNDING_INTERVAL_MS, end_ts - 1
 
-def fetch_funding_data(symbol: str, start_date: datetime, end_date: datetime, chunk_hours: int = 4) -> pd.DataFrame:
+def save_funding_chunk(store: SegmentStore, manifest: ChunkManifest, symbol: str, start_ts: int, end_ts: int,
+                       records: List[Dict], prices: Optional[Dict]):
+    """
+    Save a fetched chunk, then mark it complete in the manifest
+
+    records is the response for funding_request_range; the record before start_ts only seeds the
+    chunk's first minutes and is not counted in the manifest
+    """
+    chunk_records = [record for record in records if record['time'] >= start_ts]
+    if chunk_records:
+        save_incremental_data(process_funding_records(records, prices, start_ts, end_ts), store)
+    manifest.record(FUNDING_ENDPOINT, symbol, start_ts, end_ts, len(chunk_records), checksum(chunk_records))
+
+def fetch_funding_data(symbol: str, start_date: datetime, end_date: datetime, chunk_hours: int = 4,
+                       base_url: str = constants.MAINNET_API_URL, output_file: str = 'hype_funding_rates_1min.csv',
+                       manifest_file: str = DEFAULT_MANIFEST, fill_holes: bool = False) -> pd.DataFrame:
     """
     Fetch funding data in chunks and combine into a single DataFrame
     Using 4-hour chunks to stay within 500 events limit
+
+    Completed chunks are recorded in the manifest, so a restarted fetch only requests the
+    chunks that are still missing
     """
-    info = Info(constants.MAINNET_API_URL, skip_ws=True)
-    output_file = 'hype_funding_rates_1min.csv'
+    info = Info(base_url, skip_ws=True)
+    store = SegmentStore.for_csv(output_file)
     
     # Convert dates to timestamps
     start_ts = int(start_date.timestamp() * 1000)
     end_ts = int(end_date.timestamp() * 1000)
     
-    # Calculate number of chunks (4-hour intervals)
-    total_hours = (end_date - start_date).total_seconds() / 3600
-    num_chunks = int(np.ceil(total_hours / chunk_hours))
-    
-    print(f"Fetching data in {num_chunks} chunks of {chunk_hours} hours each...")
-    
-    current_start = start_ts
-    for i in range(num_chunks):
-        chunk_end = min(current_start + (chunk_hours * 60 * 60 * 1000), end_ts)
-        print(f"\nFetching chunk {i+1}/{num_chunks}:")
-        print(f"From: {datetime.fromtimestamp(current_start/1000, UTC)}")
-        print(f"To:   {datetime.fromtimestamp(chunk_end/1000, UTC)}")
+    with ChunkManifest(manifest_file) as manifest:
+        chunks = plan_funding_chunks(manifest, store, symbol, start_ts, end_ts, chunk_hours, fill_holes)
+        print(f"Fetching data in {len(chunks)} missing chunks of up to {chunk_hours} hours each...")
         
-        # Fetch funding data
-        chunk_data = fetch_funding_chunk(info, symbol, current_start, chunk_end)
-        if chunk_data:
-            # Convert to DataFrame
-            df = pd.DataFrame(chunk_data)
-            df['timestamp'] = pd.to_datetime(df['time'], unit='ms', utc=True)
-            df['funding_rate'] = df['fundingRate'].astype(float)
-            df['premium'] = df['premium'].astype(float)
-            
-            # Fetch current prices
-            prices = fetch_current_prices(info, symbol)
-            if prices:
-                df['perp_price'] = prices['perp_price']
-                df['spot_price'] = prices['spot_price']
-                df['price_difference'] = df['perp_price'] - df['spot_price']
-                df['price_difference_pct'] = (df['price_difference'] / df['spot_price']) * 100
-            
-            # Calculate annualized rate
-            df['annualized_rate'] = ((1 + df['funding_rate']) ** 8760 - 1) * 100
+        for i, (chunk_start, chunk_end) in enumerate(chunks):
+            print(f"\nFetching chunk {i+1}/{len(chunks)}:")
+            print(f"From: {datetime.fromtimestamp(chunk_start/1000, UTC)}")
+            print(f"To:   {datetime.fromtimestamp(chunk_end/1000, UTC)}")
             
-            # Sort by timestamp
-            df = df.sort_values('timestamp')
+            # Fetch funding data, from the record in force at the chunk start
+            chunk_data = fetch_funding_chunk(info, symbol, *funding_request_range(chunk_start, chunk_end))
+            if chunk_data is not None:
+                # Fetch current prices
+                prices = fetch_current_prices(info, symbol) if chunk_data else None
+                save_funding_chunk(store, manifest, symbol, chunk_start, chunk_end, chunk_data, prices)
+                print(f"Processed {len(chunk_data)} data points")
             
-            # Resample to 1-minute intervals
-            df_resampled = df.set_index('timestamp').resample('1T').agg({
-                'funding_rate': 'last',
-                'premium': 'last',
-                'annualized_rate': 'last',
-                'perp_price': 'last',
-                'spot_price': 'last',
-                'price_difference': 'last',
-                'price_difference_pct': 'last'
-            }).fillna(method='ffill')
-            
-            # Save incrementally
-            save_incremental_data(df_resampled, output_file)
-            print(f"Processed {len(chunk_data)} data points")
-        
-        current_start = chunk_end
-        time.sleep(1)  # Small delay between chunks to avoid rate limiting
+            time.sleep(1)  # Small delay between chunks to avoid rate limiting
     
-    # Read final data
-    if os.path.exists(output_file):
-        return pd.read_csv(output_file, index_col=0, parse_dates=True)
+    # Write the combined data once
+    if store.segments:
+        return store.export_csv(output_file)
     return pd.DataFrame()
 
+def fetch_funding_data_async(symbol: str, start_date: datetime, end_date: datetime, chunk_hours: int = FUNDING_CHUNK_HOURS,
+                             max_concurrency: int = 8, weight_per_second: float = DEFAULT_WEIGHT_PER_SECOND,
+                             weight_burst: float = DEFAULT_WEIGHT_BURST, base_url: str = constants.MAINNET_API_URL,
+                             output_file: str = 'hype_funding_rates_1min.csv', manifest_file: str = DEFAULT_MANIFEST,
+                             fill_holes: bool = False) -> pd.DataFrame:
+    """
+    Concurrent version of fetch_funding_data: all missing chunks are requested at once (up to
+    max_concurrency in flight, paced by a token bucket of weight_per_second refilling up to
+    weight_burst, retried with jittered backoff), and each is saved and recorded in the
+    manifest as soon as it arrives
+
+    Chunks default to FUNDING_CHUNK_HOURS, close to the 500 records a response can hold: the rate
+    limit counts requests (plus returned records), so few large chunks fetch far faster than
+    many 4-hour ones
+    """
+    start_ts = int(start_date.timestamp() * 1000)
+    end_ts = int(end_date.timestamp() * 1000)
+    store = SegmentStore.for_csv(output_file)
+
+    async def fetch(manifest: ChunkManifest, chunks: List[Tuple[int, int]]) -> int:
+        limiter = TokenBucket(weight_per_second, weight_burst)
+        async with AsyncInfoClient(base_url, limiter=limiter, max_concurrency=max_concurrency) as client:
+            prices = symbol_cache(base_url).prices_from_mids(await client.all_mids(), symbol)
+
+            async def fetch_chunk(chunk_start: int, chunk_end: int):
+                return chunk_start, chunk_end, await client.funding_history(
+                    symbol, *funding_request_range(chunk_start, chunk_end))
+
+            total = 0
+            for task in asyncio.as_completed([fetch_chunk(*chunk) for chunk in chunks]):
+                chunk_start, chunk_end, records = await task
+                save_funding_chunk(store, manifest, symbol, chunk_start, chunk_end, records or [], prices)
+                total += len(records or [])
+            return total
+
+    started = time.time()
+    with ChunkManifest(manifest_file) as manifest:
+        chunks = plan_funding_chunks(manifest, store, symbol, start_ts, end_ts, chunk_hours, fill_holes)
+        print(f"Fetching {len(chunks)} missing chunks of up to {chunk_hours} hours each...")
+        if chunks:
+            total = asyncio.run(fetch(manifest, chunks))
+            print(f"Fetched {total} funding records in {time.time() - started:.2f}s")
+
+    if not store.segments:
+        return pd.DataFrame()
+    return store.export_csv(output_file)
+
 def main():
     # Set date range
     start_date = datetime(2025, 3, 24, 0, 0, 0, tzinfo=UTC)
     end_date = datetime(2025, 6, 14, 23, 59, 59, tzinfo=UTC)
     
     # Fetch data
-    df = fetch_funding_data("HYPE", start_date, end_date)
+    df = fetch_funding_data_async("HYPE", start_date, end_date)
     
     if df.empty:
         print("No data to analyze")
@@ -1,5 +1,5 @@
-import time
-from datetime import datetime, timedelta, UTC
+import asyncio
+from datetime import datetime, UTC
 from hyperliquid.info import Info
 from hyperliquid.utils import constants
 import pandas as pd
@@ -7,6 +7,10 @@ import numpy as np
 from typing import Dict, Optional
 import os
 
+from price_recorder import PriceRecorder
+from segments import SegmentStore
+from symbols import symbol_cache
+
 def fetch_current_prices(info: Info, symbol: str) -> Optional[Dict]:
     """
     Fetch current perpetual and spot prices from Hyperliquid
@@ -16,93 +20,76 @@ def fetch_current_prices(info: Info, symbol: str) -> Optional[Dict]:
         symbol: Trading pair symbol (e.g., 'HYPE')
         
     Returns:
-        Dictionary containing perp_price and spot_price, or None if error
+        Dictionary containing perp_price and spot_price, or None if error. Both are allMids mid
+        prices: spot_price is the spot pair's mid, not the perp's oracle price it used to be
     """
     try:
-        meta = info.meta()
-        for coin in meta['universe']:
-            if coin['name'] == symbol:
-                print(f"DEBUG: coin dict for {symbol}: {coin}")  # Debug print
-                # Temporarily return None to avoid further errors
-                return None
-        return None
+        # Symbol resolution is cached (see symbols.py), so this is a single allMids request
+        return symbol_cache(info.base_url).prices(symbol)
     except Exception as e:
         print(f"Error fetching prices: {str(e)}")
         return None
 
-def save_price_data(df: pd.DataFrame, output_file: str):
+def save_price_data(df: pd.DataFrame, store: SegmentStore):
     """
-    Save price data to CSV file, handling incremental updates
+    Append price data to the segment store, handling incremental updates
     
     Args:
         df: DataFrame containing price data
-        output_file: Path to output CSV file
+        store: Segment store the data is appended to
     """
-    if os.path.exists(output_file):
-        # Read existing data
-        existing_df = pd.read_csv(output_file, index_col=0, parse_dates=True)
-        # Combine with new data
-        combined_df = pd.concat([existing_df, df])
-        # Remove duplicates
-        combined_df = combined_df[~combined_df.index.duplicated(keep='last')]
-        # Sort by timestamp
-        combined_df = combined_df.sort_index()
-    else:
-        combined_df = df
-    
-    # Save to CSV
-    combined_df.to_csv(output_file)
-    print(f"Saved {len(df)} new data points to {output_file}")
+    store.append(df)
+    print(f"Saved {len(df)} new data points to {store.root}")
 
-def fetch_price_data(symbol: str, interval_minutes: int = 1, duration_hours: int = 24) -> pd.DataFrame:
+def fetch_price_data(symbol: str, interval_minutes: int = 1, duration_hours: Optional[float] = 24,
+                     base_url: str = constants.MAINNET_API_URL, ws_url: Optional[str] = None) -> pd.DataFrame:
     """
-    Fetch price data at regular intervals for a specified duration
+    Record live prices over the websocket for a specified duration, sampled at regular intervals
+    
+    Ticks are recorded by PriceRecorder (see price_recorder.py) and flushed to its segment store
+    as they arrive; the summary frame is resampled from the ticks recorded during this run.
     
     Args:
         symbol: Trading pair symbol (e.g., 'HYPE')
-        interval_minutes: Time interval between price fetches in minutes
-        duration_hours: Total duration to fetch data for in hours
+        interval_minutes: Time interval between price samples in minutes
+        duration_hours: Total duration to record for in hours, None to record until interrupted
+        base_url: API root
+        ws_url: Websocket endpoint, derived from base_url if None
         
     Returns:
         DataFrame containing price data
     """
-    info = Info(constants.MAINNET_API_URL, skip_ws=True)
     output_file = f'hype_prices_{interval_minutes}min.csv'
+    recorder = PriceRecorder(symbol, base_url=base_url, ws_url=ws_url)
     
-    end_time = datetime.now(UTC)
-    start_time = end_time - timedelta(hours=duration_hours)
-    
-    print(f"Fetching price data for {symbol} from {start_time} to {end_time}")
+    start_time = datetime.now(UTC)
+    print(f"Recording price data for {symbol} from {start_time} "
+          f"{'until interrupted' if duration_hours is None else f'for {duration_hours} hours'}")
     print(f"Interval: {interval_minutes} minutes")
     
-    data_points = []
-    current_time = start_time
+    try:
+        asyncio.run(recorder.run(None if duration_hours is None else duration_hours * 3600))
+    except KeyboardInterrupt:
+        pass
     
-    while current_time <= end_time:
-        prices = fetch_current_prices(info, symbol)
-        if prices:
-            data_points.append(prices)
-            print(f"Fetched prices at {current_time}: Perp=${prices['perp_price']:.2f}, Spot=${prices['spot_price']:.2f}")
-        
-        # Wait for the next interval
-        time.sleep(interval_minutes * 60)
-        current_time = datetime.now(UTC)
-    
-    if data_points:
-        # Convert to DataFrame
-        df = pd.DataFrame(data_points)
-        df.set_index('timestamp', inplace=True)
-        
-        # Calculate additional metrics
-        df['price_difference'] = df['perp_price'] - df['spot_price']
-        df['price_difference_pct'] = (df['price_difference'] / df['spot_price']) * 100
-        
-        # Save data
-        save_price_data(df, output_file)
-        
-        return df
+    ticks = recorder.store.read(start_time)
+    if ticks.empty:
+        return pd.DataFrame()
+    
+    # Last mid of each interval
+    df = ticks[['perp_mid', 'spot_mid']].resample(f'{interval_minutes}min').last().dropna()
+    df.columns = ['perp_price', 'spot_price']
+    
+    # Calculate additional metrics
+    df['price_difference'] = df['perp_price'] - df['spot_price']
+    df['price_difference_pct'] = (df['price_difference'] / df['spot_price']) * 100
+    
+    # Save data
+    store = SegmentStore.for_csv(output_file)
+    save_price_data(df, store)
+    store.export_csv(output_file)
     
-    return pd.DataFrame()
+    return df
 
 def main():
     # Fetch price data for HYPE
@@ -1,39 +1,30 @@
-from datetime import datetime, timedelta, UTC
+from datetime import datetime, UTC
 from hyperliquid.info import Info
 from hyperliquid.utils import constants
-import time
 
-def find_funding_data_range(symbol="HYPE", days_per_batch=7, max_months=12):
-    info = Info(constants.MAINNET_API_URL, skip_ws=True)
-    now = datetime.now(UTC)
-    earliest = None
-    latest = None
-    found_any = False
+from availability import EARLIEST_MS, AvailabilityProbe, settled_end_ms
 
-    # Search backwards in time, batch by batch
-    for month_offset in range(max_months):
-        batch_end = now - timedelta(days=month_offset * days_per_batch)
-        batch_start = batch_end - timedelta(days=days_per_batch)
-        start_time = int(batch_start.timestamp() * 1000)
-        end_time = int(batch_end.timestamp() * 1000)
-        print(f"Checking {batch_start.strftime('%Y-%m-%d')} to {batch_end.strftime('%Y-%m-%d')}...")
-        data = info.funding_history(symbol, start_time, end_time)
-        if data:
-            found_any = True
-            # Find earliest and latest timestamps in this batch
-            times = [entry['time'] for entry in data]
-            batch_earliest = min(times)
-            batch_latest = max(times)
-            if earliest is None or batch_earliest < earliest:
-                earliest = batch_earliest
-            if latest is None or batch_latest > latest:
-                latest = batch_latest
-    if found_any:
+def find_funding_data_range(symbol="HYPE", start_time=EARLIEST_MS, info=None):
+    info = info or Info(constants.MAINNET_API_URL, skip_ws=True)
+    # Searching a fixed range up to the settled, day-aligned end reuses the cached probes of earlier runs
+    end_time = settled_end_ms()
+
+    # First and last record by galloping + binary search, holes page by page; results are cached on disk
+    with AvailabilityProbe(info, kind="funding") as probe:
+        earliest = probe.first_time(symbol, start_time, end_time)
+        latest = probe.last_time(symbol, start_time, end_time) if earliest is not None else None
+        holes = probe.holes(symbol, earliest, end_time) if earliest is not None else []
+        print(f"Used {probe.requests} API requests")
+
+    if earliest is not None:
         print("\nFunding data available for:")
         print(f"Earliest: {datetime.fromtimestamp(earliest/1000, UTC)}")
         print(f"Latest:   {datetime.fromtimestamp(latest/1000, UTC)}")
+        for hole_start, hole_end in holes:
+            print(f"Missing:  {datetime.fromtimestamp(hole_start/1000, UTC)} to {datetime.fromtimestamp(hole_end/1000, UTC)}")
     else:
         print("No funding data found for the given symbol and search range.")
+    return earliest, latest, holes
 
 if __name__ == "__main__":
-    find_funding_data_range() 
\ No newline at end of file
+    find_funding_data_range()
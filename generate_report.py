@@ -1,191 +1,22 @@
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy.stats import norm
-
-def generate_report():
-    # --- 1. Load the Backtest Data ---
-    try:
-        trades_df_raw = pd.read_csv("trades.csv")
-        df_full = pd.read_csv("data (1).csv") # Load full dataset for date range
-    except FileNotFoundError as e:
-        print(f"Error: {e.filename} not found. Please ensure the file is in the correct directory.")
-        return
-
-    # Separate entry and exit records
-    entries = trades_df_raw[trades_df_raw['type'] == 'entry'].reset_index(drop=True)
-    exits = trades_df_raw[trades_df_raw['type'] == 'exit'].reset_index(drop=True)
-
-    # Combine entry and exit data for each trade
-    trades_df = pd.DataFrame({
-        'entry_time': entries['time'],
-        'exit_time': exits['time'],
-        'entry_spot': entries['spot_price'],
-        'exit_spot': exits['spot_price'],
-        'entry_perp': entries['perp_price'],
-        'exit_perp': exits['perp_price'],
-        'exit_reason': exits['reason'],
-        'trade_yield_before_fees': exits['trade_pnl_before_fees'],
-        'trade_yield_after_fees': exits['trade_pnl_after_fees'],
-        'fees': exits['fees'],
-        'running_trade_capital': exits['current_capital'],
-        'cumulative_pnl_after_fees': exits['cumulative_pnl_after_fees']
-    })
-    
-    trades_df['duration'] = trades_df['exit_time'] - trades_df['entry_time']
-
-    initial_capital = 100_000.0
-    a = 20/23
-
-    # Calculate trade capital for each trade
-    previous_capital = pd.concat([pd.Series([initial_capital]), trades_df['running_trade_capital'][:-1]], ignore_index=True)
-    trades_df['trade_capital'] = a * previous_capital
-
-    # Assume times are in hours and calculate total days from the full dataset
-    days_in_backtest = len(df_full) / 24
-
-    # --- 2. Calculate Financial Metrics ---
-    if not trades_df.empty:
-        # Return Metrics
-        final_capital = trades_df['running_trade_capital'].iloc[-1]
-        total_return_after_fees = (final_capital - initial_capital) / initial_capital
-        apy_after_fees = ((1 + total_return_after_fees) ** (365 / days_in_backtest) - 1) if days_in_backtest > 0 else 0
-
-        total_yield_before_fees = trades_df['trade_yield_before_fees'].sum()
-        total_return_before_fees = total_yield_before_fees / initial_capital
-        apy_before_fees = (1 + total_return_before_fees) ** (365 / days_in_backtest) - 1 if days_in_backtest > 0 else 0
-        
-        # Risk Metrics
-        risk_free_rate = 0.02
-        
-        # Create a timeseries of capital for daily calculations
-        trades_df['exit_datetime'] = pd.to_datetime(trades_df['exit_time'], unit='h', origin='2024-01-01')
-        start_time = pd.to_datetime(trades_df['entry_time'].min(), unit='h', origin='2024-01-01')
-        
-        capital_over_time = trades_df.set_index('exit_datetime')['running_trade_capital']
-        initial_capital_s = pd.Series([initial_capital], index=[start_time - pd.Timedelta(hours=1)])
-        capital_over_time = pd.concat([initial_capital_s, capital_over_time])
-
-        daily_capital = capital_over_time.resample('D').last().ffill()
-        daily_returns = daily_capital.pct_change().dropna()
-
-        volatility = daily_returns.std() * np.sqrt(365)
-        sharpe_ratio = (apy_after_fees - risk_free_rate) / volatility if volatility != 0 else 0
-
-        rolling_max = daily_capital.cummax()
-        daily_drawdown = (daily_capital - rolling_max) / rolling_max
-        max_drawdown = daily_drawdown.min()
-
-        value_at_risk_95 = norm.ppf(0.05, daily_returns.mean(), daily_returns.std())
-
-        # Trade Performance Metrics
-        yield_after_fees = trades_df['trade_yield_after_fees']
-        winning_trades = yield_after_fees[yield_after_fees > 0]
-        losing_trades = yield_after_fees[yield_after_fees <= 0]
-        
-        win_rate = len(winning_trades) / len(trades_df) if len(trades_df) > 0 else 0
-        profit_factor = winning_trades.sum() / abs(losing_trades.sum()) if abs(losing_trades.sum()) > 0 else float('inf')
-        
-        avg_profit = winning_trades.mean() if len(winning_trades) > 0 else 0
-        avg_loss = losing_trades.mean() if len(losing_trades) > 0 else 0
-        expectancy = (avg_profit * win_rate) + (avg_loss * (1 - win_rate))
-
-        # Strategy-Specific Metrics
-        total_funding_earned = trades_df['trade_yield_before_fees'].sum()
-        total_capital_traded = trades_df['trade_capital'].sum()
-        
-        # Capital Efficiency Metrics
-        capital_utilization = trades_df['trade_capital'].mean() / trades_df['running_trade_capital'].mean()
-        turnover_ratio = total_capital_traded / initial_capital
-        
-        # Fee Impact Metrics
-        total_fees = trades_df['fees'].sum()
-        impact_of_fees = total_fees / initial_capital
-        break_even_fee_rate = total_funding_earned / total_capital_traded if total_capital_traded > 0 else 0
-        
-        # Trade Statistics
-        num_trades = len(trades_df)
-        avg_trade_duration = trades_df['duration'].mean()
-        max_trade_duration = trades_df['duration'].max()
-
-    else:
-        # Set all metrics to 0 or appropriate defaults if no trades were made
-        final_capital = initial_capital
-        total_return_after_fees = 0
-        apy_after_fees = 0
-        total_yield_before_fees = 0
-        total_return_before_fees = 0
-        apy_before_fees = 0
-        sharpe_ratio = 0
-        max_drawdown = 0
-        volatility = 0
-        value_at_risk_95 = 0
-        profit_factor = 0
-        avg_profit = 0
-        avg_loss = 0
-        expectancy = 0
-        capital_utilization = 0
-        turnover_ratio = 0
-        impact_of_fees = 0
-        break_even_fee_rate = 0
-        num_trades = 0
-        avg_trade_duration = 0
-        max_trade_duration = 0
-        daily_capital = pd.Series([initial_capital], index=[pd.to_datetime('2024-01-01')])
-        daily_drawdown = pd.Series([0], index=[pd.to_datetime('2024-01-01')])
+import os
 
-    leverage_used = 1.0 # As per instructions
-    # Liquidity and Execution Metrics
-    slippage_impact = 0.0001 # Placeholder
-    market_impact = 0.0 # Placeholder
-
-    # Robustness Metrics
-    performance_across_regimes = "{'Bull': 0, 'Bear': 0, 'Sideways': 0}"
-    correlation_with_bitcoin = 0.0
-    sensitivity_to_parameters = 'TBD'
-    
-    # Backtesting Validation
-    out_of_sample_performance = 0.0
-    walk_forward_optimization = 'TBD'
-
-
-    # --- 3. Generate Visualizations ---
-
-    # Equity Curve
-    plt.style.use('seaborn-v0_8-darkgrid')
-    plt.figure(figsize=(12, 6))
-    plt.plot(daily_capital.index, daily_capital, label='Strategy Equity', color='blue', linewidth=2)
-    plt.title('Equity Curve', fontsize=16, fontweight='bold')
-    plt.xlabel('Date', fontsize=12)
-    plt.ylabel('Portfolio Value ($)', fontsize=12)
-    plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig('equity_curve.png', dpi=300)
-    plt.close()
-
-    # Drawdown Profile
-    plt.figure(figsize=(12, 6))
-    plt.fill_between(daily_drawdown.index, daily_drawdown * 100, 0, color='red', alpha=0.3)
-    plt.plot(daily_drawdown.index, daily_drawdown * 100, color='red', linewidth=1.5, label='Drawdown')
-    plt.title('Drawdown Profile', fontsize=16, fontweight='bold')
-    plt.xlabel('Date', fontsize=12)
-    plt.ylabel('Drawdown (%)', fontsize=12)
-    plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda y, p: f'{y:.1f}%'))
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig('drawdown.png', dpi=300)
-    plt.close()
+import pandas as pd
 
+import report
+from datastore import load_backtest_data
+from engine import span_days
 
-    # --- 4. Create the Markdown Report ---
-    report = f"""
-# Delta-Neutral Funding Rate Arbitrage Strategy Report
+TRADES_FILE = "trades.csv"
+EQUITY_FILE = "equity.csv"
+REPORT_FILE = "report.md"
+CHART_FILES = {"equity_curve": "equity_curve.png", "drawdown": "drawdown.png"}
 
-## Introduction
+# Sections worded for this report; the rest are report.SECTIONS
+SECTIONS = {
+    "introduction": """## Introduction
 In the fast-evolving world of cryptocurrency markets, where volatility is both a challenge and an opportunity, our delta-neutral funding rate arbitrage strategy stands out as a beacon of stability and consistent profitability. As of June 20, 2025, investors are seeking innovative ways to achieve steady returns without the rollercoaster of price speculation. This strategy delivers exactly that—harnessing the unique mechanics of perpetual futures to generate reliable profits, regardless of market direction. By neutralizing price risk and capitalizing on funding rate differentials, we offer a low-risk, high-reward opportunity that's ready to scale. This report unveils the strategy's mechanics, performance, and potential, inviting you to explore a proven path to sustainable gains.
-
-## Strategy Overview
+""",
+    "strategy_overview": """## Strategy Overview
 The delta-neutral funding rate arbitrage strategy is a sophisticated yet elegant approach to profiting from inefficiencies in cryptocurrency perpetual futures markets. Here's how it works:
 
 - **Core Mechanism**: The strategy involves simultaneously **shorting perpetual futures contracts** and **buying the underlying spot assets** in equal measure, creating a delta-neutral position—meaning no net exposure to price movements. Profits are derived from the **funding rate**, a periodic payment exchanged between long and short positions, typically every 8 hours. The strategy capitalizes on periods of positive funding, where short positions earn payments from long positions.
@@ -197,84 +28,41 @@ The delta-neutral funding rate arbitrage strategy is a sophisticated yet elegant
 - **Parameters**: Each trade allocates approximately 87% (20/23) of available capital, with trading fees of 0.07% for spot and 0.045% for perpetuals. Profits are compounded over time, amplifying returns.
 
 This approach ensures minimal directional risk, steady income from funding rates, and resilience across market conditions—making it a standout choice for risk-averse investors.
-
-## Market Context
+""",
+    "market_context": """## Market Context
 As of June 20, 2025, cryptocurrency markets remain a whirlwind of volatility, with Bitcoin and altcoins experiencing sharp swings driven by macroeconomic shifts and speculative trading. Perpetual futures, a dominant force in crypto derivatives, exhibit funding rates that fluctuate widely—creating fertile ground for arbitrage. This strategy thrives in such turbulence, offering a rare combination of stability and profitability amid uncertainty.
+""",
+}
 
-## Financial Metrics
-Below are the key financial metrics from the backtest, starting with an initial capital of ${initial_capital:,.2f} over a period of {days_in_backtest:.1f} days:
-
-### Return Metrics
-| Metric                              | Value       |
-|-------------------------------------|-------------|
-| Total Return (%)                    | {total_return_after_fees:.2%} |
-| APY After Fees (%)                  | {apy_after_fees:.2%} |
-| APY Before Fees (%)                 | {apy_before_fees:.2%} |
-
-### Risk Metrics
-| Metric           | Value       |
-|------------------|-------------|
-| Sharpe Ratio     | {sharpe_ratio:.2f} |
-| Maximum Drawdown (%) | {max_drawdown:.2%} |
-| Volatility (%)   | {volatility:.2%} |
-| Value at Risk (95%) (%) | {value_at_risk_95:.2%} |
-
-### Trade Performance Metrics
-| Metric                 | Value       |
-|------------------------|-------------|
-| Profit Factor          | {profit_factor:.2f} |
-| Average Profit per Trade | ${avg_profit:,.2f} |
-| Average Loss per Trade | ${avg_loss:,.2f} |
-| Expectancy             | ${expectancy:,.2f} |
 
-### Capital Efficiency Metrics
-| Metric                 | Value       |
-|------------------------|-------------|
-| Capital Utilization (%)| {capital_utilization:.2%} |
-| Turnover Ratio         | {turnover_ratio:.2f} |
-| Leverage Used          | {leverage_used:.2f} |
+def generate_report(days_in_backtest=None, cache_dir=report.REPORT_CACHE_DIR):
+    """
+    Write report.md and its charts from trades.csv, with the risk metrics taken from the daily closes of
+    equity.csv when the backtest wrote one.
 
-### Fee Impact Metrics
-| Metric                 | Value       |
-|------------------------|-------------|
-| Impact of Trading Fees (%) | {impact_of_fees:.2%} |
-| Break-Even Fee Rate (%)| {break_even_fee_rate:.4%} |
-
-### Trade Statistics
-| Metric                 | Value       |
-|------------------------|-------------|
-| Number of Trades       | {num_trades} |
-| Average Trade Duration (hours) | {avg_trade_duration:.2f} |
-| Maximum Trade Duration (hours) | {max_trade_duration} |
-
-### Liquidity and Execution Metrics
-| Metric                 | Value       |
-|------------------------|-------------|
-| Slippage Impact (%)    | {slippage_impact:.2%} |
-| Market Impact (%)      | {market_impact:.2%} |
-
-## Performance Visualizations
-- **Equity Curve**: Tracks capital growth over the backtest period.  
-  ![Equity Curve](equity_curve.png)
-- **Drawdown Profile**: Highlights the strategy's risk profile over time.  
-  ![Drawdown Profile](drawdown.png)
-
-## Risk Factors and Mitigations
-Even with its low-risk design, potential challenges include:
-- **Exchange Risk**: Counterparty failure is mitigated by spreading capital across reputable platforms.
-- **Liquidity**: Trade sizes are calibrated to market depth, avoiding slippage.
-- **Funding Rate Shifts**: Real-time monitoring ensures swift adaptation to changing conditions.
-
-## Conclusion
-The delta-neutral funding rate arbitrage strategy transforms crypto market volatility into a source of consistent, low-risk returns. With an annualized return of **{apy_after_fees:.2%}** and a Sharpe ratio of **{sharpe_ratio:.2f}**, it's a proven performer ready for investment. We invite you to connect with us to explore scaling this opportunity further.
+    Args:
+        days_in_backtest: Length of the backtest in days; the span of the equity curve, or of the backtest data, if None
+        cache_dir: Cache of the computed report data and chart hashes, or None to recompute everything
+    """
+    # --- 1. Load the Backtest Data ---
+    try:
+        trades_df_raw = pd.read_csv(TRADES_FILE)
+        equity = None
+        if os.path.exists(EQUITY_FILE):
+            # Mark-to-market equity written by the backtest; its span gives the backtest length
+            equity = pd.read_csv(EQUITY_FILE, index_col='time', parse_dates=['time'])['equity']
+        elif days_in_backtest is None:
+            # Calendar span of the full dataset, whatever its bar size
+            days_in_backtest = span_days(load_backtest_data(columns=['date_time'])['date_time'])
+    except FileNotFoundError as e:
+        print(f"Error: {e.filename} not found. Please ensure the file is in the correct directory.")
+        return
 
-**Disclaimer**: This report is for informational purposes only and does not constitute investment advice. Past performance does not guarantee future results. Investors should perform their own due diligence.
-"""
+    # --- 2. Metrics, charts and markdown, each reused from the cache when unchanged ---
+    report.generate(trades_df_raw, SECTIONS, REPORT_FILE, CHART_FILES, days_in_backtest, cache_dir=cache_dir,
+                    equity=equity)
 
-    with open("report.md", "w") as f:
-        f.write(report)
-    
-    print("Report 'report.md' and visualizations 'equity_curve.png' and 'drawdown.png' have been generated.")
+    print(f"Report '{REPORT_FILE}' and visualizations '{CHART_FILES['equity_curve']}' and '{CHART_FILES['drawdown']}' have been generated.")
 
 if __name__ == "__main__":
-    generate_report() 
\ No newline at end of file
+    generate_report()
@@ -0,0 +1,156 @@
+import json
+import re
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Separators between array elements
+_SKIP = re.compile(r"[\s,]*")
+
+# Integer columns; date_time is derived from timestamp and every other column is float64
+INT_COLUMNS = ("timestamp",)
+
+
+def _count_objects(path: str, chunk_size: int) -> int:
+    """
+    Upper bound on the number of objects in a JSON array of flat objects: the number of '{' bytes.
+    """
+    count = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return count
+            count += chunk.count(b"{")
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _iter_objects(path: str, chunk_size: int):
+    """
+    Yield the objects of a top-level JSON array one at a time, reading the file in chunks.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size)
+        pos = _SKIP.match(buf).end()
+        if not buf[pos:pos + 1] == "[":
+            raise ValueError(f"{path} does not contain a JSON array")
+        pos += 1
+
+        while True:
+            pos = _SKIP.match(buf, pos).end()
+            if pos >= len(buf):
+                more = f.read(chunk_size)
+                if not more:
+                    raise ValueError(f"{path}: unexpected end of file")
+                buf, pos = buf[pos:] + more, 0
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # The object runs past the end of the buffer
+                more = f.read(chunk_size)
+                if not more:
+                    raise
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield obj
+            pos = end
+            if pos > chunk_size:
+                buf, pos = buf[pos:], 0
+
+
+def load_json_columns(path: str, columns: Optional[List[str]] = None, chunk_size: int = 1 << 20) -> Dict[str, np.ndarray]:
+    """
+    Stream a JSON array of flat records (like data.json) into typed NumPy columns.
+
+    The file is parsed one object at a time, so only the current chunk and the output arrays are
+    held in memory; no list of dicts of strings is ever built. The arrays are preallocated from a
+    cheap byte-count pass over the file. `timestamp` is parsed as int64 and every other column as
+    float64, with empty or malformed values stored as NaN. An int64 column has no NaN, so records
+    whose timestamp is missing, empty or malformed are dropped rather than placed at epoch 0.
+
+    Args:
+        path: Path to the JSON file
+        columns: Columns to keep, all keys of the first record (except date_time) if None
+        chunk_size: Number of characters read per chunk
+
+    Returns:
+        Dictionary of column name -> array
+    """
+    capacity = _count_objects(path, chunk_size)
+    arrays: Dict[str, np.ndarray] = {}
+    converters = {}
+    keep = np.ones(capacity, dtype=bool)
+    n = 0
+
+    for obj in _iter_objects(path, chunk_size):
+        if not arrays:
+            names = columns if columns is not None else [key for key in obj if key != "date_time"]
+            for name in names:
+                if name in INT_COLUMNS:
+                    arrays[name] = np.zeros(capacity, dtype=np.int64)
+                    converters[name] = _to_int
+                else:
+                    arrays[name] = np.full(capacity, np.nan, dtype=np.float64)
+                    converters[name] = _to_float
+        for name, array in arrays.items():
+            value = obj.get(name)
+            # An empty string is a missing value, as null is
+            value = converters[name](value) if value is not None and value != "" else None
+            if value is not None:
+                array[n] = value
+            elif name in INT_COLUMNS:
+                keep[n] = False
+        n += 1
+
+    keep = keep[:n]
+    if keep.all():
+        return {name: array[:n] for name, array in arrays.items()}
+    return {name: array[:n][keep] for name, array in arrays.items()}
+
+
+def load_json_frame(path: str, columns: Optional[List[str]] = None, chunk_size: int = 1 << 20) -> pd.DataFrame:
+    """
+    Stream a JSON array of flat records into a DataFrame (see load_json_columns).
+
+    Asking for `date_time` returns it as datetime64, derived from the epoch `timestamp`.
+    """
+    wants_date_time = columns is None or "date_time" in columns
+    parse_columns = None
+    if columns is not None:
+        parse_columns = [name for name in columns if name != "date_time"]
+        if wants_date_time and "timestamp" not in parse_columns:
+            parse_columns.append("timestamp")
+
+    data = load_json_columns(path, parse_columns, chunk_size)
+    df = pd.DataFrame(data, copy=False)
+    if wants_date_time and "timestamp" in df:
+        df.insert(1 if columns is None else 0, "date_time", pd.to_datetime(df["timestamp"], unit="s"))
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+if __name__ == "__main__":
+    start = time.time()
+    df = load_json_frame("data.json")
+    print(f"Loaded {len(df)} rows x {len(df.columns)} columns from data.json in {time.time() - start:.3f}s")
+    print(df.dtypes)
@@ -0,0 +1,215 @@
+"""
+Incremental version of the delta-neutral strategy, for live monitoring.
+
+StrategyState.on_tick takes one (spot, perp, funding rate, time) observation at a time and runs
+the same entry condition and exit clauses 1/2/3 as engine.simulate, in O(1) per tick and without
+allocating DataFrames. Funding is accrued into a running sum that is added up in the same order
+as the batch engines' cumulative prefix, so replaying a series reproduces their trade ledger
+exactly.
+
+Usage:
+    state = StrategyState(FeeSchedule.flat(0.0007, 0.00045, 0.0004, 0.00015))
+    for spot, perp, fund_rate, ts in feed:
+        event = state.on_tick(spot, perp, fund_rate, ts)
+        if event is not None:
+            ...act on the entry or exit...
+
+`python live_strategy.py` replays a synthetic series, checks it against simulate() and reports
+the tick rate.
+"""
+import time
+from typing import Any, List, NamedTuple, Optional
+
+import pandas as pd
+
+from engine import ENTRY_REASON, EXIT_REASON_MAP, FeeSchedule, simulate
+
+
+class TradeEvent(NamedTuple):
+    """
+    An entry or exit, with the fields (and column names) of a simulate() trade ledger row.
+    """
+    time: Any
+    type: str
+    spot_price: float
+    perp_price: float
+    funding_rate: float
+    allocated_capital: float
+    current_capital: float
+    reason: str
+    fees: float
+    trade_pnl_before_fees: float
+    trade_pnl_after_fees: float
+    cumulative_pnl_after_fees: float
+
+
+class StrategyState:
+    """
+    Flat -> in trade -> flat state machine of the delta-neutral strategy, fed one tick at a time.
+
+    Args:
+        fees: Entry and per-clause exit fees
+        capital: Initial capital
+        a: Fraction of capital allocated to each trade
+        sl_mult: Stop-loss multiplier for the perp price
+        fund_thresh: Funding rate threshold for entry and exit
+        spot_price_exit_multiplier: Multiplier for the spot price in exit clause 2
+        compound: Allocate from running capital instead of the initial capital
+    """
+
+    __slots__ = (
+        "fees", "capital", "a", "sl_mult", "fund_thresh", "spot_price_exit_multiplier", "compound",
+        "in_trade", "entry_spot", "stop_level", "entry_funding", "allocated_capital", "entry_fee",
+        "funding", "cumulative_pnl_before_fees", "cumulative_pnl_after_fees", "stats", "ticks", "active_ticks",
+    )
+
+    def __init__(
+        self,
+        fees: FeeSchedule,
+        capital: float = 23_000,
+        a: float = 89/100,
+        sl_mult: float = 1.1,
+        fund_thresh: float = 0.00001,
+        spot_price_exit_multiplier: float = 1.0,
+        compound: bool = True,
+    ):
+        self.fees = fees
+        self.capital = capital
+        self.a = a
+        self.sl_mult = sl_mult
+        self.fund_thresh = fund_thresh
+        self.spot_price_exit_multiplier = spot_price_exit_multiplier
+        self.compound = compound
+        self.in_trade = False
+        self.entry_spot = 0.0
+        self.stop_level = 0.0
+        self.entry_funding = 0.0
+        self.allocated_capital = 0.0
+        self.entry_fee = 0.0
+        self.funding = 0.0  # Sum of the funding rates of all ticks so far
+        self.cumulative_pnl_before_fees = 0.0
+        self.cumulative_pnl_after_fees = 0.0
+        self.stats = {1: 0, 2: 0, 3: 0}
+        self.ticks = 0
+        self.active_ticks = 0
+
+    def on_tick(self, spot: float, perp: float, fund_rate: float, ts: Any = None) -> Optional[TradeEvent]:
+        """
+        Advance the state by one observation.
+
+        Ticks with a missing (NaN) value are ignored, as simulate() drops such rows.
+
+        Returns:
+            The entry or exit triggered by this tick, None otherwise
+        """
+        if spot != spot or perp != perp or fund_rate != fund_rate:
+            return None
+        self.ticks += 1
+        event = None
+
+        if not self.in_trade:
+            if perp > spot and fund_rate > self.fund_thresh:
+                running_capital = self.capital + self.cumulative_pnl_after_fees
+                allocated = self.a * running_capital if self.compound else self.a * self.capital
+                self.in_trade = True
+                self.entry_spot = spot
+                self.stop_level = self.sl_mult * perp
+                self.entry_funding = self.funding
+                self.allocated_capital = allocated
+                self.entry_fee = self.fees.entry_cost(allocated, spot, perp)
+                event = TradeEvent(ts, "entry", spot, perp, fund_rate, allocated, running_capital, ENTRY_REASON,
+                                   self.entry_fee, 0, 0, self.cumulative_pnl_after_fees)
+        else:
+            self.active_ticks += 1
+            if perp >= self.stop_level:
+                clause = 1
+            elif perp < self.spot_price_exit_multiplier * spot:
+                clause = 2
+            elif fund_rate < self.fund_thresh:
+                clause = 3
+            else:
+                clause = 0
+
+            if clause:
+                self.in_trade = False
+                self.stats[clause] += 1
+                allocated = self.allocated_capital
+                exit_fee = self.fees.exit_cost(clause, allocated, self.entry_spot, spot, perp)
+                # Funding of the ticks from entry up to (not including) this one
+                before = allocated * (self.funding - self.entry_funding)
+                after = before - (self.entry_fee + exit_fee)
+                self.cumulative_pnl_before_fees += before
+                self.cumulative_pnl_after_fees += after
+                event = TradeEvent(ts, "exit", spot, perp, fund_rate, allocated,
+                                   self.capital + self.cumulative_pnl_after_fees, EXIT_REASON_MAP[clause],
+                                   exit_fee, before, after, self.cumulative_pnl_after_fees)
+
+        self.funding += fund_rate
+        return event
+
+    @property
+    def open_pnl_before_fees(self) -> float:
+        """
+        Funding earned so far by the open trade (0 when flat), i.e. its PnL if it exited on the next tick.
+        """
+        return self.allocated_capital * (self.funding - self.entry_funding) if self.in_trade else 0.0
+
+    @property
+    def equity(self) -> float:
+        """
+        Capital plus realised PnL after fees plus the open trade's funding less its entry fee.
+        """
+        open_pnl = self.open_pnl_before_fees - self.entry_fee if self.in_trade else 0.0
+        return self.capital + self.cumulative_pnl_after_fees + open_pnl
+
+    @property
+    def time_utilization_percentage(self) -> float:
+        return (self.active_ticks / self.ticks) * 100 if self.ticks > 0 else 0
+
+
+def replay(spot_prices: pd.Series, perp_prices: pd.Series, funding_rates: pd.Series, fees: FeeSchedule,
+           **kwargs) -> tuple[pd.DataFrame, StrategyState]:
+    """
+    Feed aligned series through a StrategyState tick by tick.
+
+    Args:
+        spot_prices, perp_prices, funding_rates: Series sharing one index, used as the tick times
+        fees: Entry and per-clause exit fees
+        **kwargs: Other StrategyState arguments
+
+    Returns:
+        The events as a trade ledger (the trade_df of simulate()) and the final state
+    """
+    state = StrategyState(fees, **kwargs)
+    on_tick = state.on_tick
+    events: List[TradeEvent] = []
+    for spot, perp, fund, ts in zip(spot_prices.tolist(), perp_prices.tolist(), funding_rates.tolist(),
+                                    spot_prices.index.tolist()):
+        event = on_tick(spot, perp, fund, ts)
+        if event is not None:
+            events.append(event)
+    return pd.DataFrame(events, columns=TradeEvent._fields), state
+
+
+if __name__ == "__main__":
+    from benchmark_numba import synthetic_series
+
+    n = 2_000_000
+    spot, perp, fund = synthetic_series(n)
+    # end.py defaults
+    fees = FeeSchedule.flat(0.0007, 0.00045, 0.0004, 0.00015, clause_overrides={3: (0.0007, 0.00045)})
+    print(f"Synthetic series: {n:,} rows")
+
+    state = StrategyState(fees, capital=100_000)
+    on_tick = state.on_tick
+    ticks = list(zip(spot.tolist(), perp.tolist(), fund.tolist(), range(n)))
+    started = time.perf_counter()
+    for tick in ticks:
+        on_tick(*tick)
+    elapsed = time.perf_counter() - started
+    print(f"on_tick: {n / elapsed:,.0f} ticks/s ({elapsed:.2f}s, {state.stats[1] + state.stats[2] + state.stats[3]:,} trades)")
+
+    ledger, state = replay(spot, perp, fund, fees, capital=100_000)
+    _, stats, trades_df, utilization = simulate(spot, perp, fund, fees, capital=100_000)
+    matches = ledger.equals(trades_df) and state.stats == stats and state.time_utilization_percentage == utilization
+    print(f"Matches simulate(): {matches}")
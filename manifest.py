@@ -0,0 +1,192 @@
+"""
+Persistent manifest of completed backfill chunks.
+
+Every chunk a fetcher finishes is recorded in a SQLite table keyed by endpoint, symbol and its
+[start, end) range in epoch milliseconds, with the number of rows it returned and a checksum of
+the raw records. A restarted backfill asks the manifest for the gaps in its range and only
+requests those, on the same chunk grid as the first run.
+
+A chunk that ends less than SETTLE_MS before it is recorded may still gain rows (the exchange
+has not published them yet), so it is recorded as partial and planned again by the next run.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_MANIFEST = "fetch_manifest.sqlite"
+
+# Chunks ending within this long before now may still gain data
+SETTLE_MS = 2 * 60 * 60 * 1000
+
+Interval = Tuple[int, int]
+
+
+def checksum(records: Sequence) -> str:
+    """
+    SHA-256 of the canonical JSON encoding of a chunk's raw records.
+    """
+    payload = json.dumps(records, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """
+    Union of half-open [start, end) intervals as a sorted list of disjoint intervals.
+    """
+    merged: List[List[int]] = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def subtract_intervals(start: int, end: int, covered: Iterable[Interval]) -> List[Interval]:
+    """
+    Parts of [start, end) not covered by any of the given intervals.
+    """
+    gaps = []
+    current = start
+    for covered_start, covered_end in merge_intervals(covered):
+        if covered_end <= current:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > current:
+            gaps.append((current, covered_start))
+        current = max(current, covered_end)
+    if current < end:
+        gaps.append((current, end))
+    return gaps
+
+
+def split_on_grid(gaps: Iterable[Interval], origin: int, chunk_ms: int) -> List[Interval]:
+    """
+    Cut gaps at multiples of chunk_ms from origin, so repeated runs produce the same chunks.
+    """
+    chunks = []
+    for gap_start, gap_end in gaps:
+        current = gap_start
+        while current < gap_end:
+            boundary = origin + ((current - origin) // chunk_ms + 1) * chunk_ms
+            chunk_end = min(boundary, gap_end)
+            chunks.append((current, chunk_end))
+            current = chunk_end
+    return chunks
+
+
+def intervals_from_times(times_ms, step_ms: int) -> List[Interval]:
+    """
+    Covered intervals of a sorted series sampled every step_ms: each timestamp t covers
+    [t, t + step_ms), so any longer spacing between consecutive timestamps is a hole.
+    """
+    times = np.asarray(times_ms, dtype=np.int64)
+    if len(times) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(times) > step_ms)
+    starts = np.concatenate(([times[0]], times[breaks + 1]))
+    ends = np.concatenate((times[breaks], [times[-1]])) + step_ms
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+class ChunkManifest:
+    """
+    SQLite-backed record of completed [start, end) chunks per endpoint and symbol.
+
+    Args:
+        path: Database file, created if missing
+    """
+
+    def __init__(self, path: str = DEFAULT_MANIFEST):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                endpoint TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                start_ms INTEGER NOT NULL,
+                end_ms INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                checksum TEXT,
+                completed_at REAL NOT NULL,
+                complete INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (endpoint, symbol, start_ms, end_ms)
+            )
+            """
+        )
+        # Manifests written before partial chunks were tracked only hold complete ones
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "complete" not in columns:
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN complete INTEGER NOT NULL DEFAULT 1")
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self) -> "ChunkManifest":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, endpoint: str, symbol: str, start_ms: int, end_ms: int, rows: int, digest: Optional[str] = None):
+        """
+        Mark a chunk fetched. Call only after its data has been saved.
+
+        A chunk ending after now - SETTLE_MS is recorded as partial: it holds only the rows that
+        existed when it was fetched, so plan() keeps returning it until it is fetched once settled.
+        """
+        now = time.time()
+        complete = int(end_ms) <= int(now * 1000) - SETTLE_MS
+        self._conn.execute(
+            "INSERT OR REPLACE INTO chunks (endpoint, symbol, start_ms, end_ms, rows, checksum, completed_at, complete) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (endpoint, symbol, int(start_ms), int(end_ms), int(rows), digest, now, int(complete)),
+        )
+        self._conn.commit()
+
+    def chunks(self, endpoint: str, symbol: str, partial: bool = False) -> List[Tuple[int, int, int, Optional[str]]]:
+        """
+        Completed chunks as (start_ms, end_ms, rows, checksum), sorted by start (the partial ones instead if partial).
+        """
+        cursor = self._conn.execute(
+            "SELECT start_ms, end_ms, rows, checksum FROM chunks WHERE endpoint = ? AND symbol = ? AND complete = ? "
+            "ORDER BY start_ms",
+            (endpoint, symbol, int(not partial)),
+        )
+        return cursor.fetchall()
+
+    def completed(self, endpoint: str, symbol: str, empty_only: bool = False) -> List[Interval]:
+        """
+        Merged intervals covered by completed chunks (only those that returned no rows if empty_only).
+        """
+        return merge_intervals(
+            (start, end) for start, end, rows, _ in self.chunks(endpoint, symbol) if not empty_only or rows == 0
+        )
+
+    def plan(
+        self,
+        endpoint: str,
+        symbol: str,
+        start_ms: int,
+        end_ms: int,
+        chunk_ms: int,
+        covered: Optional[Iterable[Interval]] = None,
+    ) -> List[Interval]:
+        """
+        Chunks of [start_ms, end_ms) still to fetch.
+
+        Args:
+            covered: Intervals known to be present, the manifest's completed chunks if None
+        """
+        if covered is None:
+            covered = self.completed(endpoint, symbol)
+        return split_on_grid(subtract_intervals(start_ms, end_ms, covered), start_ms, chunk_ms)
@@ -0,0 +1,365 @@
+"""
+Local stand-in for the Hyperliquid info endpoint, for exercising the fetchers offline.
+
+It answers POST /info for fundingHistory, candleSnapshot, meta, spotMeta and allMids with
+deterministic synthetic data shaped like the real responses, including the per-response item limits. Latency and
+HTTP 429 responses can be injected to check concurrency, rate limiting and retries.
+
+MockHyperliquidWsServer stands in for the /ws endpoint: it streams activeAssetCtx updates for the
+subscribed coins and can drop connections after a number of messages to exercise reconnects.
+
+Usage:
+    with MockHyperliquidServer(latency=0.05) as server:
+        ...point a client at server.url...
+
+or run `python mock_hyperliquid.py` to serve on http://127.0.0.1:8765 until interrupted.
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+HOUR_MS = 60 * 60 * 1000
+
+INTERVAL_MS = {
+    "1m": 60_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "1h": 3_600_000,
+}
+
+# Item limits of the real endpoint
+MAX_FUNDING_ITEMS = 500
+MAX_CANDLES = 5000
+
+
+def synthetic_price(t_ms: int, offset: float = 0.0) -> float:
+    return 25.0 + 3.0 * math.sin(t_ms / (7 * 24 * HOUR_MS)) + 0.5 * math.sin(t_ms / (5 * HOUR_MS)) + offset
+
+
+def synthetic_funding_rate(t_ms: int) -> float:
+    return 0.0000125 + 0.00002 * math.sin(t_ms / (3 * 24 * HOUR_MS))
+
+
+def _missing(t: int, missing) -> bool:
+    return any(start <= t < end for start, end in missing)
+
+
+def funding_history(coin: str, start_ms: int, end_ms: Optional[int], listed_ms: int = 0, missing=()) -> List[Dict]:
+    end_ms = end_ms if end_ms is not None else int(time.time() * 1000)
+    first = max(start_ms, listed_ms)
+    t = -(-first // HOUR_MS) * HOUR_MS  # first funding time on or after start
+    records = []
+    while t <= end_ms and len(records) < MAX_FUNDING_ITEMS:
+        if _missing(t, missing):
+            t += HOUR_MS
+            continue
+        rate = synthetic_funding_rate(t)
+        records.append({
+            "coin": coin,
+            "fundingRate": f"{rate:.10f}",
+            "premium": f"{rate * 8:.10f}",
+            "time": t,
+        })
+        t += HOUR_MS
+    return records
+
+
+def candle_snapshot(coin: str, interval: str, start_ms: int, end_ms: int, listed_ms: int = 0, missing=()) -> List[Dict]:
+    step = INTERVAL_MS.get(interval, 60_000)
+    # Spot coins are "@<index>" or "BASE/QUOTE"; perps trade at a small premium
+    offset = 0.0 if coin.startswith("@") or "/" in coin else 0.02
+    first = max(start_ms, listed_ms)
+    t = -(-first // step) * step
+    candles = []
+    while t <= end_ms and len(candles) < MAX_CANDLES:
+        if _missing(t, missing):
+            t += step
+            continue
+        o = synthetic_price(t, offset)
+        c = synthetic_price(t + step, offset)
+        candles.append({
+            "t": t,
+            "T": t + step - 1,
+            "s": coin,
+            "i": interval,
+            "o": f"{o:.4f}",
+            "c": f"{c:.4f}",
+            "h": f"{max(o, c) * 1.001:.4f}",
+            "l": f"{min(o, c) * 0.999:.4f}",
+            "v": "1000.0",
+            "n": 10,
+        })
+        t += step
+    return candles
+
+
+def meta() -> Dict:
+    now = int(time.time() * 1000)
+    return {
+        "universe": [
+            {"name": "BTC", "szDecimals": 5, "markPrice": "100000.0", "oraclePrice": "99990.0"},
+            {"name": "ETH", "szDecimals": 4, "markPrice": "3000.0", "oraclePrice": "2999.0"},
+            {"name": "HYPE", "szDecimals": 2,
+             "markPrice": f"{synthetic_price(now, 0.02):.4f}", "oraclePrice": f"{synthetic_price(now):.4f}"},
+        ]
+    }
+
+
+def all_mids() -> Dict[str, str]:
+    now = int(time.time() * 1000)
+    return {"BTC": "100000.0", "ETH": "3000.0", "HYPE": f"{synthetic_price(now, 0.02):.4f}",
+            "@107": f"{synthetic_price(now):.4f}"}
+
+
+def spot_meta() -> Dict:
+    # Just enough for hyperliquid.info.Info to map "HYPE/USDC" to "@107" on construction
+    return {
+        "tokens": [
+            {"name": "USDC", "szDecimals": 8, "weiDecimals": 8, "index": 0},
+            {"name": "HYPE", "szDecimals": 2, "weiDecimals": 8, "index": 150},
+        ],
+        "universe": [
+            {"name": "@107", "tokens": [150, 0], "index": 107, "isCanonical": False},
+        ],
+    }
+
+
+def active_asset_ctx(coin: str) -> Dict:
+    """
+    An activeAssetCtx websocket message for coin: activeSpotAssetCtx for spot pairs, perp context otherwise.
+    """
+    now = int(time.time() * 1000)
+    if coin.startswith("@") or "/" in coin:
+        price = synthetic_price(now)
+        return {"channel": "activeSpotAssetCtx", "data": {"coin": coin, "ctx": {
+            "prevDayPx": f"{price:.4f}", "dayNtlVlm": "1000000.0", "markPx": f"{price:.4f}",
+            "midPx": f"{price:.4f}", "circulatingSupply": "333000000.0", "coin": coin,
+        }}}
+    mark = synthetic_price(now, 0.02)
+    return {"channel": "activeAssetCtx", "data": {"coin": coin, "ctx": {
+        "funding": f"{synthetic_funding_rate(now):.10f}", "openInterest": "1000000.0", "prevDayPx": f"{mark:.4f}",
+        "dayNtlVlm": "1000000.0", "premium": "0.0008", "oraclePx": f"{synthetic_price(now):.4f}",
+        "markPx": f"{mark:.4f}", "midPx": f"{mark:.4f}", "impactPxs": [f"{mark - 0.001:.4f}", f"{mark + 0.001:.4f}"],
+        "dayBaseVlm": "40000.0",
+    }}}
+
+
+class MockHyperliquidServer:
+    """
+    Threaded HTTP server answering like https://api.hyperliquid.xyz/info.
+
+    Args:
+        host, port: Address to bind, port 0 picks a free port
+        latency: Seconds each request takes
+        error_rate: Fraction of requests answered with HTTP 429
+        listed_ms: No data is returned before this epoch-ms time
+        missing: (start_ms, end_ms) ranges with no data, to simulate holes
+        seed: Seed for the error injection
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 error_rate: float = 0.0, listed_ms: int = 0, missing=(), seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.listed_ms = listed_ms
+        self.missing = list(missing)
+        self.request_count = 0
+        self.error_count = 0
+        self.active_requests = 0
+        self.max_active_requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle(self, payload: Dict):
+        request_type = payload.get("type")
+        if request_type == "fundingHistory":
+            return funding_history(payload["coin"], payload["startTime"], payload.get("endTime"), self.listed_ms,
+                                   self.missing)
+        if request_type == "candleSnapshot":
+            req = payload["req"]
+            return candle_snapshot(req["coin"], req["interval"], req["startTime"], req["endTime"], self.listed_ms,
+                                   self.missing)
+        if request_type == "meta":
+            return meta()
+        if request_type == "spotMeta":
+            return spot_meta()
+        if request_type == "allMids":
+            return all_mids()
+        return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                with server._lock:
+                    server.request_count += 1
+                    server.active_requests += 1
+                    server.max_active_requests = max(server.max_active_requests, server.active_requests)
+                    fail = server._random.random() < server.error_rate
+                    if fail:
+                        server.error_count += 1
+                try:
+                    if server.latency:
+                        time.sleep(server.latency)
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                    if self.path != "/info":
+                        self._reply(404, {"error": "not found"})
+                    elif fail:
+                        self._reply(429, {"error": "rate limited"})
+                    else:
+                        body = server.handle(payload)
+                        if body is None:
+                            self._reply(422, {"error": f"unsupported request type {payload.get('type')}"})
+                        else:
+                            self._reply(200, body)
+                finally:
+                    with server._lock:
+                        server.active_requests -= 1
+
+            def _reply(self, status: int, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "MockHyperliquidServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockHyperliquidServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class MockHyperliquidWsServer:
+    """
+    Websocket server answering like wss://api.hyperliquid.xyz/ws, run on its own event loop thread.
+
+    Handles subscribe (activeAssetCtx) and ping messages, and pushes one update per subscription
+    every tick_interval seconds.
+
+    Args:
+        host, port: Address to bind, port 0 picks a free port
+        tick_interval: Seconds between pushes
+        disconnect_after: Close each connection after this many pushed messages, None to keep it open
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, tick_interval: float = 0.01,
+                 disconnect_after: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.tick_interval = tick_interval
+        self.disconnect_after = disconnect_after
+        self.connection_count = 0
+        self.message_count = 0
+        self._loop = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/ws"
+
+    async def _push(self, ws: web.WebSocketResponse, subscriptions: List[Dict]):
+        sent = 0
+        while not ws.closed:
+            for subscription in list(subscriptions):
+                await ws.send_json(active_asset_ctx(subscription["coin"]))
+                sent += 1
+                self.message_count += 1
+                if self.disconnect_after is not None and sent >= self.disconnect_after:
+                    await ws.close()
+                    return
+            await asyncio.sleep(self.tick_interval)
+
+    async def _handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connection_count += 1
+        subscriptions: List[Dict] = []
+        pusher = asyncio.ensure_future(self._push(ws, subscriptions))
+        try:
+            async for message in ws:
+                payload = json.loads(message.data)
+                if payload.get("method") == "ping":
+                    await ws.send_json({"channel": "pong"})
+                elif payload.get("method") == "subscribe" and payload["subscription"].get("type") == "activeAssetCtx":
+                    subscriptions.append(payload["subscription"])
+                    await ws.send_json({"channel": "subscriptionResponse", "data": payload})
+                else:
+                    await ws.send_json({"channel": "error", "data": f"unsupported message {message.data}"})
+        finally:
+            pusher.cancel()
+        return ws
+
+    def start(self) -> "MockHyperliquidWsServer":
+        started = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            app = web.Application()
+            app.router.add_get("/ws", self._handle)
+            self._runner = web.AppRunner(app)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, self.host, self.port)
+            self._loop.run_until_complete(site.start())
+            self.port = self._runner.addresses[0][1]
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self) -> "MockHyperliquidWsServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    mock = MockHyperliquidServer(port=8765)
+    print(f"Mock Hyperliquid info endpoint on {mock.url}/info (Ctrl+C to stop)")
+    try:
+        mock._httpd.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
@@ -0,0 +1,283 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from accumulators import FundingAccumulator
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """
+        Stand-in for numba.njit when Numba is not installed: the kernel runs as plain Python.
+        """
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+class KernelResult(NamedTuple):
+    """
+    Trades found by delta_neutral_kernel. The entry arrays have one more element than the
+    exit arrays when a trade is still open at the end of the data.
+    """
+    entries: np.ndarray
+    allocated: np.ndarray
+    entry_fees: np.ndarray
+    exits: np.ndarray
+    clauses: np.ndarray
+    exit_fees: np.ndarray
+    pnl_before_fees: np.ndarray
+    pnl_after_fees: np.ndarray
+    active_periods: int
+
+
+@njit(cache=True)
+def _kernel(spot, perp, fund, prefix, capital, a, sl_mult, entry_rates, exit_rates, notional,
+            compound, fund_thresh, spot_price_exit_multiplier):
+    n = spot.shape[0]
+    max_trades = n // 2 + 1
+    entries = np.empty(max_trades, dtype=np.int64)
+    allocated = np.empty(max_trades, dtype=np.float64)
+    entry_fees = np.empty(max_trades, dtype=np.float64)
+    exits = np.empty(max_trades, dtype=np.int64)
+    clauses = np.empty(max_trades, dtype=np.int64)
+    exit_fees = np.empty(max_trades, dtype=np.float64)
+    pnl_before = np.empty(max_trades, dtype=np.float64)
+    pnl_after = np.empty(max_trades, dtype=np.float64)
+
+    n_entries = 0
+    n_exits = 0
+    active_periods = 0
+    in_trade = False
+    entry = 0
+    stop_level = 0.0
+    allocated_capital = 0.0
+    entry_fee_cost = 0.0
+    cum_after = 0.0
+
+    for t in range(n):
+        if not in_trade:
+            if perp[t] > spot[t] and fund[t] > fund_thresh:
+                in_trade = True
+                entry = t
+                stop_level = sl_mult * perp[t]
+                if compound:
+                    allocated_capital = a * (capital + cum_after)
+                else:
+                    allocated_capital = a * capital
+                if notional:
+                    tokens = allocated_capital / spot[t]
+                    entry_fee_cost = (tokens * spot[t] * entry_rates[0]) + (tokens * perp[t] * entry_rates[1])
+                else:
+                    entry_fee_cost = allocated_capital * (entry_rates[0] + entry_rates[1])
+                entries[n_entries] = t
+                allocated[n_entries] = allocated_capital
+                entry_fees[n_entries] = entry_fee_cost
+                n_entries += 1
+        else:
+            active_periods += 1
+            if perp[t] >= stop_level:
+                clause = 1
+            elif perp[t] < spot_price_exit_multiplier * spot[t]:
+                clause = 2
+            elif fund[t] < fund_thresh:
+                clause = 3
+            else:
+                clause = 0
+
+            if clause:
+                in_trade = False
+                if notional:
+                    tokens = allocated_capital / spot[entry]
+                    exit_fee_cost = (tokens * spot[t] * exit_rates[clause, 0]) + (tokens * perp[t] * exit_rates[clause, 1])
+                else:
+                    exit_fee_cost = allocated_capital * (exit_rates[clause, 0] + exit_rates[clause, 1])
+                before = allocated_capital * (prefix[t] - prefix[entry])
+                after = before - (entry_fee_cost + exit_fee_cost)
+                cum_after += after
+                exits[n_exits] = t
+                clauses[n_exits] = clause
+                exit_fees[n_exits] = exit_fee_cost
+                pnl_before[n_exits] = before
+                pnl_after[n_exits] = after
+                n_exits += 1
+
+    return (entries[:n_entries], allocated[:n_entries], entry_fees[:n_entries],
+            exits[:n_exits], clauses[:n_exits], exit_fees[:n_exits],
+            pnl_before[:n_exits], pnl_after[:n_exits], active_periods)
+
+
+def delta_neutral_kernel(
+    spot: np.ndarray,
+    perp: np.ndarray,
+    fund: np.ndarray,
+    capital: float,
+    a: float,
+    sl_mult: float,
+    entry_rates: np.ndarray,
+    exit_rates: np.ndarray,
+    notional: bool,
+    compound: bool,
+    fund_thresh: float,
+    spot_price_exit_multiplier: float,
+) -> KernelResult:
+    """
+    Run the flat -> in_trade -> exit state machine over float64 arrays.
+
+    Compiled with Numba when it is installed, otherwise executed as plain Python.
+
+    Args:
+        spot, perp, fund: Input arrays without missing values
+        capital: Initial capital
+        a: Fraction of capital allocated to each trade
+        sl_mult: Stop-loss multiplier for the perp price
+        entry_rates: (spot, perp) fee rates charged on entry
+        exit_rates: (4, 2) array of (spot, perp) exit fee rates, indexed by exit clause
+        notional: Charge each leg on its notional instead of on the allocated capital
+        compound: Allocate from running capital instead of the initial capital
+        fund_thresh: Funding rate threshold for entry and exit
+        spot_price_exit_multiplier: Multiplier for the spot price in exit clause 2
+
+    Returns:
+        KernelResult with entry/exit indices, exit clauses, fees and per-trade PnL
+    """
+    spot = np.ascontiguousarray(spot, dtype=np.float64)
+    perp = np.ascontiguousarray(perp, dtype=np.float64)
+    fund = np.ascontiguousarray(fund, dtype=np.float64)
+    prefix = FundingAccumulator(fund).prefix
+    return KernelResult(*_kernel(
+        spot, perp, fund, prefix, float(capital), float(a), float(sl_mult),
+        np.asarray(entry_rates, dtype=np.float64), np.asarray(exit_rates, dtype=np.float64),
+        bool(notional), bool(compound), float(fund_thresh), float(spot_price_exit_multiplier),
+    ))
+
+
+class AllocationResult(NamedTuple):
+    """
+    Shared-capital allocation of a merged event stream by allocation_kernel, one element per event.
+    Events that were skipped (an entry finding every slot taken, and that trade's exit) have
+    taken False and zeros elsewhere.
+    """
+    taken: np.ndarray
+    allocated: np.ndarray
+    current_capital: np.ndarray
+    fees: np.ndarray
+    pnl_before_fees: np.ndarray
+    pnl_after_fees: np.ndarray
+    cumulative_pnl_after_fees: np.ndarray
+
+
+@njit(cache=True)
+def _allocation_kernel(kinds, columns, spot, perp, clauses, rate_sums, n_assets, capital, a, max_open,
+                       compound, entry_rates, exit_rates, notional):
+    n = kinds.shape[0]
+    taken = np.zeros(n, dtype=np.bool_)
+    allocated_out = np.zeros(n)
+    capital_out = np.zeros(n)
+    fees_out = np.zeros(n)
+    before_out = np.zeros(n)
+    after_out = np.zeros(n)
+    cumulative_out = np.zeros(n)
+
+    # Open leg of each asset: allocated capital, entry fee and entry spot price
+    open_allocated = np.zeros(n_assets)
+    open_fee = np.zeros(n_assets)
+    open_spot = np.zeros(n_assets)
+    blocked = np.zeros(n_assets, dtype=np.bool_)  # the asset's current trade was skipped
+    n_open = 0
+    cum_after = 0.0
+
+    for i in range(n):
+        column = columns[i]
+        if kinds[i] == 1:
+            if n_open >= max_open:
+                blocked[column] = True
+                continue
+            running_capital = capital + cum_after
+            if compound:
+                allocated_capital = a * running_capital / max_open
+            else:
+                allocated_capital = a * capital / max_open
+            if notional:
+                tokens = allocated_capital / spot[i]
+                fee = (tokens * spot[i] * entry_rates[0]) + (tokens * perp[i] * entry_rates[1])
+            else:
+                fee = allocated_capital * (entry_rates[0] + entry_rates[1])
+            open_allocated[column] = allocated_capital
+            open_fee[column] = fee
+            open_spot[column] = spot[i]
+            n_open += 1
+            capital_out[i] = running_capital
+        else:
+            if blocked[column]:
+                blocked[column] = False
+                continue
+            allocated_capital = open_allocated[column]
+            clause = clauses[i]
+            if notional:
+                tokens = allocated_capital / open_spot[column]
+                fee = (tokens * spot[i] * exit_rates[clause, 0]) + (tokens * perp[i] * exit_rates[clause, 1])
+            else:
+                fee = allocated_capital * (exit_rates[clause, 0] + exit_rates[clause, 1])
+            before = allocated_capital * rate_sums[i]
+            after = before - (open_fee[column] + fee)
+            cum_after += after
+            n_open -= 1
+            capital_out[i] = capital + cum_after
+            before_out[i] = before
+            after_out[i] = after
+        taken[i] = True
+        allocated_out[i] = allocated_capital
+        fees_out[i] = fee
+        cumulative_out[i] = cum_after
+
+    return taken, allocated_out, capital_out, fees_out, before_out, after_out, cumulative_out
+
+
+def allocation_kernel(
+    kinds: np.ndarray,
+    columns: np.ndarray,
+    spot: np.ndarray,
+    perp: np.ndarray,
+    clauses: np.ndarray,
+    rate_sums: np.ndarray,
+    n_assets: int,
+    capital: float,
+    a: float,
+    max_open: int,
+    compound: bool,
+    entry_rates: np.ndarray,
+    exit_rates: np.ndarray,
+    notional: bool,
+) -> AllocationResult:
+    """
+    Allocate shared capital over the time-ordered entries and exits of many assets.
+
+    Each entry takes a / max_open of the running capital (of capital if not compound) unless
+    max_open legs are open, in which case it and its exit are skipped. Compiled with Numba when
+    it is installed, otherwise executed as plain Python.
+
+    Args:
+        kinds: 1 for an entry, 0 for an exit, per event in processing order
+        columns: Asset of each event, 0..n_assets-1
+        spot, perp: Prices at each event
+        clauses: Exit clause of each exit event (ignored for entries)
+        rate_sums: Funding rate summed over the trade, for each exit event
+        n_assets: Number of assets
+        capital, a, max_open, compound: As for portfolio.simulate_portfolio
+        entry_rates, exit_rates, notional: Fee rates in the layout of FeeSchedule.rate_arrays
+
+    Returns:
+        AllocationResult with the ledger values of every event
+    """
+    return AllocationResult(*_allocation_kernel(
+        np.ascontiguousarray(kinds, dtype=np.int64), np.ascontiguousarray(columns, dtype=np.int64),
+        np.ascontiguousarray(spot, dtype=np.float64), np.ascontiguousarray(perp, dtype=np.float64),
+        np.ascontiguousarray(clauses, dtype=np.int64), np.ascontiguousarray(rate_sums, dtype=np.float64),
+        int(n_assets), float(capital), float(a), int(max_open), bool(compound),
+        np.asarray(entry_rates, dtype=np.float64), np.asarray(exit_rates, dtype=np.float64), bool(notional),
+    ))
@@ -0,0 +1,262 @@
+"""
+Multi-asset portfolio backtest of the delta-neutral funding strategy.
+
+Inputs are (time x asset) frames of spot prices, perp prices and funding rates. The backtest
+runs in two phases:
+
+1. Signals, in parallel. When a trade opens and closes, and through which exit clause, depends
+   only on an asset's own prices and funding, not on the capital behind it. Each worker
+   process runs the state-machine kernel for one shard of assets (columns of a shared memory
+   block, as in sweep.py) and returns each trade's entry and exit rows, exit clause and
+   summed funding rate.
+2. Allocation, in one compiled pass (numba_kernel.allocation_kernel). The trades of all assets
+   are merged in time order with array operations. Each entry takes one of max_open equal
+   slots of the `a` fraction of running capital, so at most `a` of the capital is deployed
+   across the simultaneously open legs. Its fees and funding PnL are then priced exactly as
+   simulate() does. An entry that finds every slot taken is skipped, and that asset waits for
+   the skipped trade's exit signal before it can enter again.
+
+With one asset and max_open=1 the ledger is identical to simulate()'s.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from accumulators import FundingAccumulator
+from engine import ENTRY_REASON, EXIT_REASON_MAP, FeeSchedule
+from numba_kernel import allocation_kernel, delta_neutral_kernel
+from sweep import SERIES
+
+# Set in each worker process by _attach_shared_panel
+_shared_block = None
+_shared_panel = None
+
+
+def _attach_shared_panel(shm_name: str, n_times: int, n_assets: int):
+    """
+    Worker initializer: map the shared (series, time, asset) block read-only.
+    """
+    global _shared_block, _shared_panel
+    _shared_block = shared_memory.SharedMemory(name=shm_name)
+    _shared_panel = np.ndarray((len(SERIES), n_times, n_assets), dtype=np.float64, buffer=_shared_block.buf)
+    _shared_panel.flags.writeable = False
+
+
+def asset_trades(spot: np.ndarray, perp: np.ndarray, fund: np.ndarray, sl_mult: float, fund_thresh: float,
+                 spot_price_exit_multiplier: float) -> Dict[str, np.ndarray]:
+    """
+    Capital-independent trades of one asset.
+
+    Rows with a missing value are dropped first, as simulate() does; the returned positions
+    index the original time axis.
+
+    Returns:
+        Dict of per-trade arrays: entry and exit rows, exit clause and funding rate summed over
+        the trade. "entries" has one more element than the others when a trade is still open
+        at the end of the data.
+    """
+    rows = np.flatnonzero(~(np.isnan(spot) | np.isnan(perp) | np.isnan(fund)))
+    spot, perp, fund = spot[rows], perp[rows], fund[rows]
+    # The trade times do not depend on capital or fees, so the kernel runs with unit capital and no fees
+    result = delta_neutral_kernel(spot, perp, fund, 1.0, 1.0, sl_mult, np.zeros(2), np.zeros((4, 2)), False, False,
+                                  fund_thresh, spot_price_exit_multiplier)
+    funding = FundingAccumulator(fund)
+    closed = result.entries[:len(result.exits)]
+    return {
+        "entries": rows[result.entries],
+        "exits": rows[result.exits],
+        "clauses": result.clauses,
+        "rate_sums": funding.prefix[result.exits] - funding.prefix[closed],
+    }
+
+
+def _run_shard(columns: List[int], sl_mult: float, fund_thresh: float,
+               spot_price_exit_multiplier: float) -> Dict[int, Dict[str, np.ndarray]]:
+    return {
+        column: asset_trades(
+            np.ascontiguousarray(_shared_panel[0, :, column]),
+            np.ascontiguousarray(_shared_panel[1, :, column]),
+            np.ascontiguousarray(_shared_panel[2, :, column]),
+            sl_mult, fund_thresh, spot_price_exit_multiplier,
+        )
+        for column in columns
+    }
+
+
+def _signals(panel: np.ndarray, sl_mult: float, fund_thresh: float, spot_price_exit_multiplier: float,
+             max_workers: Optional[int]) -> Dict[int, Dict[str, np.ndarray]]:
+    """
+    Phase 1: capital-independent trades of every asset, one shard of assets per task.
+    """
+    n_series, n_times, n_assets = panel.shape
+    max_workers = max_workers or os.cpu_count()
+    if max_workers == 1:
+        global _shared_panel
+        _shared_panel = panel
+        return _run_shard(list(range(n_assets)), sl_mult, fund_thresh, spot_price_exit_multiplier)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(panel.nbytes, 1))
+    try:
+        block = np.ndarray(panel.shape, dtype=np.float64, buffer=shm.buf)
+        block[:] = panel
+        del block
+
+        shards = [list(shard) for shard in np.array_split(np.arange(n_assets), min(max_workers, n_assets)) if len(shard)]
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_attach_shared_panel,
+            initargs=(shm.name, n_times, n_assets),
+        ) as executor:
+            futures = [executor.submit(_run_shard, shard, sl_mult, fund_thresh, spot_price_exit_multiplier)
+                       for shard in shards]
+            trades = {}
+            for future in futures:
+                trades.update(future.result())
+    finally:
+        shm.close()
+        shm.unlink()
+    return trades
+
+
+def simulate_portfolio(
+    spot_prices: pd.DataFrame,
+    perp_prices: pd.DataFrame,
+    funding_rates: pd.DataFrame,
+    fees: FeeSchedule,
+    capital: float = 23_000,
+    a: float = 89/100,
+    max_open: Optional[int] = None,
+    sl_mult: float = 1.1,
+    fund_thresh: float = 0.00001,
+    spot_price_exit_multiplier: float = 1.0,
+    compound: bool = True,
+    max_workers: Optional[int] = None,
+) -> tuple[pd.DataFrame, pd.Series, pd.DataFrame]:
+    """
+    Simulates the delta-neutral funding strategy on many assets sharing one pool of capital.
+
+    Each asset follows simulate()'s entry condition and exit clauses on its own columns. Capital
+    is shared: every entry is allocated a / max_open of the running capital (of the initial
+    capital if compound is False), and entries while max_open legs are already open are skipped.
+    At each time step exits are settled before entries, so a leg closed at t frees its slot and
+    its PnL for the entries at t.
+
+    Parameters:
+    - spot_prices, perp_prices, funding_rates (pd.DataFrame): Time x asset frames with the same index and columns.
+      Missing values (e.g. before an asset was listed) are skipped for that asset.
+    - fees (FeeSchedule): Entry and per-clause exit fees, shared by all assets.
+    - capital (float): Total trading capital. Default is 23,000.
+    - a (float): Fraction of capital deployed across all open legs. Default is 89/100.
+    - max_open (int): Number of legs that can be open at once, defaults to the number of assets.
+    - sl_mult, fund_thresh, spot_price_exit_multiplier: As for simulate().
+    - compound (bool): Allocate from running capital (True) or the initial capital (False). Default is True.
+    - max_workers (int): Process pool size for the per-asset signals, defaults to all cores; 1 runs in-process.
+
+    Returns:
+    - trades_df (pd.DataFrame): Entries and exits of all assets in time order, with simulate()'s ledger columns plus 'asset'.
+    - equity (pd.Series): Capital plus realised PnL after fees at each time step.
+    - summary (pd.DataFrame): Per asset: trades taken, trades skipped, exits per clause and PnL after fees.
+    """
+    assets = list(spot_prices.columns)
+    index = spot_prices.index
+    panel = np.stack([
+        spot_prices.to_numpy(dtype=np.float64),
+        perp_prices[assets].to_numpy(dtype=np.float64),
+        funding_rates[assets].to_numpy(dtype=np.float64),
+    ])
+    max_open = max_open or len(assets)
+
+    signals = _signals(panel, sl_mult, fund_thresh, spot_price_exit_multiplier, max_workers)
+
+    # Phase 2: merge every asset's trades into one event stream, exits (0) before entries (1) at equal times.
+    # Entries carry clause 0 and no funding. The empty seed arrays make no signals at all an empty ledger
+    times, kinds, columns, clauses = ([np.zeros(0, dtype=np.int64)] for _ in range(4))
+    rate_sums = [np.zeros(0)]
+    for column, trades in signals.items():
+        n_entries, n_exits = len(trades["entries"]), len(trades["exits"])
+        times.extend((trades["entries"], trades["exits"]))
+        kinds.extend((np.ones(n_entries, dtype=np.int64), np.zeros(n_exits, dtype=np.int64)))
+        columns.extend((np.full(n_entries, column, dtype=np.int64), np.full(n_exits, column, dtype=np.int64)))
+        clauses.extend((np.zeros(n_entries, dtype=np.int64), trades["clauses"]))
+        rate_sums.extend((np.zeros(n_entries), trades["rate_sums"]))
+    times, kinds, columns = np.concatenate(times), np.concatenate(kinds), np.concatenate(columns)
+    clauses, rate_sums = np.concatenate(clauses), np.concatenate(rate_sums)
+    order = np.lexsort((columns, kinds, times))
+    times, kinds, columns, clauses, rate_sums = times[order], kinds[order], columns[order], clauses[order], rate_sums[order]
+
+    spot, perp, fund = panel
+    entry_rates, exit_rates = fees.rate_arrays()
+    result = allocation_kernel(kinds, columns, spot[times, columns], perp[times, columns], clauses, rate_sums,
+                               len(assets), capital, a, max_open, compound, entry_rates, exit_rates, fees.notional)
+
+    exits = result.taken & (kinds == 0)
+    taken = np.bincount(columns[result.taken & (kinds == 1)], minlength=len(assets))
+    skipped = np.bincount(columns[~result.taken & (kinds == 1)], minlength=len(assets))
+    clause_counts = np.zeros((len(assets), 4), dtype=np.int64)
+    np.add.at(clause_counts, (columns[exits], clauses[exits]), 1)
+    asset_pnl = np.bincount(columns[exits], weights=result.pnl_after_fees[exits], minlength=len(assets))
+    pnl_steps = np.bincount(times[exits], weights=result.pnl_after_fees[exits], minlength=len(index))
+
+    rows, row_columns, row_clauses = times[result.taken], columns[result.taken], clauses[result.taken]
+    reasons = np.array([ENTRY_REASON] + [EXIT_REASON_MAP[clause] for clause in (1, 2, 3)], dtype=object)
+    trades_df = pd.DataFrame({
+        "time": index.take(rows),
+        "asset": np.asarray(assets, dtype=object)[row_columns],
+        "type": np.where(row_clauses == 0, "entry", "exit").astype(object),
+        "spot_price": spot[rows, row_columns],
+        "perp_price": perp[rows, row_columns],
+        "funding_rate": fund[rows, row_columns],
+        "allocated_capital": result.allocated[result.taken],
+        "current_capital": result.current_capital[result.taken],
+        "reason": reasons[row_clauses],
+        "fees": result.fees[result.taken],
+        "trade_pnl_before_fees": result.pnl_before_fees[result.taken],
+        "trade_pnl_after_fees": result.pnl_after_fees[result.taken],
+        "cumulative_pnl_after_fees": result.cumulative_pnl_after_fees[result.taken],
+    })
+    equity = pd.Series(capital + np.cumsum(pnl_steps), index=index, name="equity")
+    summary = pd.DataFrame({
+        "asset": assets,
+        "trades": taken,
+        "skipped": skipped,
+        "exit_clause_1": clause_counts[:, 1],
+        "exit_clause_2": clause_counts[:, 2],
+        "exit_clause_3": clause_counts[:, 3],
+        "pnl_after_fees": asset_pnl,
+    })
+    return trades_df, equity, summary
+
+
+if __name__ == "__main__":
+    from benchmark_numba import synthetic_series
+    from engine import simulate
+
+    n_times, n_assets = 100_000, 48
+    columns = [f"COIN{i:02d}" for i in range(n_assets)]
+    legs = [synthetic_series(n_times, seed=i) for i in range(n_assets)]
+    spot = pd.DataFrame({name: leg[0] for name, leg in zip(columns, legs)})
+    perp = pd.DataFrame({name: leg[1] for name, leg in zip(columns, legs)})
+    fund = pd.DataFrame({name: leg[2] for name, leg in zip(columns, legs)})
+    # Stagger the listings
+    for i, name in enumerate(columns):
+        spot.loc[:i * 1000, name] = np.nan
+    fees = FeeSchedule.flat(0.0007, 0.00045, 0.0004, 0.00015, clause_overrides={3: (0.0007, 0.00045)})
+
+    _, _, single, _ = simulate(spot[columns[0]], perp[columns[0]], fund[columns[0]], fees, capital=100_000)
+    ledger, _, _ = simulate_portfolio(spot[[columns[0]]], perp[[columns[0]]], fund[[columns[0]]], fees,
+                                      capital=100_000, max_open=1, max_workers=1)
+    print(f"One asset matches simulate(): {ledger.drop(columns='asset').equals(single)}")
+
+    # The pool only pays off with spare cores; on one core max_workers=None already runs in-process
+    for workers in sorted({1, os.cpu_count() or 1}):
+        started = time.perf_counter()
+        ledger, equity, summary = simulate_portfolio(spot, perp, fund, fees, capital=100_000, max_open=16,
+                                                     max_workers=workers)
+        elapsed = time.perf_counter() - started
+        print(f"{n_assets} assets x {n_times:,} rows, max_workers={workers}: {elapsed:.2f}s, "
+              f"{summary['trades'].sum():,} trades taken, {summary['skipped'].sum():,} skipped")
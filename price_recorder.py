@@ -0,0 +1,251 @@
+"""
+Live price recorder fed by the Hyperliquid websocket.
+
+Subscribes to the active asset context of a symbol's perp and spot pair (mark, oracle and mid
+prices, funding rate and premium) and records every update as one row holding the latest value
+of each field. Rows go into a fixed-size ring buffer that is flushed to a SegmentStore every few
+seconds, so memory stays bounded however long the recorder runs and a crash loses at most one
+flush interval. Dropped connections are re-opened with exponential backoff and the
+subscriptions sent again.
+
+Usage:
+    python price_recorder.py            # record HYPE until interrupted
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+import numpy as np
+import pandas as pd
+from hyperliquid.utils import constants
+
+from async_fetch import backoff_delay
+from segments import SegmentStore
+from symbols import symbol_cache
+
+# Recorded columns, in buffer order
+FIELDS = ("perp_mark", "perp_oracle", "perp_mid", "spot_mark", "spot_mid", "funding_rate", "premium")
+
+# activeAssetCtx ctx key -> recorded column, per channel
+PERP_FIELDS = {"markPx": "perp_mark", "oraclePx": "perp_oracle", "midPx": "perp_mid", "funding": "funding_rate",
+               "premium": "premium"}
+SPOT_FIELDS = {"markPx": "spot_mark", "midPx": "spot_mid"}
+
+LIVE_STORE = "hype_prices_live.segments"
+
+DEFAULT_FLUSH_SECONDS = 10
+DEFAULT_CAPACITY = 1 << 16  # rows held between flushes
+
+# Hyperliquid closes connections that have sent nothing for a minute
+PING_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+
+def websocket_url(base_url: str) -> str:
+    """
+    Websocket endpoint of an API root (https://api.hyperliquid.xyz -> wss://api.hyperliquid.xyz/ws).
+    """
+    return "ws" + base_url[len("http"):] + "/ws"
+
+
+class TickBuffer:
+    """
+    Preallocated ring buffer of (epoch ns, row of FIELDS) ticks.
+
+    When full, the oldest tick is overwritten and counted in `dropped`.
+
+    Args:
+        capacity: Number of ticks held
+        width: Values per tick
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, width: int = len(FIELDS)):
+        self.capacity = capacity
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty((capacity, width), dtype=np.float64)
+        self.start = 0
+        self.size = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, t_ns: int, row: np.ndarray):
+        end = (self.start + self.size) % self.capacity
+        self.times[end] = t_ns
+        self.values[end] = row
+        if self.size == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+            self.dropped += 1
+        else:
+            self.size += 1
+
+    def drain(self, columns=FIELDS) -> pd.DataFrame:
+        """
+        Remove all buffered ticks and return them as a frame indexed by UTC timestamp.
+        """
+        order = (self.start + np.arange(self.size)) % self.capacity
+        df = pd.DataFrame(self.values[order], columns=list(columns),
+                          index=pd.DatetimeIndex(pd.to_datetime(self.times[order], utc=True), name="timestamp"))
+        self.start = (self.start + self.size) % self.capacity
+        self.size = 0
+        return df
+
+
+class PriceRecorder:
+    """
+    Records a symbol's perp and spot prices from the websocket into a segment store.
+
+    Args:
+        symbol: Symbol name, resolved to the perp and spot coins through the symbol cache
+        store: Segment store the ticks are appended to (LIVE_STORE if None)
+        base_url: API root, used for symbol resolution and, unless ws_url is given, the websocket
+        ws_url: Websocket endpoint, derived from base_url if None
+        flush_seconds: Seconds between flushes of the ring buffer to the store
+        capacity: Ring buffer size in ticks
+        base_delay, max_delay: Reconnect backoff bounds in seconds
+    """
+
+    def __init__(
+        self,
+        symbol: str = "HYPE",
+        store: Optional[SegmentStore] = None,
+        base_url: str = constants.MAINNET_API_URL,
+        ws_url: Optional[str] = None,
+        flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+        capacity: int = DEFAULT_CAPACITY,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ):
+        self.symbol = symbol
+        self.store = store if store is not None else SegmentStore(LIVE_STORE)
+        self.base_url = base_url
+        self.ws_url = ws_url or websocket_url(base_url)
+        self.flush_seconds = flush_seconds
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.buffer = TickBuffer(capacity)
+        self.latest = np.full(len(FIELDS), np.nan)
+        self.columns = {name: i for i, name in enumerate(FIELDS)}
+        self.perp_coin: Optional[str] = None
+        self.spot_coin: Optional[str] = None
+        self.ticks = 0
+        self.rows_written = 0
+        self.connections = 0
+
+    def subscriptions(self) -> List[Dict]:
+        return [{"type": "activeAssetCtx", "coin": self.perp_coin}, {"type": "activeAssetCtx", "coin": self.spot_coin}]
+
+    def on_message(self, message: Dict) -> bool:
+        """
+        Apply one websocket message to the latest values and buffer a tick.
+
+        Returns:
+            True if the message was a price update for the recorded coins
+        """
+        channel, data = message.get("channel"), message.get("data")
+        if channel == "activeAssetCtx" and data["coin"] == self.perp_coin:
+            fields = PERP_FIELDS
+        elif channel == "activeSpotAssetCtx" and data["coin"] == self.spot_coin:
+            fields = SPOT_FIELDS
+        else:
+            return False
+        ctx = data["ctx"]
+        for key, name in fields.items():
+            if ctx.get(key) is not None:
+                self.latest[self.columns[name]] = float(ctx[key])
+        self.buffer.append(time.time_ns(), self.latest)
+        self.ticks += 1
+        return True
+
+    async def flush(self) -> int:
+        """
+        Append the buffered ticks to the store as one segment.
+        """
+        if self.buffer.dropped:
+            logger.warning("Ring buffer overflowed, %d ticks dropped", self.buffer.dropped)
+            self.buffer.dropped = 0
+        df = self.buffer.drain()
+        if df.empty:
+            return 0
+        rows = await asyncio.to_thread(self.store.append, df)
+        self.rows_written += rows
+        return rows
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    @staticmethod
+    async def _ping(ws: aiohttp.ClientWebSocketResponse):
+        while True:
+            await asyncio.sleep(PING_SECONDS)
+            await ws.send_json({"method": "ping"})
+
+    async def _listen(self, session: aiohttp.ClientSession) -> int:
+        # One connection: subscribe, then apply messages until it closes. Returns the updates received.
+        received = 0
+        async with session.ws_connect(self.ws_url) as ws:
+            self.connections += 1
+            for subscription in self.subscriptions():
+                await ws.send_json({"method": "subscribe", "subscription": subscription})
+            pinger = asyncio.ensure_future(self._ping(ws))
+            try:
+                async for message in ws:
+                    if message.type == aiohttp.WSMsgType.TEXT:
+                        received += self.on_message(json.loads(message.data))
+                    elif message.type == aiohttp.WSMsgType.ERROR:
+                        break
+            finally:
+                pinger.cancel()
+        return received
+
+    async def _listen_forever(self, session: aiohttp.ClientSession):
+        attempt = 0
+        while True:
+            try:
+                received = await self._listen(session)
+                logger.warning("Websocket closed after %d updates, reconnecting", received)
+                attempt = 0 if received else attempt + 1
+            except (aiohttp.ClientError, OSError, asyncio.TimeoutError) as e:
+                logger.warning("Websocket error: %s, reconnecting", e)
+                attempt += 1
+            await asyncio.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+
+    async def run(self, duration: Optional[float] = None) -> int:
+        """
+        Record until duration seconds have passed (forever if None), flushing as it goes.
+
+        Returns:
+            Number of rows written to the store
+        """
+        cache = symbol_cache(self.base_url)
+        self.perp_coin = cache.perp(self.symbol)["coin"]
+        self.spot_coin = cache.spot(self.symbol)["coin"]
+        logger.info("Recording %s (perp %s, spot %s) from %s", self.symbol, self.perp_coin, self.spot_coin, self.ws_url)
+
+        flusher = asyncio.ensure_future(self._flush_periodically())
+        try:
+            async with aiohttp.ClientSession() as session:
+                await asyncio.wait_for(self._listen_forever(session), duration)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            flusher.cancel()
+            await self.flush()
+        return self.rows_written
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    recorder = PriceRecorder()
+    try:
+        asyncio.run(recorder.run())
+    except KeyboardInterrupt:
+        pass
+    print(f"Recorded {recorder.ticks} ticks into {recorder.store.root}")
@@ -0,0 +1,470 @@
+"""
+Shared core of the strategy reports (generate_report.py, generate_report2.py).
+
+A report is built in three steps, and each step is skipped when its inputs have not changed:
+
+1. build_report_data pairs the ledger's entries and exits, runs the closed trades through a
+   MetricsAccumulator and builds the daily equity and drawdown curves. Given the simulation's
+   mark-to-market equity (engine.simulate's equity column), the daily curves are that equity
+   resampled to daily closes, so open trades count; otherwise they step at the exits. The
+   backtest length comes from the timestamps rather than from a row count. Confidence
+   intervals of the APY, max drawdown, Sharpe ratio and VaR come from bootstrap.py, which
+   resamples the daily returns and the trades. The result is pickled in REPORT_CACHE_DIR under
+   a hash of the ledger and the report parameters, so rerunning a report, or reporting the
+   same ledger again, loads it instead.
+2. render_charts draws the equity curve and drawdown PNGs through a charts.ChartQueue (process
+   pool, Agg backend, downsampled series). Each chart's input hash is recorded in the cache
+   directory, and a chart whose input is unchanged and whose file still exists is not drawn
+   again.
+3. write_report formats the markdown sections from the metrics and rewrites the file only when
+   the text changed.
+
+The report scripts only supply their ledger, file names and the sections whose wording differs.
+"""
+import hashlib
+import os
+import pickle
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from accumulators import MetricsAccumulator
+from bootstrap import Interval, bootstrap_daily_returns, bootstrap_trades, confidence_intervals, default_block
+from charts import CHART_HASHES, ChartQueue, plot_drawdown, plot_equity_curve
+from engine import resample_equity, span_days
+
+REPORT_CACHE_DIR = "report_cache"
+
+INITIAL_CAPITAL = 100_000.0
+TRADE_FRACTION = 20/23
+
+# Ledgers written before the engine kept timestamps hold row numbers, taken as hours from this origin
+TIME_ORIGIN = "2024-01-01"
+
+ONE_DAY = pd.Timedelta(days=1)
+
+# Monte-Carlo confidence intervals: paths per resampling, generator seed (so reruns give the same report) and level
+BOOTSTRAP_PATHS = 10_000
+BOOTSTRAP_SEED = 0
+BOOTSTRAP_LEVEL = 0.90
+BOOTSTRAP_METRICS = ("apy", "max_drawdown", "sharpe_ratio")
+
+# Placeholders reported as is
+LEVERAGE_USED = 1.0
+SLIPPAGE_IMPACT = 0.0001
+MARKET_IMPACT = 0.0
+
+# Markdown sections, in report order, joined by blank lines
+REPORT_LAYOUT = (
+    "title", "introduction", "strategy_overview", "market_context", "financial_metrics", "return_metrics",
+    "risk_metrics", "robustness", "trade_performance", "capital_efficiency", "fee_impact", "trade_statistics", "liquidity",
+    "visualizations", "risk_factors", "conclusion",
+)
+
+# Sections shared by every report; the introduction, strategy_overview and market_context come from the script
+SECTIONS = {
+    "title": """
+# Delta-Neutral Funding Rate Arbitrage Strategy Report
+""",
+    "financial_metrics": """## Financial Metrics
+Below are the key financial metrics from the backtest, starting with an initial capital of ${initial_capital:,.2f} over a period of {days_in_backtest:.1f} days:
+""",
+    "return_metrics": """### Return Metrics
+| Metric                              | Value       |
+|-------------------------------------|-------------|
+| Total Return (%)                    | {total_return_after_fees:.2%} |
+| APY After Fees (%)                  | {apy_after_fees:.2%} |
+| APY Before Fees (%)                 | {apy_before_fees:.2%} |
+""",
+    "risk_metrics": """### Risk Metrics
+| Metric           | Value       |
+|------------------|-------------|
+| Sharpe Ratio     | {sharpe_ratio:.2f} |
+| Maximum Drawdown (%) | {max_drawdown:.2%} |
+| Volatility (%)   | {volatility:.2%} |
+| Value at Risk (95%) (%) | {value_at_risk_95:.2%} |
+""",
+    "robustness": """### Bootstrap Confidence Intervals
+{bootstrap_paths:,} resampled paths of the daily returns (in blocks of {bootstrap_block} days) and of the closed trades (drawn with replacement), {bootstrap_level:.0%} intervals:
+
+| Metric | Resampled | Low | Median | High |
+|--------|-----------|-----|--------|------|
+| APY After Fees (%) | Daily returns | {daily_apy_low:.2%} | {daily_apy_median:.2%} | {daily_apy_high:.2%} |
+| APY After Fees (%) | Trades | {trade_apy_low:.2%} | {trade_apy_median:.2%} | {trade_apy_high:.2%} |
+| Maximum Drawdown (%) | Daily returns | {daily_max_drawdown_low:.2%} | {daily_max_drawdown_median:.2%} | {daily_max_drawdown_high:.2%} |
+| Maximum Drawdown (%) | Trades | {trade_max_drawdown_low:.2%} | {trade_max_drawdown_median:.2%} | {trade_max_drawdown_high:.2%} |
+| Sharpe Ratio | Daily returns | {daily_sharpe_ratio_low:.2f} | {daily_sharpe_ratio_median:.2f} | {daily_sharpe_ratio_high:.2f} |
+| Sharpe Ratio | Trades | {trade_sharpe_ratio_low:.2f} | {trade_sharpe_ratio_median:.2f} | {trade_sharpe_ratio_high:.2f} |
+| Value at Risk (95%) (%) | Daily returns | {value_at_risk_95_low:.2%} | {value_at_risk_95:.2%} | {value_at_risk_95_high:.2%} |
+""",
+    "trade_performance": """### Trade Performance Metrics
+| Metric                 | Value       |
+|------------------------|-------------|
+| Profit Factor          | {profit_factor:.2f} |
+| Average Profit per Trade | ${avg_profit:,.2f} |
+| Average Loss per Trade | ${avg_loss:,.2f} |
+| Expectancy             | ${expectancy:,.2f} |
+""",
+    "capital_efficiency": """### Capital Efficiency Metrics
+| Metric                 | Value       |
+|------------------------|-------------|
+| Capital Utilization (%)| {capital_utilization:.2%} |
+| Turnover Ratio         | {turnover_ratio:.2f} |
+| Leverage Used          | {leverage_used:.2f} |
+""",
+    "fee_impact": """### Fee Impact Metrics
+| Metric                 | Value       |
+|------------------------|-------------|
+| Impact of Trading Fees (%) | {impact_of_fees:.2%} |
+| Break-Even Fee Rate (%)| {break_even_fee_rate:.4%} |
+""",
+    "trade_statistics": """### Trade Statistics
+| Metric                 | Value       |
+|------------------------|-------------|
+| Number of Trades       | {num_trades} |
+| Average Trade Duration (hours) | {avg_trade_duration:.2f} |
+| Maximum Trade Duration (hours) | {max_trade_duration} |
+""",
+    "liquidity": """### Liquidity and Execution Metrics
+| Metric                 | Value       |
+|------------------------|-------------|
+| Slippage Impact (%)    | {slippage_impact:.2%} |
+| Market Impact (%)      | {market_impact:.2%} |
+""",
+    "visualizations": """## Performance Visualizations
+- **Equity Curve**: Tracks capital growth over the backtest period.  
+  ![Equity Curve]({equity_curve_png})
+- **Drawdown Profile**: Highlights the strategy's risk profile over time.  
+  ![Drawdown Profile]({drawdown_png})
+""",
+    "risk_factors": """## Risk Factors and Mitigations
+Even with its low-risk design, potential challenges include:
+- **Exchange Risk**: Counterparty failure is mitigated by spreading capital across reputable platforms.
+- **Liquidity**: Trade sizes are calibrated to market depth, avoiding slippage.
+- **Funding Rate Shifts**: Real-time monitoring ensures swift adaptation to changing conditions.
+""",
+    "conclusion": """## Conclusion
+The delta-neutral funding rate arbitrage strategy transforms crypto market volatility into a source of consistent, low-risk returns. With an annualized return of **{apy_after_fees:.2%}** and a Sharpe ratio of **{sharpe_ratio:.2f}**, it's a proven performer ready for investment. We invite you to connect with us to explore scaling this opportunity further.
+
+**Disclaimer**: This report is for informational purposes only and does not constitute investment advice. Past performance does not guarantee future results. Investors should perform their own due diligence.
+""",
+}
+
+
+class ReportData(NamedTuple):
+    """
+    Everything a report is drawn and written from.
+    """
+    trades: pd.DataFrame  # One row per closed trade
+    daily_capital: pd.Series
+    daily_drawdown: pd.Series
+    metrics: Dict[str, float]
+    initial_capital: float
+    days_in_backtest: float
+
+
+def ledger_hash(trades_df_raw: pd.DataFrame, **params) -> str:
+    """
+    Content hash of a trade ledger and the report parameters, used as the cache key.
+    """
+    h = hashlib.sha256(pd.util.hash_pandas_object(trades_df_raw, index=False).to_numpy().tobytes())
+    h.update(repr((list(trades_df_raw.columns), sorted(params.items()))).encode())
+    return h.hexdigest()[:16]
+
+
+def _series_digest(series: pd.Series) -> str:
+    return hashlib.sha256(pd.util.hash_pandas_object(series).to_numpy().tobytes()).hexdigest()[:16]
+
+
+def trade_times(times: pd.Series) -> pd.Series:
+    """
+    Ledger times as datetimes: timestamps are parsed, and the row numbers of older ledgers are
+    read as hours from TIME_ORIGIN.
+    """
+    if pd.api.types.is_numeric_dtype(times):
+        return pd.to_datetime(times, unit='h', origin=TIME_ORIGIN)
+    return pd.to_datetime(times)
+
+
+def day_number(times) -> np.ndarray:
+    """
+    Days since the Unix epoch of datetimes, the day numbers of MetricsAccumulator.
+    """
+    return np.asarray((pd.DatetimeIndex(times) - pd.Timestamp(0)) // ONE_DAY, dtype=np.int64)
+
+
+def pair_trades(trades_df_raw: pd.DataFrame, initial_capital: float = INITIAL_CAPITAL,
+                a: float = TRADE_FRACTION) -> pd.DataFrame:
+    """
+    One row per closed trade from the entry and exit rows of a ledger (a trailing open entry is dropped).
+
+    Entry and exit times become datetimes (see trade_times). Adds the duration in hours and the trade capital, a share `a` of the capital before the trade.
+    """
+    entries = trades_df_raw[trades_df_raw['type'] == 'entry'].reset_index(drop=True)
+    exits = trades_df_raw[trades_df_raw['type'] == 'exit'].reset_index(drop=True)
+    entries = entries.iloc[:len(exits)]
+
+    trades_df = pd.DataFrame({
+        'entry_time': entries['time'],
+        'exit_time': exits['time'],
+        'entry_spot': entries['spot_price'],
+        'exit_spot': exits['spot_price'],
+        'entry_perp': entries['perp_price'],
+        'exit_perp': exits['perp_price'],
+        'exit_reason': exits['reason'],
+        'trade_yield_before_fees': exits['trade_pnl_before_fees'],
+        'trade_yield_after_fees': exits['trade_pnl_after_fees'],
+        'fees': exits['fees'],
+        'running_trade_capital': exits['current_capital'],
+        'cumulative_pnl_after_fees': exits['cumulative_pnl_after_fees'],
+    })
+    trades_df['entry_time'] = trade_times(trades_df['entry_time'])
+    trades_df['exit_time'] = trade_times(trades_df['exit_time'])
+    trades_df['duration'] = (trades_df['exit_time'] - trades_df['entry_time']) / pd.Timedelta(hours=1)
+    previous_capital = np.concatenate(([initial_capital], trades_df['running_trade_capital'].to_numpy()))[:len(trades_df)]
+    trades_df['trade_capital'] = a * previous_capital
+    return trades_df
+
+
+def bootstrap_metrics(daily_capital: pd.Series, trades_df: pd.DataFrame, days_in_backtest: float,
+                      initial_capital: float = INITIAL_CAPITAL, n_paths: int = BOOTSTRAP_PATHS,
+                      seed: Optional[int] = BOOTSTRAP_SEED, level: float = BOOTSTRAP_LEVEL) -> Dict[str, float]:
+    """
+    Bootstrap confidence intervals of the APY, max drawdown and Sharpe ratio, from the daily closes
+    (block bootstrap) and from the closed trades (with replacement), flattened into report fields
+    such as daily_apy_low or trade_sharpe_ratio_high.
+
+    value_at_risk_95 is the median over the daily paths of their 5% daily return quantile, with
+    its interval as value_at_risk_95_low/high. Metrics of a resampling with fewer than two
+    returns are 0.
+    """
+    daily_returns = daily_capital.pct_change().dropna().to_numpy()
+    running = trades_df['running_trade_capital'].to_numpy()
+    trade_returns = trades_df['trade_yield_after_fees'].to_numpy() / np.concatenate(([initial_capital], running[:-1]))
+
+    empty = Interval(0, 0, 0)
+    daily = trade = {}
+    if len(daily_returns) > 1:
+        daily = confidence_intervals(bootstrap_daily_returns(daily_returns, n_paths, seed=seed), level)
+    if len(trade_returns) > 1 and days_in_backtest > 0:
+        trade = confidence_intervals(bootstrap_trades(trade_returns, days_in_backtest, n_paths, seed=seed), level)
+
+    values = {"bootstrap_paths": n_paths, "bootstrap_level": level,
+              "bootstrap_block": default_block(len(daily_returns)) if len(daily_returns) else 0}
+    for source, intervals in (("daily", daily), ("trade", trade)):
+        for metric in BOOTSTRAP_METRICS:
+            for bound, value in zip(Interval._fields, intervals.get(metric, empty)):
+                values[f"{source}_{metric}_{bound}"] = value
+    var = daily.get("value_at_risk_95", empty)
+    values.update(value_at_risk_95=var.median, value_at_risk_95_low=var.low, value_at_risk_95_high=var.high)
+    return values
+
+
+def _compute_report_data(trades_df_raw: pd.DataFrame, days_in_backtest: float, initial_capital: float,
+                         a: float, equity: Optional[pd.Series]) -> ReportData:
+    trades_df = pair_trades(trades_df_raw, initial_capital, a)
+
+    if equity is not None:
+        # Daily closes of the mark-to-market equity; trades only feed the trade metrics
+        daily = resample_equity(equity, "D")
+        metrics = MetricsAccumulator(initial_capital, record_daily=True)
+        for day, close in zip(day_number(daily.index).tolist(), daily.tolist()):
+            metrics.mark(day, close)
+        exit_days = [None] * len(trades_df)
+    else:
+        # Daily closes of the realised capital, starting an hour before the first entry
+        start_day = None
+        if not trades_df.empty:
+            start_day = int(day_number([trades_df['entry_time'].min() - pd.Timedelta(hours=1)])[0])
+        metrics = MetricsAccumulator(initial_capital, start_day=start_day, record_daily=True)
+        exit_days = day_number(trades_df['exit_time']).tolist()
+
+    for exit_day, before, after, fees, trade_capital, capital, duration in zip(
+        exit_days, trades_df['trade_yield_before_fees'].tolist(),
+        trades_df['trade_yield_after_fees'].tolist(), trades_df['fees'].tolist(),
+        trades_df['trade_capital'].tolist(), trades_df['running_trade_capital'].tolist(),
+        trades_df['duration'].tolist(),
+    ):
+        metrics.add_trade(before, after, fees, trade_capital, capital, duration=duration, day=exit_day)
+
+    daily_closes = metrics.daily_capital()
+    if daily_closes and (equity is not None or not trades_df.empty):
+        days, closes = zip(*daily_closes)
+        daily_capital = pd.Series(closes, index=pd.to_datetime(np.array(days) * ONE_DAY.value, unit='ns'))
+        rolling_max = daily_capital.cummax()
+        daily_drawdown = (daily_capital - rolling_max) / rolling_max
+    else:
+        daily_capital = pd.Series([initial_capital], index=[pd.to_datetime(TIME_ORIGIN)])
+        daily_drawdown = pd.Series([0], index=[pd.to_datetime(TIME_ORIGIN)])
+
+    summary = metrics.summary(days_in_backtest)
+    summary.update(bootstrap_metrics(daily_capital, trades_df, days_in_backtest, initial_capital))
+    return ReportData(trades_df, daily_capital, daily_drawdown, summary, initial_capital, days_in_backtest)
+
+
+def build_report_data(
+    trades_df_raw: pd.DataFrame,
+    days_in_backtest: Optional[float] = None,
+    initial_capital: float = INITIAL_CAPITAL,
+    a: float = TRADE_FRACTION,
+    cache_dir: Optional[str] = REPORT_CACHE_DIR,
+    equity: Optional[pd.Series] = None,
+) -> ReportData:
+    """
+    Paired trades, daily equity and metrics of a ledger, loaded from the cache when already computed.
+
+    Args:
+        trades_df_raw: Trade ledger with entry and exit rows, as written to trades.csv
+        days_in_backtest: Length of the backtest in days, the APY compounding period; the span of
+            `equity` if None
+        initial_capital: Capital before the first trade
+        a: Fraction of capital allocated to each trade
+        cache_dir: Directory of the pickled results, or None to always compute
+        equity: Mark-to-market equity of the backtest at any bar size, indexed by time (simulate()'s
+            equity column). The risk metrics and charts use its daily closes when given, and the
+            capital after each exit otherwise.
+    """
+    if days_in_backtest is None:
+        if equity is None:
+            raise ValueError("days_in_backtest is needed when no equity curve is given")
+        days_in_backtest = span_days(equity.index)
+    if cache_dir is None:
+        return _compute_report_data(trades_df_raw, days_in_backtest, initial_capital, a, equity)
+
+    key = ledger_hash(trades_df_raw, days_in_backtest=days_in_backtest, initial_capital=initial_capital, a=a,
+                      equity=_series_digest(equity) if equity is not None else None,
+                      bootstrap=(BOOTSTRAP_PATHS, BOOTSTRAP_SEED, BOOTSTRAP_LEVEL))
+    path = os.path.join(cache_dir, f"{key}.pkl")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return ReportData(*pickle.load(f))
+    data = _compute_report_data(trades_df_raw, days_in_backtest, initial_capital, a, equity)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(tuple(data), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return data
+
+
+# Chart name -> (ReportData field plotted, plot function)
+CHARTS = {
+    "equity_curve": ("daily_capital", plot_equity_curve),
+    "drawdown": ("daily_drawdown", plot_drawdown),
+}
+
+
+def queue_charts(data: ReportData, paths: Dict[str, str], queue: ChartQueue):
+    """
+    Add the report's charts to a chart queue.
+
+    Args:
+        data: Report data
+        paths: Chart name (a CHARTS key) -> output PNG
+        queue: Queue the charts are added to
+    """
+    for name, path in paths.items():
+        field, plot = CHARTS[name]
+        queue.add(path, plot, **{field: getattr(data, field)})
+
+
+def render_charts(data: ReportData, paths: Dict[str, str], cache_dir: Optional[str] = REPORT_CACHE_DIR,
+                  max_workers: Optional[int] = None) -> List[str]:
+    """
+    Draw the report's charts on a process pool, skipping those whose input series is unchanged
+    since the file was drawn.
+
+    Args:
+        data: Report data
+        paths: Chart name (a CHARTS key) -> output PNG
+        cache_dir: Directory of the chart hash record, or None to always draw
+        max_workers: Rendering processes, see ChartQueue
+
+    Returns:
+        The paths that were drawn
+    """
+    queue = ChartQueue(os.path.join(cache_dir, CHART_HASHES) if cache_dir is not None else None, max_workers)
+    queue_charts(data, paths, queue)
+    return queue.render()
+
+
+def report_values(data: ReportData, **extra) -> Dict:
+    """
+    The fields the report sections are formatted with: the metrics, the run parameters and `extra`.
+    """
+    return {
+        **data.metrics,
+        "initial_capital": data.initial_capital,
+        "days_in_backtest": data.days_in_backtest,
+        "leverage_used": LEVERAGE_USED,
+        "slippage_impact": SLIPPAGE_IMPACT,
+        "market_impact": MARKET_IMPACT,
+        **extra,
+    }
+
+
+def render_report(sections: Dict[str, str], values: Dict) -> str:
+    """
+    Format the REPORT_LAYOUT sections, taking each from `sections` if given there and from SECTIONS otherwise.
+    """
+    return "\n".join(sections.get(name, SECTIONS.get(name)).format(**values) for name in REPORT_LAYOUT)
+
+
+def write_report(text: str, path: str) -> bool:
+    """
+    Write the markdown unless the file already holds exactly this text.
+
+    Returns:
+        True if the file was written
+    """
+    try:
+        with open(path) as f:
+            if f.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, "w") as f:
+        f.write(text)
+    return True
+
+
+def generate(
+    trades_df_raw: pd.DataFrame,
+    sections: Dict[str, str],
+    report_file: str,
+    chart_files: Dict[str, str],
+    days_in_backtest: Optional[float] = None,
+    initial_capital: float = INITIAL_CAPITAL,
+    a: float = TRADE_FRACTION,
+    cache_dir: Optional[str] = REPORT_CACHE_DIR,
+    queue: Optional[ChartQueue] = None,
+    equity: Optional[pd.Series] = None,
+) -> ReportData:
+    """
+    Build one report: cached data, changed charts only, and the markdown.
+
+    Args:
+        trades_df_raw: Trade ledger with entry and exit rows
+        sections: Section name -> markdown template for the sections that are not in SECTIONS, or that replace them
+        report_file: Markdown output
+        chart_files: Chart name (a CHARTS key) -> output PNG, also linked from the report
+        days_in_backtest: Length of the backtest in days, the span of `equity` if None
+        initial_capital: Capital before the first trade
+        a: Fraction of capital allocated to each trade
+        cache_dir: Cache directory, or None to recompute and redraw everything
+        queue: Chart queue to add the charts to instead of rendering them here, so that the charts
+            of many reports are rendered in one pool
+        equity: Mark-to-market equity indexed by time, see build_report_data
+
+    Returns:
+        The report data
+    """
+    data = build_report_data(trades_df_raw, days_in_backtest, initial_capital, a, cache_dir, equity)
+    if queue is None:
+        render_charts(data, chart_files, cache_dir)
+    else:
+        queue_charts(data, chart_files, queue)
+    values = report_values(data, **{f"{name}_png": path for name, path in chart_files.items()})
+    write_report(render_report(sections, values), report_file)
+    return data
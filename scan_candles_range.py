@@ -1,10 +1,13 @@
+import asyncio
 import datetime
 import logging
 from typing import List
 
-from hyperliquid.info import Info
 from hyperliquid.utils import constants
 
+from async_fetch import AsyncInfoClient
+from availability import coverage_file, load_coverage, save_coverage, scan_coverage
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
@@ -14,53 +17,50 @@ logging.basicConfig(
 NAME_VARIANTS: List[str] = ["HYPE/USDC", "@107"]
 INTERVAL = "1m"
 WINDOW_HOURS = 24  # length of each sub-range to query
+MAX_CONCURRENCY = 8  # windows probed at once
 
 START_DT = datetime.datetime(2025, 1, 1, 0, 0, 0, tzinfo=datetime.timezone.utc)
 END_DT = datetime.datetime(2025, 6, 19, 23, 59, 59, tzinfo=datetime.timezone.utc)
 
-info = Info(constants.MAINNET_API_URL, skip_ws=True)
+# Coverage map consumed by fetch.py and build_dataset.py; it also remembers the resolved variant
+OUTPUT_FILE = coverage_file(NAME_VARIANTS[0], INTERVAL)
 
-logging.info(
-    "Scanning candle availability from %s to %s UTC in %d-hour windows",
-    START_DT.isoformat(),
-    END_DT.isoformat(),
-    WINDOW_HOURS,
-)
 
-window_delta = datetime.timedelta(hours=WINDOW_HOURS)
-current_start = START_DT
+async def scan(base_url: str = constants.MAINNET_API_URL, output_file: str = OUTPUT_FILE):
+    previous = load_coverage(output_file)
+    remembered = previous["symbol"] if previous else None
+    async with AsyncInfoClient(base_url, max_concurrency=MAX_CONCURRENCY) as client:
+        return await scan_coverage(
+            client,
+            NAME_VARIANTS,
+            INTERVAL,
+            int(START_DT.timestamp() * 1000),
+            int(END_DT.timestamp() * 1000),
+            window_ms=WINDOW_HOURS * 60 * 60 * 1000,
+            remembered=remembered,
+        )
 
-while current_start < END_DT:
-    current_end = min(current_start + window_delta, END_DT)
-    start_ms = int(current_start.timestamp() * 1000)
-    end_ms = int(current_end.timestamp() * 1000)
-    window_str = f"{current_start.isoformat()} → {current_end.isoformat()}"
 
-    found_any = False
-    for variant in NAME_VARIANTS:
-        try:
-            candles = info.candles_snapshot(variant, INTERVAL, start_ms, end_ms)
-        except Exception as e:
-            logging.error("Error querying %s for window %s: %s", variant, window_str, e)
-            continue
-        count = len(candles) if candles else 0
-        if count > 0:
-            first_ts = datetime.datetime.fromtimestamp(candles[0]["t"] / 1000, datetime.timezone.utc)
-            last_ts = datetime.datetime.fromtimestamp(candles[-1]["T"] / 1000, datetime.timezone.utc)
-            logging.info(
-                "✅ %s — %d candles found for %s (first %s, last %s)",
-                window_str,
-                count,
-                variant,
-                first_ts.isoformat(),
-                last_ts.isoformat(),
-            )
-            found_any = True
-            # Break after first successful variant to avoid duplicate work
-            break
-    if not found_any:
-        logging.info("❌ %s — no candles for any variant", window_str)
+if __name__ == "__main__":
+    logging.info(
+        "Scanning candle availability from %s to %s UTC in %d-hour windows",
+        START_DT.isoformat(),
+        END_DT.isoformat(),
+        WINDOW_HOURS,
+    )
 
-    current_start = current_end
+    coverage = asyncio.run(scan())
+    save_coverage(OUTPUT_FILE, coverage)
 
-logging.info("Scan complete.") 
\ No newline at end of file
+    if coverage["symbol"] is None:
+        logging.info("❌ No candles for any variant")
+    else:
+        logging.info("Resolved symbol variant: %s", coverage["symbol"])
+        for start_ms, end_ms in coverage["intervals"]:
+            logging.info(
+                "✅ %s → %s",
+                datetime.datetime.fromtimestamp(start_ms / 1000, datetime.timezone.utc).isoformat(),
+                datetime.datetime.fromtimestamp(end_ms / 1000, datetime.timezone.utc).isoformat(),
+            )
+        logging.info("%d of %d windows have candles", coverage["bitmap"].count("1"), len(coverage["bitmap"]))
+    logging.info("Scan complete. Coverage map written to %s", OUTPUT_FILE)
@@ -0,0 +1,247 @@
+"""
+Append-only segment storage for incrementally fetched time series.
+
+Each append writes the chunk as its own sorted segment file and adds one line to an index of
+segment time ranges, so the cost of an append does not depend on how much has been stored.
+Duplicates across segments are resolved on read (later segments win), and segments are merged
+into one by compact(), which runs in a background thread once enough segments pile up.
+
+Layout of a store directory:
+    index.jsonl           one {"file", "seq", "start", "end", "rows"} record per live segment
+    seg-00000001.parquet  one file per appended chunk (CSV when pyarrow is not installed)
+"""
+import json
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa  # pandas' Parquet engine
+    import pyarrow.dataset as pa_dataset
+    import pyarrow.parquet as pq
+    SEGMENT_FORMAT = "parquet"
+except ImportError:
+    SEGMENT_FORMAT = "csv"
+
+INDEX_FILE = "index.jsonl"
+
+# Rows per Parquet row group. A range read decodes only the row groups whose time statistics
+# overlap the range, so a large compacted segment is not read whole for a short window
+ROW_GROUP_ROWS = 50_000
+
+# Nanoseconds per unit of an Arrow timestamp
+_UNIT_NS = {"s": 1_000_000_000, "ms": 1_000_000, "us": 1_000, "ns": 1}
+
+# Number of live segments that triggers a background compaction
+DEFAULT_COMPACT_THRESHOLD = 64
+
+
+def _ns(value) -> int:
+    # Epoch nanoseconds; naive values are taken as UTC
+    return int(pd.Timestamp(value).value)
+
+
+class SegmentStore:
+    """
+    Directory of append-only, time-indexed segments.
+
+    Args:
+        root: Store directory, created if missing
+        compact_threshold: Live segment count at which append() starts a background compaction,
+            None to only compact when compact() is called
+    """
+
+    def __init__(self, root: str, compact_threshold: Optional[int] = DEFAULT_COMPACT_THRESHOLD):
+        self.root = root
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+        os.makedirs(root, exist_ok=True)
+        self._segments = self._read_index()
+        self._next_seq = max((segment["seq"] for segment in self._segments), default=0) + 1
+
+    @classmethod
+    def for_csv(cls, output_file: str, **kwargs) -> "SegmentStore":
+        """
+        Segment store next to a legacy CSV output file ("x.csv" -> "x.segments/").
+
+        An existing CSV is imported as the first segment when the store is created.
+        """
+        store = cls(os.path.splitext(output_file)[0] + ".segments", **kwargs)
+        if not store._segments and os.path.exists(output_file):
+            store.append(pd.read_csv(output_file, index_col=0, parse_dates=True))
+        return store
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _read_index(self) -> List[Dict]:
+        path = self._path(INDEX_FILE)
+        if not os.path.exists(path):
+            return []
+        segments = []
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    segments.append(json.loads(line))
+        # A crash between writing a segment and indexing it leaves an unindexed file, never a dangling entry
+        return [segment for segment in segments if os.path.exists(self._path(segment["file"]))]
+
+    def _write_segment(self, df: pd.DataFrame, seq: int, name: str) -> Dict:
+        path = self._path(name)
+        if SEGMENT_FORMAT == "parquet":
+            df.to_parquet(path, compression="zstd", row_group_size=ROW_GROUP_ROWS)
+        else:
+            df.to_csv(path)
+        return {"file": name, "seq": seq, "start": _ns(df.index[0]), "end": _ns(df.index[-1]), "rows": len(df)}
+
+    def _read_segment(self, segment: Dict, start_ns: Optional[int] = None, end_ns: Optional[int] = None) -> pd.DataFrame:
+        path = self._path(segment["file"])
+        if not path.endswith(".parquet"):
+            return pd.read_csv(path, index_col=0, parse_dates=True)
+        if (start_ns is None or start_ns <= segment["start"]) and (end_ns is None or end_ns >= segment["end"]):
+            return pd.read_parquet(path)
+
+        # Push the range down to the time index column, so only overlapping row groups are decoded
+        index_name = pq.read_schema(path).pandas_metadata["index_columns"][0]
+        dataset = pa_dataset.dataset(path, format="parquet")
+        column = pa_dataset.field(index_name)
+        time_type = dataset.schema.field(index_name).type
+        unit_ns = _UNIT_NS[time_type.unit]
+        condition = None
+        if start_ns is not None:
+            condition = column >= pa.scalar(-(-start_ns // unit_ns), type=time_type)
+        if end_ns is not None:
+            upper = column <= pa.scalar(end_ns // unit_ns, type=time_type)
+            condition = upper if condition is None else condition & upper
+        return dataset.to_table(filter=condition).to_pandas()
+
+    @property
+    def segments(self) -> List[Dict]:
+        with self._lock:
+            return list(self._segments)
+
+    def append(self, df: pd.DataFrame) -> int:
+        """
+        Write a time-indexed chunk as a new segment.
+
+        Returns:
+            Number of rows written
+        """
+        if df.empty:
+            return 0
+        df = df.sort_index(kind="stable")
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+        segment = self._write_segment(df, seq, f"seg-{seq:08d}.{SEGMENT_FORMAT}")
+        with self._lock:
+            with open(self._path(INDEX_FILE), "a") as f:
+                f.write(json.dumps(segment) + "\n")
+            self._segments.append(segment)
+            needs_compaction = self.compact_threshold is not None and len(self._segments) >= self.compact_threshold
+        if needs_compaction:
+            self.compact(background=True)
+        return len(df)
+
+    def read(self, start=None, end=None) -> pd.DataFrame:
+        """
+        Read the deduplicated, sorted rows with start <= timestamp <= end (naive bounds are UTC).
+
+        Only segments whose indexed range overlaps [start, end] are opened, and of a Parquet
+        segment only the row groups that overlap it are decoded; for duplicate timestamps the row
+        from the most recently appended segment is kept.
+        """
+        start_ns = _ns(start) if start is not None else None
+        end_ns = _ns(end) if end is not None else None
+        with self._lock:
+            selected = [
+                segment for segment in self._segments
+                if (start_ns is None or segment["end"] >= start_ns) and (end_ns is None or segment["start"] <= end_ns)
+            ]
+            frames = [self._read_segment(segment, start_ns, end_ns)
+                      for segment in sorted(selected, key=lambda s: s["seq"])]
+        if not frames:
+            return pd.DataFrame()
+
+        df = pd.concat(frames)
+        df = df[~df.index.duplicated(keep="last")].sort_index(kind="stable")
+        if start_ns is not None or end_ns is not None:
+            times = pd.DatetimeIndex(df.index).as_unit("ns").asi8
+            mask = np.ones(len(df), dtype=bool)
+            if start_ns is not None:
+                mask &= times >= start_ns
+            if end_ns is not None:
+                mask &= times <= end_ns
+            df = df[mask]
+        return df
+
+    def compact(self, background: bool = False):
+        """
+        Merge all current segments into one deduplicated segment.
+
+        Background compactions (started by append) only merge the newer, smaller segments.
+        Appends made while compaction runs are kept as separate, newer segments.
+        """
+        if background:
+            with self._lock:
+                if self._compactor is not None and self._compactor.is_alive():
+                    return
+                self._compactor = threading.Thread(target=self._compact, kwargs={"full": False}, daemon=True)
+                self._compactor.start()
+        else:
+            self.wait()
+            self._compact()
+
+    def wait(self):
+        """
+        Block until a running background compaction has finished.
+        """
+        compactor = self._compactor
+        if compactor is not None and compactor is not threading.current_thread():
+            compactor.join()
+
+    def _compact(self, full: bool = True):
+        with self._lock:
+            snapshot = sorted(self._segments, key=lambda s: s["seq"])
+        if not full:
+            # Size-tiered: leave old segments larger than everything after them alone, so each
+            # row is rewritten O(log n) times rather than on every compaction
+            remaining = sum(segment["rows"] for segment in snapshot)
+            while len(snapshot) > 1 and snapshot[0]["rows"] > remaining - snapshot[0]["rows"]:
+                remaining -= snapshot[0]["rows"]
+                snapshot = snapshot[1:]
+        if len(snapshot) < 2:
+            return
+
+        # Segment files are immutable, so they can be merged without holding the lock
+        df = pd.concat([self._read_segment(segment) for segment in snapshot])
+        df = df[~df.index.duplicated(keep="last")].sort_index(kind="stable")
+        seq = snapshot[-1]["seq"]
+        merged = self._write_segment(df, seq, f"cmp-{seq:08d}-{uuid.uuid4().hex[:8]}.{SEGMENT_FORMAT}")
+
+        with self._lock:
+            merged_files = {segment["file"] for segment in snapshot}
+            self._segments = sorted(
+                [merged] + [s for s in self._segments if s["file"] not in merged_files], key=lambda s: s["seq"]
+            )
+            tmp_path = self._path(INDEX_FILE + ".tmp")
+            with open(tmp_path, "w") as f:
+                for segment in self._segments:
+                    f.write(json.dumps(segment) + "\n")
+            os.replace(tmp_path, self._path(INDEX_FILE))
+            for name in merged_files:
+                os.remove(self._path(name))
+
+    def export_csv(self, output_file: str) -> pd.DataFrame:
+        """
+        Write the deduplicated contents to a single CSV (the format of the legacy output files).
+        """
+        df = self.read()
+        df.to_csv(output_file)
+        return df
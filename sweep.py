@@ -0,0 +1,254 @@
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from accumulators import MetricsAccumulator
+from datastore import load_backtest_data
+from end import simulate_delta_neutral
+from engine import resample_equity, span_days
+from ledger import EXIT, TradeLedger
+
+# Columns of the shared input block, in row order
+SERIES = ("spot", "perp", "fund_rate")
+
+# Set in each worker process by _attach_shared_inputs
+_shared_block = None
+_shared_inputs = None
+_shared_index = None
+
+
+def grid_search(param_grid: Dict[str, Iterable]) -> List[Dict]:
+    """
+    Expand a parameter grid into the list of every combination.
+
+    Args:
+        param_grid: Mapping of simulate_delta_neutral keyword -> values to try,
+            e.g. {'fund_thresh': [0, 1e-5], 'sl_mult': [1.05, 1.1]}
+
+    Returns:
+        List of keyword dicts, one per combination
+    """
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+
+
+def random_search(param_space: Dict, n_samples: int, seed: Optional[int] = None) -> List[Dict]:
+    """
+    Draw random parameter combinations.
+
+    Args:
+        param_space: Mapping of simulate_delta_neutral keyword -> either a list of
+            values to choose from, or a (low, high) tuple sampled uniformly
+        n_samples: Number of combinations to draw
+        seed: Seed for the random generator
+
+    Returns:
+        List of keyword dicts, one per sample
+    """
+    rng = np.random.default_rng(seed)
+    samples = []
+    for _ in range(n_samples):
+        params = {}
+        for name, space in param_space.items():
+            if isinstance(space, tuple):
+                low, high = space
+                params[name] = float(rng.uniform(low, high))
+            else:
+                params[name] = space[rng.integers(len(space))]
+        samples.append(params)
+    return samples
+
+
+def summarize_run(
+    results_df: pd.DataFrame,
+    trades_df: Union[pd.DataFrame, TradeLedger],
+    capital: float,
+    risk_free_rate: float = 0.02,
+) -> Dict:
+    """
+    Reduce one simulation to the metrics the sweep ranks on.
+
+    APY follows end.py (the realised yield, compounded over span_days of the results'
+    timestamps); Sharpe, volatility and max drawdown follow the report and are taken from the
+    daily closes of the mark-to-market equity column.
+
+    results_df needs the yield_after_fees column and a DatetimeIndex; without an equity column
+    the realised capital stands in for it. trades_df may be the TradeLedger of
+    simulate(outputs="equity").
+
+    Returns:
+        Dictionary with apy, sharpe, max_drawdown, volatility, total_yield, num_trades, win_rate,
+        profit_factor and expectancy
+    """
+    if isinstance(trades_df, TradeLedger):
+        exits = trades_df.view[trades_df.view['type'] == EXIT]
+    else:
+        exits = trades_df[trades_df['type'] == 'exit'] if not trades_df.empty else None
+    # Trade metrics in one pass over the closed trades
+    trade_metrics = MetricsAccumulator(capital)
+    if exits is not None:
+        for before, after, fees, allocated, current in zip(
+            exits['trade_pnl_before_fees'].tolist(), exits['trade_pnl_after_fees'].tolist(), exits['fees'].tolist(),
+            exits['allocated_capital'].tolist(), exits['current_capital'].tolist(),
+        ):
+            trade_metrics.add_trade(before, after, fees, allocated, current)
+    num_trades = trade_metrics.num_trades
+    realised = capital + results_df['yield_after_fees']
+    total_days = span_days(results_df.index)
+    total_yield = float(realised.iloc[-1] - capital) if len(realised) else 0.0
+    apy = (1 + total_yield / capital) ** (365 / total_days) - 1 if total_days > 0 else 0.0
+
+    # Daily equity: close of each calendar day, with the initial capital in front
+    equity = results_df['equity'] if 'equity' in results_df else realised
+    daily = np.concatenate(([capital], resample_equity(equity, "D").to_numpy()))
+    daily_returns = np.diff(daily) / daily[:-1]
+    volatility = daily_returns.std(ddof=1) * np.sqrt(365) if len(daily_returns) > 1 else 0.0
+    sharpe = (apy - risk_free_rate) / volatility if volatility > 0 else 0.0
+    running_peak = np.maximum.accumulate(daily)
+    max_drawdown = float(((daily - running_peak) / running_peak).min())
+    trade_summary = trade_metrics.summary(total_days)
+
+    return {
+        'apy': apy,
+        'sharpe': sharpe,
+        'max_drawdown': max_drawdown,
+        'volatility': volatility,
+        'total_yield': total_yield,
+        'num_trades': num_trades,
+        'win_rate': trade_summary['win_rate'],
+        'profit_factor': trade_summary['profit_factor'],
+        'expectancy': trade_summary['expectancy'],
+    }
+
+
+def _attach_shared_inputs(shm_name: str, n: int, tz: Optional[str]):
+    """
+    Worker initializer: map the shared input block read-only instead of receiving a pickled copy.
+
+    The block holds the SERIES rows as float64 followed by the timestamps as int64 epoch nanoseconds.
+    """
+    global _shared_block, _shared_inputs, _shared_index
+    _shared_block = shared_memory.SharedMemory(name=shm_name)
+    block = np.ndarray((len(SERIES), n), dtype=np.float64, buffer=_shared_block.buf)
+    block.flags.writeable = False
+    _shared_inputs = {name: block[i] for i, name in enumerate(SERIES)}
+    times = np.ndarray(n, dtype=np.int64, buffer=_shared_block.buf, offset=block.nbytes)
+    _shared_index = pd.DatetimeIndex(times.view('M8[ns]'))
+    if tz:
+        _shared_index = _shared_index.tz_localize("UTC").tz_convert(tz)
+
+
+def _run_params(params: Dict, base_kwargs: Dict) -> Dict:
+    kwargs = {**base_kwargs, **params}
+    results_df, stats, trades_df, time_utilization = simulate_delta_neutral(
+        pd.Series(_shared_inputs['spot'], index=_shared_index, copy=False),
+        pd.Series(_shared_inputs['perp'], index=_shared_index, copy=False),
+        pd.Series(_shared_inputs['fund_rate'], index=_shared_index, copy=False),
+        outputs="equity",
+        **kwargs,
+    )
+    summary = summarize_run(results_df, trades_df, kwargs.get('capital', 23_000))
+    summary['time_utilization'] = time_utilization
+    summary.update({f'exit_clause_{clause}': count for clause, count in stats.items()})
+    return {**params, **summary}
+
+
+def run_sweep(
+    spot_prices: pd.Series,
+    perp_prices: pd.Series,
+    funding_rates: pd.Series,
+    param_sets: List[Dict],
+    base_kwargs: Optional[Dict] = None,
+    max_workers: Optional[int] = None,
+    rank_by: str = 'apy',
+    output_file: Optional[str] = 'sweep_results.csv',
+) -> pd.DataFrame:
+    """
+    Run simulate_delta_neutral for every parameter set on a process pool.
+
+    The three input series and their timestamps are copied once into a shared memory block that
+    every worker maps read-only, so the data is not pickled per worker or per task. Only the
+    parameter dicts go out and only the summary metrics come back.
+
+    Args:
+        spot_prices, perp_prices, funding_rates: Input series with a DatetimeIndex, as for
+            simulate_delta_neutral; APY and the daily equity curve are taken from the timestamps
+        param_sets: Keyword dicts from grid_search or random_search
+        base_kwargs: Keywords shared by every run (e.g. capital)
+        max_workers: Pool size, defaults to all cores
+        rank_by: Column to sort the results table on (descending)
+        output_file: Where to write the ranked table, or None to skip writing
+
+    Returns:
+        DataFrame with one row per parameter set, ranked by `rank_by`
+    """
+    base_kwargs = dict(base_kwargs or {})
+    frame = pd.DataFrame({'spot': spot_prices, 'perp': perp_prices, 'fund_rate': funding_rates}).dropna()
+    n = len(frame)
+    if not isinstance(frame.index, pd.DatetimeIndex):
+        raise ValueError("run_sweep needs input series indexed by time (a DatetimeIndex)")
+    tz = str(frame.index.tz) if frame.index.tz is not None else None
+
+    shm = shared_memory.SharedMemory(create=True, size=max((len(SERIES) + 1) * n * 8, 1))
+    try:
+        block = np.ndarray((len(SERIES), n), dtype=np.float64, buffer=shm.buf)
+        for i, name in enumerate(SERIES):
+            block[i] = frame[name].to_numpy(dtype=float)
+        times = np.ndarray(n, dtype=np.int64, buffer=shm.buf, offset=block.nbytes)
+        times[:] = frame.index.as_unit('ns').asi8
+        del block, times
+
+        max_workers = max_workers or os.cpu_count()
+        chunksize = max(1, len(param_sets) // (max_workers * 4))
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_attach_shared_inputs,
+            initargs=(shm.name, n, tz),
+        ) as executor:
+            rows = list(executor.map(
+                _run_params,
+                param_sets,
+                itertools.repeat(base_kwargs),
+                chunksize=chunksize,
+            ))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    results = pd.DataFrame(rows)
+    if not results.empty:
+        results = results.sort_values(rank_by, ascending=False, ignore_index=True)
+        results.insert(0, 'rank', np.arange(1, len(results) + 1))
+    if output_file:
+        results.to_csv(output_file, index=False)
+        print(f"Ranked results for {len(results)} parameter sets saved to {output_file}")
+    return results
+
+
+if __name__ == "__main__":
+    data = load_backtest_data(columns=['date_time', 'spot_open', 'perp_open', 'funding_fundingRate']).set_index('date_time')
+
+    param_sets = grid_search({
+        'fund_thresh': [0, 0.000005, 0.00001, 0.00002, 0.00005],
+        'sl_mult': [1.02, 1.05, 1.1, 1.2],
+        'spot_price_exit_multiplier': [0.98, 0.99, 0.995, 1.0],
+        'a': [0.5, 0.7, 0.89],
+    })
+
+    start = time.time()
+    results = run_sweep(
+        data['spot_open'],
+        data['perp_open'],
+        data['funding_fundingRate'],
+        param_sets,
+        base_kwargs={'capital': 100_000},
+    )
+    print(f"Swept {len(param_sets)} parameter sets in {time.time() - start:.1f}s")
+    print("\nTop 10 parameter sets:")
+    print(results.head(10).to_string(index=False))
@@ -0,0 +1,156 @@
+"""
+Cached symbol resolution for the Hyperliquid info endpoint.
+
+The perp and spot universes (meta and spotMeta) are downloaded once, turned into
+name -> coin/asset dictionaries and persisted to disk. Entries older than the TTL are still
+served while a background thread refreshes them, so a price lookup is a dictionary hit plus
+one allMids request instead of a full universe download.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from hyperliquid.api import API
+from hyperliquid.utils import constants
+
+DEFAULT_CACHE = "symbol_cache.json"
+DEFAULT_TTL = 60 * 60  # seconds
+
+# Spot asset ids are offset by 10000 from the spot universe index
+SPOT_ASSET_OFFSET = 10000
+
+
+def build_mapping(meta: Dict, spot_meta: Dict) -> Dict:
+    """
+    Name -> {"coin", "asset"} dictionaries from meta and spotMeta responses.
+
+    Perps are keyed by name ("HYPE"). Spot pairs are keyed by their index name ("@107"), their
+    "BASE/QUOTE" name ("HYPE/USDC") and, for USDC pairs, the base token ("HYPE").
+    """
+    perps = {asset["name"]: {"coin": asset["name"], "asset": index} for index, asset in enumerate(meta["universe"])}
+
+    tokens = {token["index"]: token["name"] for token in spot_meta["tokens"]}
+    spots = {}
+    for pair in spot_meta["universe"]:
+        entry = {"coin": pair["name"], "asset": SPOT_ASSET_OFFSET + pair["index"]}
+        base, quote = (tokens.get(index) for index in pair["tokens"])
+        spots[pair["name"]] = entry
+        spots.setdefault(f"{base}/{quote}", entry)
+        if quote == "USDC":
+            spots.setdefault(base, entry)
+    return {"perps": perps, "spots": spots}
+
+
+class SymbolCache:
+    """
+    TTL cache of the perp and spot symbol mappings of one API endpoint, persisted to disk.
+
+    Args:
+        base_url: API root
+        cache_file: JSON file shared by all endpoints, None to keep the cache in memory
+        ttl: Seconds after which a mapping is refreshed in the background
+    """
+
+    def __init__(self, base_url: str = constants.MAINNET_API_URL, cache_file: Optional[str] = DEFAULT_CACHE,
+                 ttl: float = DEFAULT_TTL):
+        self.base_url = base_url
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.api = API(base_url)
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._entry = self._load()
+
+    def _load(self) -> Optional[Dict]:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return None
+        with open(self.cache_file) as f:
+            return json.load(f).get(self.base_url)
+
+    def _save(self, entry: Dict):
+        if not self.cache_file:
+            return
+        cache = {}
+        if os.path.exists(self.cache_file):
+            with open(self.cache_file) as f:
+                cache = json.load(f)
+        cache[self.base_url] = entry
+        tmp_path = self.cache_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.cache_file)
+
+    def refresh(self) -> Dict:
+        """
+        Download meta and spotMeta and replace the mapping.
+        """
+        entry = build_mapping(self.api.post("/info", {"type": "meta"}), self.api.post("/info", {"type": "spotMeta"}))
+        entry["fetched_at"] = time.time()
+        with self._lock:
+            self._entry = entry
+            self._save(entry)
+        return entry
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Error refreshing symbol cache: {str(e)}")
+
+    def mapping(self) -> Dict:
+        """
+        The current mapping: fetched synchronously the first time, then refreshed in the
+        background once older than the TTL while the stale copy keeps being served.
+        """
+        with self._lock:
+            entry = self._entry
+            stale = entry is not None and time.time() - entry["fetched_at"] > self.ttl
+            if stale and (self._refresher is None or not self._refresher.is_alive()):
+                self._refresher = threading.Thread(target=self._refresh_in_background, daemon=True)
+                self._refresher.start()
+        return entry if entry is not None else self.refresh()
+
+    def perp(self, name: str) -> Optional[Dict]:
+        return self.mapping()["perps"].get(name)
+
+    def spot(self, name: str) -> Optional[Dict]:
+        return self.mapping()["spots"].get(name)
+
+    def prices_from_mids(self, mids: Dict, symbol: str) -> Optional[Dict]:
+        """
+        Perp and spot mid prices of symbol from an allMids response.
+
+        "spot_price" is the mid of the spot pair (e.g. "@107" for HYPE), a traded price. Before
+        the cache it was the perp's oraclePrice from meta, an index of external spot prices, so
+        spot_price and the price differences derived from it are not comparable with data
+        recorded before this change.
+        """
+        perp, spot = self.perp(symbol), self.spot(symbol)
+        if perp is None or spot is None or perp["coin"] not in mids or spot["coin"] not in mids:
+            return None
+        return {
+            "perp_price": float(mids[perp["coin"]]),
+            "spot_price": float(mids[spot["coin"]]),
+        }
+
+    def prices(self, symbol: str) -> Optional[Dict]:
+        """
+        Current perp and spot mid prices of symbol, with a single allMids request.
+
+        spot_price is the spot pair's mid, no longer the perp's oracle price (see prices_from_mids).
+        """
+        return self.prices_from_mids(self.api.post("/info", {"type": "allMids"}), symbol)
+
+
+_caches: Dict[str, SymbolCache] = {}
+
+
+def symbol_cache(base_url: str = constants.MAINNET_API_URL) -> SymbolCache:
+    """
+    Shared SymbolCache for an endpoint.
+    """
+    if base_url not in _caches:
+        _caches[base_url] = SymbolCache(base_url)
+    return _caches[base_url]